@@ -80,27 +80,16 @@ class BasicWebhookSample(ds.DialogflowSample):
         self.set_start_flow_delegator(dg.StartFlowDelegator(self))
         self.start_page_delegator = dg.StartPageDelegator(self)
         self.set_session_delegator(dg.SessionsDelegator(self))
+        self.provisioner = dg.page_sample_provisioner(self)
 
     def setup(self, wait=2):
         """Initializes the sample by communicating with the Dialogflow API."""
-        self.agent_delegator.setup()
-        self.webhook_delegator.setup()
-        self.intent_delegator.setup()
-        self.page_delegator.setup()
-        self.start_flow_delegator.setup()
-        self.start_flow_delegator.append_transition_route(
-            target_page=self.page_delegator.page.name,
-            intent=self.intent_delegator.intent.name,
-        )
+        self.provision()
         super().setup(wait=wait)
 
     def tear_down(self):
         """Deletes the sample components via the Dialogflow API."""
-        self.page_delegator.tear_down()
-        self.start_flow_delegator.tear_down()
-        self.intent_delegator.tear_down()
-        self.webhook_delegator.tear_down()
-        self.agent_delegator.tear_down()
+        self.provisioner.tear_down()
 
 
 if __name__ == "__main__":
@@ -135,6 +124,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--tear-down", action="store_true", help="Destroy the agent after run?"
     )
+    dg.add_provisioning_arguments(parser)
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument(
         "--webhook-uri",
@@ -154,15 +144,4 @@ if __name__ == "__main__":
             args["project_id"], args.pop("build_uuid")
         )
 
-    tear_down = args.pop("tear_down")
-    user_input = args.pop("user_input", [])
-    sample = BasicWebhookSample(**args)
-    sample.setup()
-    sample.run(user_input)
-    if tear_down:
-        sample.tear_down()
-    else:
-        print(
-            "Agent sample available at: "
-            f"https://dialogflow.cloud.google.com/cx/{sample.start_flow_delegator.flow.name}"
-        )
+    dg.run_sample(BasicWebhookSample, args)
@@ -0,0 +1,93 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: raw-bytes echo_webhook against the parse/dumps/dumps echo.
+
+Both paths include parsing the request to find its tag, as webhook_fcn does.
+Run from the dialogflow-cx directory:
+
+    python -m benchmarks.bench_echo
+"""
+
+import json
+import timeit
+
+from webhook.main import WebhookContext, registry
+
+SIZES = [1 << 10, 1 << 13, 1 << 16, 1 << 18, 1 << 20]
+
+
+def build_raw_request(size: int) -> bytes:
+    """Builds an echo_webhook request of about size bytes of session parameters."""
+    request = {
+        "fulfillmentInfo": {"tag": "echo_webhook"},
+        "text": "echo",
+        "sessionInfo": {"parameters": {}},
+    }
+    parameters = request["sessionInfo"]["parameters"]
+    while len(json.dumps(request)) < size:
+        parameters[f"param_{len(parameters)}"] = {
+            "value": "x" * 40,
+            "score": 0.5,
+            "tags": ["a", "b"],
+        }
+    return json.dumps(request).encode()
+
+
+def legacy_echo(raw: bytes) -> bytes:
+    """The previous path: parse the body, dump it, then dump it again."""
+    request_dict = json.loads(raw)
+    request_json = json.dumps(request_dict)
+    return json.dumps(
+        {"fulfillment_response": {"messages": [{"text": {"text": [request_json]}}]}}
+    ).encode()
+
+
+def raw_echo(raw: bytes) -> bytes:
+    """The current path: parse for the tag, then escape the raw bytes once."""
+    context = WebhookContext(raw=raw)
+    return registry.dispatch(context.tag, context)
+
+
+def run(sizes=None, total_bytes=1 << 21):
+    """Times both echo paths per size; returns {size: (legacy_s, raw_s)}."""
+    results = {}
+    for size in sizes or SIZES:
+        raw = build_raw_request(size)
+        number = max(3, total_bytes // len(raw))
+        results[len(raw)] = (
+            min(
+                timeit.repeat(lambda raw=raw: legacy_echo(raw), number=number, repeat=3)
+            )
+            / number,
+            min(timeit.repeat(lambda raw=raw: raw_echo(raw), number=number, repeat=3))
+            / number,
+        )
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    print(f"{'bytes':>10}{'legacy (ms)':>14}{'raw (ms)':>12}{'speedup':>10}")
+    for curr_size, (legacy_s, raw_s) in run(args.sizes).items():
+        print(
+            f"{curr_size:>10}{legacy_s * 1e3:>14.3f}{raw_s * 1e3:>12.3f}"
+            f"{legacy_s / raw_s:>9.1f}x"
+        )
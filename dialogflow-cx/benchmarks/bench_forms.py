@@ -0,0 +1,142 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: compiled form validation against interpreting declared rules.
+
+The legacy path rebuilds a {name: value} dict from parameterInfo, then walks
+rule declarations per request, as a hand-written validate_form would. Run from
+the dialogflow-cx directory:
+
+    python -m benchmarks.bench_forms
+"""
+
+import re
+import timeit
+
+from webhook.forms import Check, Form, OneOf, Pattern, Range
+
+CHOICES = [f"choice_{i}" for i in range(10)]
+
+
+def build_declarations(parameter_count=100):
+    """Declares range, regex, enum and cross-field rules as plain data."""
+    declarations = {}
+    for i in range(parameter_count):
+        kind = i % 3
+        if kind == 0:
+            declarations[f"p{i}"] = [{"type": "range", "min": 0, "max": 100}]
+        elif kind == 1:
+            declarations[f"p{i}"] = [{"type": "pattern", "regex": r"[A-Z]{2}\d{4}"}]
+        else:
+            declarations[f"p{i}"] = [{"type": "one_of", "choices": CHOICES}]
+    checks = [(f"p{i}", f"p{i + 3}") for i in range(0, parameter_count - 3, 10)]
+    return declarations, checks
+
+
+def build_form(declarations, checks) -> Form:
+    """Compiles the same declarations into a Form."""
+    rules = {}
+    for name, declared in declarations.items():
+        rule = declared[0]
+        if rule["type"] == "range":
+            rules[name] = Range(rule["min"], rule["max"])
+        elif rule["type"] == "pattern":
+            rules[name] = Pattern(rule["regex"])
+        else:
+            rules[name] = OneOf(rule["choices"])
+    return Form(
+        rules,
+        [Check([a, b], lambda x, y: x <= y, "{name} is too small") for a, b in checks],
+    )
+
+
+def build_parameter_info(declarations, invalid_every=0):
+    """Builds a parameterInfo list; every invalid_every-th value is invalid."""
+    parameter_info = []
+    for i, (name, declared) in enumerate(declarations.items()):
+        kind = declared[0]["type"]
+        invalid = invalid_every and i % invalid_every == 0
+        if kind == "range":
+            value = 200 if invalid else float(i % 100)
+        elif kind == "pattern":
+            value = "nope" if invalid else f"AB{i:04d}"
+        else:
+            value = "other" if invalid else CHOICES[i % 10]
+        parameter_info.append({"displayName": name, "value": value, "state": "VALID"})
+    return parameter_info
+
+
+def legacy_validate(parameter_info, declarations, checks):
+    """Interprets the declarations against a dict rebuilt from parameterInfo."""
+    values = {}
+    for info in parameter_info:
+        values[info["displayName"]] = info.get("value")
+    invalid = {}
+    for name, rules in declarations.items():
+        value = values.get(name)
+        if value is None:
+            continue
+        for rule in rules:
+            if rule["type"] == "range":
+                valid = rule["min"] <= value <= rule["max"]
+            elif rule["type"] == "pattern":
+                valid = re.fullmatch(rule["regex"], str(value)) is not None
+            else:
+                valid = value in rule["choices"]
+            if not valid:
+                invalid[name] = f"{name} is not valid"
+                break
+    for first, second in checks:
+        if first in invalid or second in invalid:
+            continue
+        if not values[first] <= values[second]:
+            invalid[second] = f"{second} is too small"
+    return invalid
+
+
+def run(parameter_count=100, number=2000):
+    """Times both validators; returns {case: (legacy_s, compiled_s)} per request."""
+    declarations, checks = build_declarations(parameter_count)
+    form = build_form(declarations, checks)
+    results = {}
+    for case, invalid_every in [("all valid", 0), ("10% invalid", 10)]:
+        parameter_info = build_parameter_info(declarations, invalid_every)
+        assert set(legacy_validate(parameter_info, declarations, checks)) == set(
+            form.validate(parameter_info)
+        )
+        results[case] = tuple(
+            min(timeit.repeat(function, number=number, repeat=3)) / number
+            for function in (
+                lambda p=parameter_info: legacy_validate(p, declarations, checks),
+                lambda p=parameter_info: form.validate(p),
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parameters", type=int, default=100)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'case':>14}{'legacy (us)':>14}{'compiled (us)':>16}{'speedup':>10}")
+    for curr_case, (legacy_s, compiled_s) in run(args.parameters, args.number).items():
+        print(
+            f"{curr_case:>14}{legacy_s * 1e6:>14.1f}{compiled_s * 1e6:>16.1f}"
+            f"{legacy_s / compiled_s:>9.1f}x"
+        )
@@ -0,0 +1,149 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: pooled keep-alive lookups against a connection per request.
+
+Lookups go to a local stand-in backend served from another thread, without
+the lookup cache, so every lookup reaches the backend. Run from the
+dialogflow-cx directory:
+
+    python -m benchmarks.bench_lookup
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from webhook.lookup import ConnectionPool
+
+CONCURRENCY = [1, 8, 32]
+
+
+class StandInBackend:
+    """Answers every GET with a small JSON record, from its own thread."""
+
+    def __init__(self) -> None:
+        self.body = json.dumps({"status": "shipped", "items": list(range(20))})
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, "127.0.0.1", 0, backlog=1024),
+            self._loop,
+        ).result()
+
+    @property
+    def url(self) -> str:
+        """Accesses the base URL of the backend."""
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def close(self) -> None:
+        """Stops serving."""
+        self._loop.call_soon_threadsafe(self._server.close)
+
+    async def _serve(self, reader, writer) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                close = b"Connection: close" in head
+                writer.write(
+                    (
+                        f"HTTP/1.1 200 OK\r\nContent-Length: {len(self.body)}\r\n"
+                        f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+                        f"{self.body}"
+                    ).encode()
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def per_request_get_json(host: str, port: int, path: str):
+    """The unpooled path: a new connection for every lookup."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = next(
+            int(line.split(b":")[1])
+            for line in head.split(b"\r\n")
+            if line.lower().startswith(b"content-length")
+        )
+        return json.loads(await reader.readexactly(length))
+    finally:
+        writer.close()
+
+
+async def _time_lookups(get_json, lookups: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            await get_json(f"/orders/{index}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(lookups)))
+    return time.perf_counter() - start
+
+
+def run(concurrency=None, lookups=2000):
+    """Times both paths per concurrency; returns {concurrency: (unpooled_s, pooled_s)}."""
+    backend = StandInBackend()
+    pool = ConnectionPool(backend.url, max_connections=max(concurrency or CONCURRENCY))
+    host, port = pool.host, pool.port
+
+    async def measure(level):
+        unpooled = await _time_lookups(
+            lambda path: per_request_get_json(host, port, path), lookups, level
+        )
+        pooled = await _time_lookups(pool.get_json, lookups, level)
+        pool.close()
+        return unpooled / lookups, pooled / lookups
+
+    try:
+        return {
+            level: asyncio.run(measure(level)) for level in concurrency or CONCURRENCY
+        }
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'concurrency':>12}{'per-request (us)':>18}{'pooled (us)':>14}{'speedup':>10}"
+    )
+    for level_run, (unpooled_s, pooled_s) in run(
+        args.concurrency, args.lookups
+    ).items():
+        print(
+            f"{level_run:>12}{unpooled_s * 1e6:>18.1f}{pooled_s * 1e6:>14.1f}"
+            f"{unpooled_s / pooled_s:>9.1f}x"
+        )
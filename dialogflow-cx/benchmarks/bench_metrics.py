@@ -0,0 +1,79 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: per-request overhead of the registry's metrics recording.
+
+Times dispatch of the default handlers with metrics enabled and disabled, and
+a bare WebhookMetrics.record call. Run from the dialogflow-cx directory:
+
+    python -m benchmarks.bench_metrics
+"""
+
+import timeit
+
+from webhook.main import (
+    HandlerRegistry,
+    WebhookContext,
+    WebhookMetrics,
+    build_request_dict_basic,
+    registry,
+)
+
+TAGS = ["basic_webhook", "set_session_param"]
+
+
+def run(tags=None, number=100000):
+    """Times dispatch per tag; returns {tag: (without_s, with_s)} per call."""
+    results = {}
+    for tag in tags or TAGS:
+        request = build_request_dict_basic(tag, "benchmark")
+        request["sessionInfo"] = {"parameters": {"key": "name", "val": "value"}}
+        context = WebhookContext(request)
+        timings = []
+        for metrics in (None, WebhookMetrics()):
+            local_registry = HandlerRegistry(metrics=metrics)
+            local_registry.register(tag)(registry.get(tag).handler)
+            timings.append(
+                min(
+                    timeit.repeat(
+                        lambda r=local_registry, t=tag, c=context: r.dispatch(t, c),
+                        number=number,
+                        repeat=3,
+                    )
+                )
+                / number
+            )
+        results[tag] = tuple(timings)
+    metrics = WebhookMetrics()
+    results["record()"] = (
+        0.0,
+        min(timeit.repeat(lambda: metrics.record("tag", 1e-3), number=number)) / number,
+    )
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'tag':>20}{'off (us)':>12}{'on (us)':>12}{'overhead (us)':>16}")
+    for curr_tag, (off_s, on_s) in run(number=args.number).items():
+        print(
+            f"{curr_tag:>20}{off_s * 1e6:>12.2f}{on_s * 1e6:>12.2f}"
+            f"{(on_s - off_s) * 1e6:>16.2f}"
+        )
@@ -0,0 +1,96 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: pre-fork webhook throughput (requests/sec) against worker count.
+
+Run from the dialogflow-cx directory:
+
+    python -m benchmarks.bench_prefork --workers 1 2 4 8
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import time
+
+from webhook.main import build_request_dict_basic
+from webhook.prefork import PreforkServer
+
+
+def drive(address, duration):
+    """Sends requests over one keep-alive connection; returns the count served."""
+    body = json.dumps(build_request_dict_basic("basic_webhook", "benchmark"))
+    connection = http.client.HTTPConnection(*address, timeout=10)
+    served = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        connection.request("POST", "/", body=body)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            served += 1
+        if response.getheader("Connection") == "close":
+            connection.close()
+    connection.close()
+    return served
+
+
+def run(worker_counts, clients, duration):
+    """Measures requests/sec for each worker count; returns {workers: rps}."""
+    context = multiprocessing.get_context("fork")
+    results = {}
+    for workers in worker_counts:
+        server = PreforkServer(port=0, workers=workers)
+        server.bind()
+        master = context.Process(target=server.run)
+        master.start()
+        time.sleep(0.5)
+        try:
+            with context.Pool(clients) as pool:
+                start = time.perf_counter()
+                served = pool.starmap(drive, [(server.address, duration)] * clients)
+                elapsed = time.perf_counter() - start
+        finally:
+            master.terminate()
+            master.join()
+        results[workers] = sum(served) / elapsed
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=2 * (os.cpu_count() or 1),
+        help="Number of concurrent keep-alive client processes",
+    )
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8}{'requests/sec':>16}{'scaling':>10}")
+    for curr_workers, rps in run(args.workers, args.clients, args.duration).items():
+        baseline = baseline or rps
+        print(f"{curr_workers:>8}{rps:>16.0f}{rps / baseline:>9.2f}x")
@@ -0,0 +1,91 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: the protobuf entry point against JSON, for the four tags.
+
+Compares, per request, end to end from request bytes to response bytes:
+JSON in and out through the registry; a protobuf caller converting to JSON
+for webhook_fcn and back, as a gateway does today; and handle_proto. Run from
+the dialogflow-cx directory:
+
+    python -m benchmarks.bench_proto
+"""
+
+import timeit
+
+from benchmarks.bench_responses import build_requests
+from google.protobuf import json_format
+from webhook.main import WebhookContext, encode_response, registry
+from webhook.proto_webhook import WebhookRequest, WebhookResponse, handle_proto
+
+
+def json_path(raw: bytes) -> bytes:
+    """JSON bytes in and out, as webhook_fcn serves them."""
+    context = WebhookContext(raw=raw)
+    return registry.dispatch(context.tag, context)
+
+
+def gateway_path(serialized: bytes) -> bytes:
+    """Protobuf converted to JSON for webhook_fcn, and its response back."""
+    request = json_format.MessageToJson(WebhookRequest.FromString(serialized))
+    response = json_path(request.encode())
+    return json_format.Parse(response, WebhookResponse()).SerializeToString()
+
+
+def run(number=20000, repeat=5):
+    """Times the three paths per tag; returns {tag: (json_s, gateway_s, proto_s)}."""
+    results = {}
+    for tag, request_dict in build_requests().items():
+        raw = encode_response(request_dict)
+        serialized = json_format.ParseDict(
+            request_dict, WebhookRequest()
+        ).SerializeToString()
+        timings = []
+        for path, argument in [
+            (json_path, raw),
+            (gateway_path, serialized),
+            (handle_proto, serialized),
+        ]:
+            timings.append(
+                min(
+                    timeit.repeat(
+                        lambda: path(argument),  # pylint: disable=cell-var-from-loop
+                        number=number,
+                        repeat=repeat,
+                    )
+                )
+                / number
+            )
+        results[tag] = tuple(timings)
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'tag':<20}{'json (us)':>12}{'gateway (us)':>15}{'proto (us)':>13}"
+        f"{'vs gateway':>12}"
+    )
+    for curr_tag, (json_s, gateway_s, proto_s) in run(args.number, args.repeat).items():
+        print(
+            f"{curr_tag:<20}{json_s * 1e6:>12.2f}{gateway_s * 1e6:>15.2f}"
+            f"{proto_s * 1e6:>13.2f}{gateway_s / proto_s:>11.1f}x"
+        )
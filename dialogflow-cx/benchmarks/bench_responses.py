@@ -0,0 +1,139 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark: pre-encoded response templates against per-call json.dumps.
+
+Run from the dialogflow-cx directory:
+
+    python -m benchmarks.bench_responses
+"""
+
+import json
+import timeit
+
+from webhook.main import WebhookContext, build_request_dict_basic, registry
+
+
+def _text_payload(text):
+    return {"fulfillment_response": {"messages": [{"text": {"text": [text]}}]}}
+
+
+def legacy_basic_webhook(request_dict):
+    """The json.dumps implementation of basic_webhook."""
+    tag = request_dict["fulfillmentInfo"]["tag"]
+    user_query = request_dict["text"]
+    payload = _text_payload(f"Webhook received: {user_query} (Tag: {tag})")
+    payload["fulfillment_response"]["messages"][0]["text"][
+        "allow_playback_interruption"
+    ] = False
+    return json.dumps(payload)
+
+
+def legacy_echo_webhook(request_dict):
+    """The json.dumps implementation of echo_webhook."""
+    return json.dumps(_text_payload(json.dumps(request_dict)))
+
+
+def legacy_validate_form(request_dict):
+    """The json.dumps implementation of validate_form."""
+    parameter_dict = {}
+    for parameter_info in request_dict["pageInfo"]["formInfo"]["parameterInfo"]:
+        parameter_dict[parameter_info["displayName"]] = parameter_info["value"]
+    if parameter_dict["age"] < 0:
+        return json.dumps(
+            _text_payload(f'Age {parameter_dict["age"]} not valid (must be positive)')
+        )
+    return json.dumps(_text_payload("Valid age"))
+
+
+def legacy_set_session_param(request_dict):
+    """The json.dumps implementation of set_session_param."""
+    parameters = request_dict["sessionInfo"]["parameters"]
+    payload = _text_payload("Session parameter set")
+    payload["session_info"] = {
+        "parameters": {parameters["key"]: parameters["val"], "key": None, "val": None}
+    }
+    return json.dumps(payload)
+
+
+def build_requests():
+    """Builds one representative request per tag."""
+    requests = {
+        tag: build_request_dict_basic(tag, "trigger intent")
+        for tag in ["basic_webhook", "echo_webhook", "validate_form"]
+    }
+    requests["validate_form"]["pageInfo"] = {
+        "formInfo": {"parameterInfo": [{"displayName": "age", "value": 22}]}
+    }
+    requests["set_session_param"] = build_request_dict_basic(
+        "set_session_param", "set session parameter"
+    )
+    requests["set_session_param"]["sessionInfo"] = {
+        "parameters": {"key": "MOCK_KEY", "val": "MOCK_VAL"}
+    }
+    return requests
+
+
+LEGACY_HANDLERS = {
+    "basic_webhook": legacy_basic_webhook,
+    "echo_webhook": legacy_echo_webhook,
+    "validate_form": legacy_validate_form,
+    "set_session_param": legacy_set_session_param,
+}
+
+
+def run(number=100000, repeat=5):
+    """Times both implementations per tag; returns {tag: (legacy_s, new_s)}."""
+    results = {}
+    for tag, request_dict in build_requests().items():
+        legacy = LEGACY_HANDLERS[tag]
+        handler = registry.get(tag).handler
+        assert json.loads(legacy(request_dict)) == json.loads(
+            handler(WebhookContext(request_dict))
+        )
+        legacy_time = min(
+            timeit.repeat(
+                lambda legacy=legacy, request_dict=request_dict: legacy(request_dict),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        new_time = min(
+            timeit.repeat(
+                lambda handler=handler, request_dict=request_dict: handler(
+                    WebhookContext(request_dict)
+                ),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        results[tag] = (legacy_time / number, new_time / number)
+    return results
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'tag':<20}{'json.dumps (us)':>18}{'template (us)':>16}{'speedup':>10}")
+    for curr_tag, (legacy_s, new_s) in run(args.number, args.repeat).items():
+        print(
+            f"{curr_tag:<20}{legacy_s * 1e6:>18.2f}{new_s * 1e6:>16.2f}"
+            f"{legacy_s / new_s:>9.1f}x"
+        )
@@ -14,12 +14,33 @@
 
 """Delegators module."""
 
+import dialogflow_sample as ds
+
 from .agent_delegator import AgentDelegator
 from .auth_delegator import AuthDelegator
-from .client_delegator import ClientDelegator
+from .client_delegator import (
+    BufferedClientDelegator,
+    ClientDelegator,
+    sample_delegators,
+)
+from .client_pool import ClientPool, client_pool
 from .intent_delegator import AnnotatedIntentDelegator, IntentDelegator
+from .nlu_fingerprint import (
+    AgentDescriptionStore,
+    LocalFingerprintStore,
+    sample_fingerprint,
+)
+from .operations import OperationPoller, Wait, operation_poller
 from .page_delegator import FulfillmentPageDelegator, PageDelegator, StartPageDelegator
+from .provisioner import Provisioner, Step
+from .resource_index import ResourceIndex, resource_index
+from .samples import (
+    add_provisioning_arguments,
+    page_sample_provisioner,
+    run_sample,
+)
 from .sessions_delegator import SessionsDelegator
+from .snapshot_cache import SnapshotCache
 from .start_flow_delegator import StartFlowDelegator
 from .test_case_delegator import TestCaseDelegator
 from .webhook_delegator import WebhookDelegator
@@ -27,14 +48,40 @@ from .webhook_delegator import WebhookDelegator
 __all__ = (
     "AgentDelegator",
     "AuthDelegator",
+    "BufferedClientDelegator",
     "ClientDelegator",
+    "ClientPool",
+    "client_pool",
     "IntentDelegator",
     "AnnotatedIntentDelegator",
+    "AgentDescriptionStore",
+    "LocalFingerprintStore",
+    "OperationPoller",
+    "operation_poller",
+    "Wait",
     "FulfillmentPageDelegator",
     "PageDelegator",
     "StartPageDelegator",
+    "Provisioner",
+    "Step",
+    "ResourceIndex",
+    "resource_index",
+    "add_provisioning_arguments",
+    "page_sample_provisioner",
+    "run_sample",
+    "SnapshotCache",
     "SessionsDelegator",
     "StartFlowDelegator",
     "TestCaseDelegator",
     "WebhookDelegator",
 )
+
+# The defaults of every DialogflowSample, which cannot import this package.
+ds.DEFAULTS.update(
+    client_pool=lambda sample: client_pool,
+    resource_index=lambda sample: resource_index,
+    operation_poller=lambda sample: operation_poller,
+    fingerprint_store=lambda sample: AgentDescriptionStore(),
+    nlu_fingerprint=sample_fingerprint,
+    delegators=sample_delegators,
+)
@@ -38,6 +38,20 @@ class AgentDelegator(ClientDelegator):
         )
         self.time_zone = kwargs.get("time_zone", self._DEFAULT_TIME_ZONE)
 
+    @property
+    def configuration(self):
+        """Accesses what the delegator declares, with language and time zone."""
+        return {
+            **super().configuration,
+            "default_language_code": self.default_language_code,
+            "time_zone": self.time_zone,
+        }
+
+    @property
+    def dependencies(self):
+        """Accesses the delegators to set up first: none, the agent comes first."""
+        return ()
+
     def setup(self):
         """Initializes the agent delegator."""
         try:
@@ -48,17 +62,18 @@ class AgentDelegator(ClientDelegator):
             )
             request = {"agent": agent, "parent": self.parent}
             self._agent = self.client.create_agent(request=request)
+            self.controller.resource_index.invalidate("agents", self.parent)
         except google.api_core.exceptions.AlreadyExists:
-            request = cx.ListAgentsRequest(
-                parent=self.parent,
-            )
-            for agent in self.client.list_agents(request=request):
-                if agent.display_name == self.display_name:
-                    request = cx.GetAgentRequest(
-                        name=agent.name,
-                    )
-                    self._agent = self.client.get_agent(request=request)
-                    break
+            self.adopt()
+
+    def adopt(self):
+        """Takes over the existing agent of the same display name, if any."""
+        self._agent = self.controller.resource_index.find(
+            "agents",
+            self.client.list_agents,
+            cx.ListAgentsRequest(parent=self.parent),
+            self.display_name,
+        )
 
     def tear_down(self):
         """Destroys the Dialogflow agent."""
@@ -66,6 +81,7 @@ class AgentDelegator(ClientDelegator):
         try:
             self.client.delete_agent(request=request)
             self._agent = None
+            self.controller.resource_index.invalidate("agents", self.parent)
         except google.api_core.exceptions.NotFound:
             pass
 
@@ -15,19 +15,26 @@
 """Module for creating and organizing GCP project credentials."""
 
 import dataclasses
+import datetime
 import json
 import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
 
 import dialogflow_sample as ds
 import google.api_core.exceptions
 import google.auth
+import google.auth.exceptions
+import google.auth.transport.requests
 from google.auth import identity_pool
 from google.oauth2 import service_account
 
 
-def get_credentials(quota_project_id=None):
-    """Obtain credentials object from json file and environment configuration."""
-    credentials_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+def load_credentials(credentials_path=None, quota_project_id=None):
+    """Loads a credentials object from a json file, or the environment."""
+    if not credentials_path:
+        return google.auth.default(quota_project_id=quota_project_id)[0]
+
     with open(credentials_path, "r", encoding="utf8") as file_handle:
         credentials_data = file_handle.read()
         credentials_dict = json.loads(credentials_data)
@@ -41,6 +48,168 @@ def get_credentials(quota_project_id=None):
     return google.auth.default(quota_project_id=quota_project_id)[0]
 
 
+def _seconds_until(expiry: datetime.datetime) -> float:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if expiry.tzinfo is None:
+        now = now.replace(tzinfo=None)
+    return (expiry - now).total_seconds()
+
+
+class TokenRefresher:  # pylint: disable=too-many-instance-attributes
+    """Renews the access token of credentials margin seconds before it expires.
+
+    Runs on a daemon thread; failed refreshes are retried every
+    retry_interval seconds. Credentials without an expiry are refreshed every
+    interval seconds.
+    """
+
+    def __init__(
+        self,
+        credentials,
+        margin=300.0,
+        retry_interval=10.0,
+        interval=1800.0,
+        request_factory: Callable = google.auth.transport.requests.Request,
+    ) -> None:
+        self.credentials = credentials
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self.interval = interval
+        self.request_factory = request_factory
+        self.refreshes = 0
+        self.failures = 0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Accesses whether the background thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def refresh(self) -> None:
+        """Fetches a new access token now."""
+        self.credentials.refresh(self.request_factory())
+        self.refreshes += 1
+
+    def delay(self) -> float:
+        """Returns the seconds to wait before the next refresh."""
+        if not self.credentials.valid:
+            return 0.0
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return self.interval
+        return max(_seconds_until(expiry) - self.margin, 0.0)
+
+    def start(self) -> None:
+        """Starts refreshing in the background; idempotent."""
+        if not self.running:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="token-refresher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=1.0) -> None:
+        """Stops refreshing."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        delay = self.delay()
+        while not self._stopped.wait(delay):
+            try:
+                self.refresh()
+                delay = self.delay()
+            except (
+                google.auth.exceptions.RefreshError,
+                google.auth.exceptions.TransportError,
+            ):
+                self.failures += 1
+                delay = self.retry_interval
+
+
+class CredentialCache:
+    """Process-wide cache of credentials, by credentials file and quota project.
+
+    A file is read again only once it has changed; its new credentials then
+    replace the old ones, whose TokenRefresher is stopped. Credentials handed
+    out by warm_up are kept fresh by a TokenRefresher.
+    """
+
+    def __init__(
+        self, loader: Callable = load_credentials, refresh_margin=300.0
+    ) -> None:
+        self.loader = loader
+        self.refresh_margin = refresh_margin
+        self.loads = 0
+        self._credentials: Dict[Tuple, Tuple[Optional[int], object]] = {}
+        self._refreshers: Dict[int, TokenRefresher] = {}
+        self._lock = threading.Lock()
+
+    def get(self, credentials_path=None, quota_project_id=None):
+        """Returns the cached credentials for the file and quota project."""
+        try:
+            modified = (
+                os.stat(credentials_path).st_mtime_ns if credentials_path else None
+            )
+        except OSError:
+            modified = None
+        key = (credentials_path, quota_project_id)
+        stale = None
+        with self._lock:
+            cached_modified, credentials = self._credentials.get(key, (None, None))
+            if credentials is None or cached_modified != modified:
+                if credentials is not None:
+                    stale = self._refreshers.pop(id(credentials), None)
+                credentials = self.loader(credentials_path, quota_project_id)
+                self._credentials[key] = (modified, credentials)
+                self.loads += 1
+        if stale is not None:
+            stale.stop()
+        return credentials
+
+    def refresher(self, credentials) -> TokenRefresher:
+        """Returns the TokenRefresher of credentials, creating it if needed."""
+        with self._lock:
+            refresher = self._refreshers.get(id(credentials))
+            if refresher is None or refresher.credentials is not credentials:
+                refresher = self._refreshers[id(credentials)] = TokenRefresher(
+                    credentials, margin=self.refresh_margin
+                )
+        return refresher
+
+    def warm_up(self, credentials) -> TokenRefresher:
+        """Fetches a token now, unless still valid, and keeps it refreshed."""
+        refresher = self.refresher(credentials)
+        if not credentials.valid:
+            refresher.refresh()
+        refresher.start()
+        return refresher
+
+    def clear(self) -> None:
+        """Stops every refresher and forgets every cached credentials."""
+        with self._lock:
+            refreshers = list(self._refreshers.values())
+            self._refreshers.clear()
+            self._credentials.clear()
+        for refresher in refreshers:
+            refresher.stop()
+
+
+credential_cache = CredentialCache()
+
+
+def get_credentials(quota_project_id=None):
+    """Obtain credentials object from json file and environment configuration.
+
+    Credentials are cached for the process, by file and quota project.
+    """
+    return credential_cache.get(
+        os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"), quota_project_id
+    )
+
+
 @dataclasses.dataclass(frozen=True)
 class AuthDelegator:
     """Class for organizing information related to GCP project credentials configuration."""
@@ -57,3 +226,7 @@ class AuthDelegator:
             credentials = get_credentials(quota_project_id=self.quota_project_id)
             self.controller.set_credentials(credentials)
         return self.controller.credentials
+
+    def warm_up(self) -> TokenRefresher:
+        """Fetches an access token now and keeps it refreshed in the background."""
+        return credential_cache.warm_up(self.credentials)
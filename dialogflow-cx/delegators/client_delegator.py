@@ -14,7 +14,13 @@
 
 """Module for the base class for API delegators for Dialogflow CX samples."""
 
+import abc
+from typing import Callable, List, Set, Tuple
+
 import dialogflow_sample as ds
+from google.protobuf.field_mask_pb2 import (  # pylint: disable=no-name-in-module
+    FieldMask,
+)
 
 
 class ClientDelegator:
@@ -31,12 +37,35 @@ class ClientDelegator:
     def client(self):
         """Accesses the API client for the delegator."""
         if self._client is None:
-            self._client = self._CLIENT_CLASS(
+            self._client = self.controller.client_pool.get(
+                self._CLIENT_CLASS,
                 client_options=self.controller.client_options,
                 credentials=self.controller.auth_delegator.credentials,
             )
         return self._client
 
+    def adopt(self):
+        """Takes over the existing resource of the delegator, e.g. after a restore.
+
+        Delegators without a resource of their own have nothing to adopt.
+        """
+
+    @property
+    def configuration(self):
+        """Accesses what the delegator declares, to fingerprint the sample."""
+        return {"class": type(self).__name__, "display_name": self.display_name}
+
+    @property
+    def dependencies(self):
+        """Accesses the delegators whose setup must finish before this one's."""
+        return (self.controller.agent_delegator,)
+
+    @property
+    def step_name(self):
+        """Accesses the name of the setup step of the delegator."""
+        name = type(self).__name__.replace("Delegator", "")
+        return f"{name}({self.display_name})" if self.display_name else name
+
     @property
     def parent(self):
         """Accesses agent name, i.e. the parent for the most delegator components."""
@@ -46,3 +75,65 @@ class ClientDelegator:
     def display_name(self):
         """Accesses the display_name for the delegator."""
         return self._display_name
+
+
+class BufferedClientDelegator(ClientDelegator, abc.ABC):
+    """ClientDelegator buffering changes to its resource until flush.
+
+    Each change is applied to the local resource, or to it once set up, and
+    its field recorded; flush sends every changed field in one update whose
+    update_mask covers only those fields. Subclasses flush at the end of
+    setup.
+    """
+
+    def __init__(self, controller: ds.DialogflowSample, **kwargs):
+        super().__init__(controller, **kwargs)
+        self._pending: List[Tuple[str, Callable]] = []
+        self._changed_fields: Set[str] = set()
+
+    @property
+    @abc.abstractmethod
+    def resource(self):
+        """Accesses the set up resource, or None."""
+
+    @abc.abstractmethod
+    def update(self, update_mask: FieldMask):
+        """Sends the update_mask fields of the resource."""
+
+    @property
+    def changed_fields(self) -> List[str]:
+        """Accesses the fields changed since the last flush."""
+        return sorted(self._changed_fields | {field for field, _ in self._pending})
+
+    def mutate(self, field: str, mutation: Callable) -> None:
+        """Applies mutation to the resource, now or once set up, and buffers field."""
+        if self.resource is None:
+            self._pending.append((field, mutation))
+        else:
+            mutation(self.resource)
+            self._changed_fields.add(field)
+
+    def apply_pending(self, resource) -> None:
+        """Applies the changes made before setup to resource, and buffers them."""
+        pending, self._pending = self._pending, []
+        for field, mutation in pending:
+            mutation(resource)
+            self._changed_fields.add(field)
+
+    def flush(self):
+        """Sends the changed fields in one masked update; returns its response."""
+        if not self._changed_fields:
+            return None
+        update_mask = FieldMask(paths=sorted(self._changed_fields))
+        response = self.update(update_mask)
+        self._changed_fields.clear()
+        return response
+
+
+def sample_delegators(sample: ds.DialogflowSample) -> List[ClientDelegator]:
+    """Returns the API delegators of sample, in the order they were set."""
+    return [
+        delegator
+        for delegator in vars(sample).values()
+        if isinstance(delegator, ClientDelegator)
+    ]
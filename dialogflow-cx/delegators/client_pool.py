@@ -0,0 +1,144 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for the process-wide pool of Dialogflow CX API clients."""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import grpc
+
+DEFAULT_CHANNEL_OPTIONS = (
+    # As the generated transports do: no limit on message sizes.
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    # Keeps idle channels usable between the steps of a long sample run.
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+)
+
+
+def api_endpoint(client_options) -> Optional[str]:
+    """Reads api_endpoint from client options, given as a dict or ClientOptions."""
+    if client_options is None:
+        return None
+    if isinstance(client_options, dict):
+        return client_options.get("api_endpoint")
+    return getattr(client_options, "api_endpoint", None)
+
+
+class ClientPool:
+    """Shares API clients, and the gRPC channels under them, across delegators.
+
+    Clients are keyed by client class, API endpoint and credentials, so each
+    is built once per process. Clients of different classes for the same
+    endpoint and credentials share one gRPC channel, created with
+    channel_options and compression.
+    """
+
+    def __init__(
+        self,
+        channel_options: Sequence[Tuple[str, Any]] = DEFAULT_CHANNEL_OPTIONS,
+        compression: Optional[grpc.Compression] = None,
+    ) -> None:
+        self.channel_options = list(channel_options)
+        self.compression = compression
+        self._clients: Dict[Tuple, Any] = {}
+        self._channels: Dict[Tuple, grpc.Channel] = {}
+        self._lock = threading.RLock()
+
+    def get(self, client_class, client_options=None, credentials=None):
+        """Returns the pooled client_class client for the endpoint and credentials."""
+        endpoint = api_endpoint(client_options)
+        key = (client_class, endpoint, credentials)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self._create(
+                        client_class, client_options, endpoint, credentials
+                    )
+        return client
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the numbers of clients and channels, and of channels saved."""
+        with self._lock:
+            clients, channels = len(self._clients), len(self._channels)
+        return {
+            "clients": clients,
+            "channels": channels,
+            "channels_saved": clients - channels,
+        }
+
+    def report(self) -> str:
+        """Describes the channels saved by sharing them."""
+        stats = self.stats()
+        return (
+            f"{stats['clients']} API clients share {stats['channels']} gRPC channels"
+            f" ({stats['channels_saved']} saved)"
+        )
+
+    def connect(self, timeout: float = 10.0) -> int:
+        """Opens every pooled channel now; returns how many became ready.
+
+        Channels that are not ready within timeout seconds keep connecting
+        in the background, as they would on their first call.
+        """
+        with self._lock:
+            channels = list(self._channels.values())
+        futures = [grpc.channel_ready_future(channel) for channel in channels]
+        deadline = time.monotonic() + timeout
+        ready = 0
+        for future in futures:
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0.0))
+                ready += 1
+            except grpc.FutureTimeoutError:
+                future.cancel()
+        return ready
+
+    def close(self) -> None:
+        """Closes every pooled channel and forgets the pooled clients."""
+        with self._lock:
+            channels = list(self._channels.values())
+            self._channels.clear()
+            self._clients.clear()
+        for channel in channels:
+            channel.close()
+
+    def _create(self, client_class, client_options, endpoint, credentials):
+        transport_class = client_class.get_transport_class("grpc")
+        host = endpoint or client_class.DEFAULT_ENDPOINT
+        if ":" not in host:
+            host = f"{host}:443"
+        channel_key = (host, credentials)
+        channel = self._channels.get(channel_key)
+        if channel is None:
+            channel = self._channels[channel_key] = transport_class.create_channel(
+                host,
+                credentials=credentials,
+                options=self.channel_options,
+                compression=self.compression,
+            )
+        # The transport takes its credentials and endpoint from the channel.
+        return client_class(
+            transport=transport_class(host=host, channel=channel),
+            client_options=client_options,
+        )
+
+
+client_pool = ClientPool()
@@ -35,6 +35,11 @@ class IntentDelegator(ClientDelegator):
         self.training_phrases = training_phrases
         super().__init__(controller, **kwargs)
 
+    @property
+    def configuration(self):
+        """Accesses what the delegator declares, with the intent."""
+        return {**super().configuration, "intent": str(self.get_intent())}
+
     @property
     def intent(self):
         """Intent set in Dialogflow."""
@@ -70,17 +75,20 @@ class IntentDelegator(ClientDelegator):
                 parent=self.parent,
                 intent=intent,
             )
+            self.controller.resource_index.invalidate("intents", self.parent)
         except google.api_core.exceptions.AlreadyExists:
-            request = cx.ListIntentsRequest(
-                parent=self.parent,
-            )
-            for intent in self.client.list_intents(request=request):
-                if intent.display_name == self.display_name:
-                    request = cx.GetIntentRequest(
-                        name=intent.name,
-                    )
-                    self._intent = self.client.get_intent(request=request)
-                    return
+            self.adopt()
+
+    def adopt(self):
+        """Takes over the existing intent of the same display name, if any."""
+        self._intent = self.controller.resource_index.find(
+            "intents",
+            self.client.list_intents,
+            cx.ListIntentsRequest(
+                parent=self.parent, intent_view=cx.IntentView.INTENT_VIEW_FULL
+            ),
+            self.display_name,
+        )
 
     def tear_down(self):
         """Destroys the Dialogflow intent."""
@@ -88,6 +96,7 @@ class IntentDelegator(ClientDelegator):
         try:
             self.client.delete_intent(request=request)
             self._intent = None
+            self.controller.resource_index.invalidate("intents", self.parent)
         except google.api_core.exceptions.NotFound:
             pass
 
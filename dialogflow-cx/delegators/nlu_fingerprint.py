@@ -0,0 +1,148 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for fingerprinting the NLU content a flow is trained on."""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Iterable, Optional
+
+from google.protobuf.field_mask_pb2 import (  # pylint: disable=no-name-in-module
+    FieldMask,
+)
+
+from .intent_delegator import IntentDelegator
+
+_DESCRIPTION_MARKER = re.compile(r"\s*\[nlu-fingerprint: ([0-9a-f]{64})\]$")
+
+
+def _intent_content(intent):
+    return {
+        "name": intent.name,
+        "display_name": intent.display_name,
+        "training_phrases": [
+            [[part.text, part.parameter_id] for part in phrase.parts]
+            + [phrase.repeat_count]
+            for phrase in intent.training_phrases
+        ],
+        "parameters": [
+            [parameter.id, parameter.entity_type, parameter.is_list, parameter.redact]
+            for parameter in intent.parameters
+        ],
+        "is_fallback": intent.is_fallback,
+    }
+
+
+def nlu_fingerprint(intents: Iterable, flow) -> str:
+    """Returns the sha256 of the intents, and the routes and NLU settings of flow.
+
+    These are what training the flow depends on; changing any of them
+    changes the fingerprint.
+    """
+    settings = flow.nlu_settings
+    content = {
+        "flow": flow.name,
+        "intents": sorted(
+            (_intent_content(intent) for intent in intents),
+            key=lambda intent: intent["name"],
+        ),
+        "routes": [
+            [route.intent, route.condition, route.target_page, route.target_flow]
+            for route in flow.transition_routes
+        ],
+        "nlu_settings": [
+            int(settings.model_type),
+            settings.classification_threshold,
+            int(settings.model_training_mode),
+        ],
+    }
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class AgentDescriptionStore:
+    """Keeps the fingerprint last trained on in the description of the agent.
+
+    The fingerprint travels, and is deleted, with the agent. It is appended to
+    the description users see, as "[nlu-fingerprint: ...]", by one extra
+    update_agent call per training. Restoring a snapshot replaces the
+    description with the exported one, which has no fingerprint: a restored
+    flow must be trained before it is queried anyway, so the fingerprint is
+    recorded again after that training. Use LocalFingerprintStore to leave
+    the agent untouched.
+    """
+
+    def get(self, sample) -> Optional[str]:
+        """Returns the fingerprint last trained on, or None."""
+        match = _DESCRIPTION_MARKER.search(sample.agent_delegator.agent.description)
+        return match.group(1) if match else None
+
+    def put(self, sample, fingerprint: str) -> None:
+        """Records fingerprint as trained on."""
+        agent = sample.agent_delegator.agent
+        description = _DESCRIPTION_MARKER.sub("", agent.description)
+        agent.description = f"{description} [nlu-fingerprint: {fingerprint}]".lstrip()
+        sample.agent_delegator.client.update_agent(
+            agent=agent, update_mask=FieldMask(paths=["description"])
+        )
+
+
+class LocalFingerprintStore:
+    """Keeps the fingerprints last trained on in a local JSON file, by flow."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, sample) -> Optional[str]:
+        """Returns the fingerprint last trained on, or None."""
+        with self._lock:
+            return self._read().get(sample.start_flow_delegator.flow.name)
+
+    def put(self, sample, fingerprint: str) -> None:
+        """Records fingerprint as trained on."""
+        with self._lock:
+            fingerprints = self._read()
+            fingerprints[sample.start_flow_delegator.flow.name] = fingerprint
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf8") as file_handle:
+                json.dump(fingerprints, file_handle, indent=2, sort_keys=True)
+            os.replace(temporary, self.path)
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf8") as file_handle:
+                return json.load(file_handle)
+        except (OSError, ValueError):
+            return {}
+
+
+def sample_intents(sample):
+    """Returns the intents set up by the intent delegators of sample."""
+    return [
+        delegator.intent
+        for delegator in sample.delegators
+        if isinstance(delegator, IntentDelegator)
+    ]
+
+
+def sample_fingerprint(sample) -> str:
+    """Returns the fingerprint of the intents and start flow routes of sample."""
+    return nlu_fingerprint(sample_intents(sample), sample.start_flow_delegator.flow)
@@ -0,0 +1,159 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for waiting on long-running operations, such as training a flow."""
+
+import collections
+import concurrent.futures
+import dataclasses
+import random
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+
+@dataclasses.dataclass(frozen=True)
+class Wait:
+    """How long an operation was waited on, and how many times it was polled."""
+
+    name: str
+    seconds: float
+    polls: int
+    outcome: str
+
+
+class OperationPoller:  # pylint: disable=too-many-instance-attributes
+    """Polls long-running operations with exponential backoff and jitter.
+
+    The first poll is immediate, so operations that finish at once are not
+    slept on. The delay between polls then grows by multiplier up to
+    max_delay, each delay shortened by a random fraction of up to jitter.
+    Every wait is given up on after timeout seconds. The last MAX_WAITS waits
+    are kept in waits; stats and report cover every wait.
+    """
+
+    MAX_WAITS = 1000
+
+    def __init__(
+        self,
+        initial_delay: float = 0.1,
+        max_delay: float = 5.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        timeout: float = 600.0,
+    ) -> None:
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.timeout = timeout
+        self.waits: Deque[Wait] = collections.deque(maxlen=self.MAX_WAITS)
+        self._totals: Dict[str, Any] = {
+            "waits": 0,
+            "polls": 0,
+            "timeouts": 0,
+            "seconds": 0.0,
+        }
+        self._longest: Optional[Wait] = None
+        self._lock = threading.Lock()
+
+    def delays(self) -> Iterator[float]:
+        """Yields the delays between successive polls."""
+        delay = self.initial_delay
+        while True:
+            yield delay * (1 - random.uniform(0, self.jitter))
+            delay = min(delay * self.multiplier, self.max_delay)
+
+    def wait(self, operation, name: str = "operation", timeout=None) -> Any:
+        """Waits for operation to be done; returns its result, or raises its error."""
+        return self.wait_all({name: operation}, timeout=timeout)[name]
+
+    def wait_all(
+        self, operations: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Waits for every operation, by name, to be done; returns their results.
+
+        The operations are polled together, so the wait is as long as the
+        slowest one. Raises TimeoutError naming the operations still
+        running after timeout seconds, the poller's by default.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        pending = dict(operations)
+        polls = dict.fromkeys(operations, 0)
+        delays = self.delays()
+        while True:
+            for name, operation in list(pending.items()):
+                polls[name] += 1
+                if operation.done():
+                    self._record(name, start, polls[name], "done")
+                    del pending[name]
+            if not pending:
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                for name in pending:
+                    self._record(name, start, polls[name], "timeout")
+                raise concurrent.futures.TimeoutError(
+                    f"Not done after {timeout}s: {', '.join(pending)}"
+                )
+            time.sleep(min(next(delays), remaining))
+        return {name: operation.result() for name, operation in operations.items()}
+
+    def on_done(
+        self, operation, callback: Callable[[Any], None], name: str = "operation"
+    ) -> None:
+        """Calls callback with operation once it is done, without blocking.
+
+        The operation polls itself on a background thread.
+        """
+        start = time.perf_counter()
+
+        def done(future):
+            self._record(name, start, 0, "done")
+            callback(future)
+
+        operation.add_done_callback(done)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the numbers of waits, polls and timeouts, and the seconds waited."""
+        with self._lock:
+            return dict(self._totals)
+
+    def report(self) -> str:
+        """Describes the time spent waiting on operations."""
+        with self._lock:
+            stats, longest = dict(self._totals), self._longest
+        if longest is None:
+            return "No operations waited on"
+        return (
+            f"{stats['waits']} operations waited on for {stats['seconds']:.2f}s"
+            f" over {stats['polls']} polls"
+            f" (longest: {longest.name} {longest.seconds:.2f}s)"
+        )
+
+    def _record(self, name: str, start: float, polls: int, outcome: str) -> None:
+        wait = Wait(name, time.perf_counter() - start, polls, outcome)
+        with self._lock:
+            self.waits.append(wait)
+            self._totals["waits"] += 1
+            self._totals["polls"] += polls
+            self._totals["timeouts"] += outcome == "timeout"
+            self._totals["seconds"] += wait.seconds
+            if self._longest is None or wait.seconds > self._longest.seconds:
+                self._longest = wait
+
+
+operation_poller = OperationPoller()
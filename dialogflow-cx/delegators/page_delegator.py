@@ -18,11 +18,15 @@ import dialogflow_sample as ds
 import google.api_core.exceptions
 import google.cloud.dialogflowcx as cx
 
-from .client_delegator import ClientDelegator
+from .client_delegator import BufferedClientDelegator
 
 
-class PageDelegator(ClientDelegator):
-    """Class for organizing interactions with the Dialogflow Pages API."""
+class PageDelegator(BufferedClientDelegator):
+    """Class for organizing interactions with the Dialogflow Pages API.
+
+    Transition routes, form parameters and the entry fulfillment are buffered
+    and sent by flush, or with the page when it is created.
+    """
 
     _CLIENT_CLASS = cx.PagesClient
 
@@ -38,6 +42,15 @@ class PageDelegator(ClientDelegator):
             raise RuntimeError("Page not yet created")
         return self._page
 
+    @property
+    def resource(self):
+        """Accesses the page, or None if not yet set up."""
+        return self._page
+
+    def update(self, update_mask):
+        """Sends the update_mask fields of the page."""
+        return self.client.update_page(page=self.page, update_mask=update_mask)
+
     @property
     def parent(self):
         """Accesses the parent of page; equivalent to the start_flow."""
@@ -54,21 +67,30 @@ class PageDelegator(ClientDelegator):
             display_name=self.display_name,
             entry_fulfillment=self.entry_fulfillment,
         )
+        # Changes made before setup are created with the page.
+        for _, mutation in self._pending:
+            mutation(page)
         try:
             self._page = self.client.create_page(
                 parent=self.controller.start_flow,
                 page=page,
             )
+            self._pending = []
+            self.controller.resource_index.invalidate("pages", self.parent)
         except google.api_core.exceptions.AlreadyExists:
-
-            request = cx.ListPagesRequest(parent=self.parent)
-            for curr_page in self.client.list_pages(request=request):
-                if curr_page.display_name == self.display_name:
-                    request = cx.GetPageRequest(
-                        name=curr_page.name,
-                    )
-                    self._page = self.client.get_page(request=request)
-                    return
+            self.adopt()
+            if self._page is not None:
+                self.apply_pending(self._page)
+        self.flush()
+
+    def adopt(self):
+        """Takes over the existing page of the same display name, if any."""
+        self._page = self.controller.resource_index.find(
+            "pages",
+            self.client.list_pages,
+            cx.ListPagesRequest(parent=self.parent),
+            self.display_name,
+        )
 
     def tear_down(self, force=True):
         """Destroys the Dialogflow page."""
@@ -76,44 +98,84 @@ class PageDelegator(ClientDelegator):
         try:
             self.client.delete_page(request=request)
             self._page = None
+            self._changed_fields.clear()
+            self.controller.resource_index.invalidate("pages", self.parent)
         except google.api_core.exceptions.NotFound:
             pass
 
     def append_transition_route(
         self, target_page, intent=None, condition=None, trigger_fulfillment=None
     ):
-        """Appends a transition route to the page."""
+        """Appends a transition route to the page; sent by flush."""
         transition_route = cx.TransitionRoute(
             condition=condition,
             trigger_fulfillment=trigger_fulfillment,
             intent=intent,
             target_page=target_page,
         )
-        self.page.transition_routes.append(transition_route)
-        self.client.update_page(page=self.page)
+        self.mutate(
+            "transition_routes",
+            lambda page: page.transition_routes.append(transition_route),
+        )
 
     def add_parameter(self, display_name, entity_type, fill_behavior, **kwargs):
-        """Adds a form parameter to the page."""
+        """Adds a form parameter to the page, replacing any of the same name; sent by flush."""
         parameter = cx.Form.Parameter(
             display_name=display_name,
             entity_type=entity_type,
             fill_behavior=fill_behavior,
             **kwargs
         )
-        for page_idx, curr_parameter in enumerate(self.page.form.parameters):
-            if curr_parameter.display_name == display_name:
-                self.page.form.parameters[page_idx] = parameter
-                return
-        self.page.form.parameters.append(parameter)
+
+        def add(page):
+            for page_idx, curr_parameter in enumerate(page.form.parameters):
+                if curr_parameter.display_name == display_name:
+                    page.form.parameters[page_idx] = parameter
+                    return
+            page.form.parameters.append(parameter)
+
+        self.mutate("form.parameters", add)
+
+    def set_entry_fulfillment(self, entry_fulfillment):
+        """Sets the fulfillment run on entering the page; sent by flush."""
+        self._entry_fulfillment = entry_fulfillment
+
+        def set_fulfillment(page):
+            page.entry_fulfillment = entry_fulfillment
+
+        self.mutate("entry_fulfillment", set_fulfillment)
 
 
 class StartPageDelegator(PageDelegator):
-    """Special delegator necessary when the start page is a transition target."""
+    """Special delegator necessary when the start page is a transition target.
+
+    The start page exists with its flow, so it is never created or deleted:
+    setup only sends the changes made to it.
+    """
 
     @property
     def page(self):
-        """Mock out the page attribute with the expected name for this special case."""
-        return cx.Page(name=self.controller.start_flow_delegator.start_page_name)
+        """Accesses the start page of the start flow, by name."""
+        if self._page is None:
+            self._page = cx.Page(
+                name=self.controller.start_flow_delegator.start_page_name
+            )
+        return self._page
+
+    @property
+    def resource(self):
+        """Accesses the start page, which needs no setup to be changed."""
+        return self.page
+
+    def setup(self):
+        """Sends the changes made to the start page."""
+        self.flush()
+
+    def adopt(self):
+        """Nothing to adopt: the start page is restored with its flow."""
+
+    def tear_down(self, force=True):
+        """Leaves the start page, which is deleted with its flow."""
 
 
 class FulfillmentPageDelegator(PageDelegator):
@@ -125,6 +187,27 @@ class FulfillmentPageDelegator(PageDelegator):
         self._tag = kwargs.pop("tag", None)
         super().__init__(controller, **kwargs)
 
+    @property
+    def configuration(self):
+        """Accesses what the delegator declares, with the entry fulfillment."""
+        return {
+            **super().configuration,
+            "entry_fulfillment_text": self._entry_fulfillment_text,
+            "webhook": (
+                self._webhook_delegator.display_name
+                if self._webhook_delegator
+                else None
+            ),
+            "tag": self._tag,
+        }
+
+    @property
+    def dependencies(self):
+        """Accesses the delegators to set up first: the agent, and the webhook."""
+        if self._webhook_delegator is None:
+            return super().dependencies
+        return super().dependencies + (self._webhook_delegator,)
+
     def setup(self):
         """Initializes the fulfillment page delegator."""
         webhook_name = (
@@ -0,0 +1,151 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for setting up and tearing down sample components concurrently."""
+
+import concurrent.futures
+import dataclasses
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Step:
+    """A setup step, its tear down, and the steps it depends on."""
+
+    name: str
+    setup: Callable[[], None]
+    tear_down: Optional[Callable[[], None]] = None
+    depends_on: Tuple["Step", ...] = ()
+
+
+class Provisioner:
+    """Runs setup steps as a dependency graph on a thread pool.
+
+    A step starts as soon as the steps it depends on have finished, so
+    independent API calls overlap. Tear down walks the graph in reverse: a
+    step is torn down once every step depending on it has been. The wall
+    time of each step is kept in timings.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+        self.steps: List[Step] = []
+        self.delegators: List = []
+        self.timings: Dict[str, float] = {}
+        self._delegator_steps: Dict[int, Step] = {}
+
+    def add(self, name, setup, tear_down=None, depends_on=()) -> Step:
+        """Adds a step, after the given steps or delegators; returns the step."""
+        step = Step(
+            name=name,
+            setup=setup,
+            tear_down=tear_down,
+            depends_on=tuple(self._step(dependency) for dependency in depends_on),
+        )
+        self.steps.append(step)
+        return step
+
+    def add_delegator(self, delegator, tear_down=True, after=()) -> Step:
+        """Adds the setup of a delegator, after the delegators it declares.
+
+        after lists further steps or delegators to set up first, and so to
+        tear down last.
+        """
+        step = self.add(
+            delegator.step_name,
+            delegator.setup,
+            tear_down=delegator.tear_down if tear_down else None,
+            depends_on=tuple(delegator.dependencies) + tuple(after),
+        )
+        self._delegator_steps[id(delegator)] = step
+        self.delegators.append(delegator)
+        return step
+
+    def setup(self) -> Dict[str, float]:
+        """Runs every setup step; returns the wall time of each."""
+        dependencies = {step: step.depends_on for step in self.steps}
+        return self._run(dependencies, lambda step: step.setup())
+
+    def tear_down(self) -> Dict[str, float]:
+        """Runs every tear down, dependents first; returns the wall time of each."""
+        dependents: Dict[Step, Tuple[Step, ...]] = {step: () for step in self.steps}
+        for step in self.steps:
+            for dependency in step.depends_on:
+                dependents[dependency] += (step,)
+        return self._run(dependents, lambda step: step.tear_down and step.tear_down())
+
+    def report(self) -> str:
+        """Describes the timings of the last setup or tear down."""
+        timings = dict(self.timings)
+        total = timings.pop("total", 0.0)
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        return (
+            f"{len(timings)} steps in {total:.2f}s"
+            f" ({sum(timings.values()):.2f}s in sequence): {steps}"
+        )
+
+    def _step(self, dependency) -> Step:
+        if isinstance(dependency, Step):
+            return dependency
+        step = self._delegator_steps.get(id(dependency))
+        if step is None:
+            raise ValueError(f"Dependency added after its dependent: {dependency!r}")
+        return step
+
+    def _run(self, waits_for: Dict[Step, Tuple[Step, ...]], action) -> Dict[str, float]:
+        """Runs action on each step once all the steps it waits for are done.
+
+        After a failure, no more steps are started; the running ones are
+        waited for and the first error is raised.
+        """
+        timings: Dict[str, float] = {}
+        pending = dict(waits_for)
+        done = set()
+        error = None
+
+        def timed(step):
+            start = time.perf_counter()
+            action(step)
+            timings[step.name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            running: Dict[concurrent.futures.Future, Step] = {}
+            while True:
+                if error is None:
+                    for step in [
+                        step
+                        for step, waits in pending.items()
+                        if all(wait in done for wait in waits)
+                    ]:
+                        del pending[step]
+                        running[executor.submit(timed, step)] = step
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    step = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    done.add(step)
+        if error is not None:
+            raise error
+        if pending:
+            raise ValueError(f"Dependency cycle: {[step.name for step in pending]}")
+        timings["total"] = time.perf_counter() - start
+        self.timings = timings
+        return timings
@@ -0,0 +1,123 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for the process-wide display-name index of Dialogflow CX resources."""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Page sizes of the list calls of each collection: the API default, used by
+# the scans the index replaces, and the API maximum, used by the index. Test
+# cases are listed with the FULL view, which allows at most 20.
+PAGE_SIZES = {"test_cases": (20, 20)}
+DEFAULT_PAGE_SIZES = (100, 1000)
+
+
+def _pages(count: int, page_size: int) -> int:
+    return max(-(-count // page_size), 1)
+
+
+class ResourceIndex:
+    """Finds existing resources by display name, listing each collection once.
+
+    A collection, e.g. the intents of an agent, is listed on its first
+    lookup with page_size resources per call, by default the most the API
+    allows for the collection, and kept as a map from display name to
+    resource. Listed resources are complete, so no get call follows. Creating
+    or deleting a resource in the collection invalidates its map, and a
+    lookup that misses a kept map lists the collection again, in case the
+    resource was created since.
+    """
+
+    def __init__(self, page_size: Optional[int] = None) -> None:
+        self.page_size = page_size
+        self.lookups = 0
+        self.list_calls = 0
+        self.calls_replaced = 0
+        # (collection, parent): ({display name: (position, resource)}, size)
+        self._collections: Dict[Tuple[str, str], Tuple[Dict, int]] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def find(
+        self, collection: str, list_method, request, display_name
+    ) -> Optional[Any]:
+        """Returns the resource of the collection with display_name, or None.
+
+        collection names the repeated field of the list response, e.g.
+        "intents"; list_method is called with request, its page_size set.
+        """
+        key = (collection, request.parent)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            listing = self._collections.get(key)
+            if listing is None or display_name not in listing[0]:
+                listing = self._list(key, list_method, request)
+            resources, size = listing
+            position, resource = resources.get(display_name, (None, None))
+            # What the scan followed by a get call would have cost.
+            scanned = size if position is None else position + 1
+            default_size = PAGE_SIZES.get(collection, DEFAULT_PAGE_SIZES)[0]
+            replaced = _pages(scanned, default_size)
+            with self._lock:
+                self.lookups += 1
+                self.calls_replaced += replaced + (resource is not None)
+        return resource
+
+    def invalidate(self, collection: str, parent: str) -> None:
+        """Forgets the listing of a collection, after a create or delete."""
+        with self._lock:
+            self._collections.pop((collection, parent), None)
+
+    def clear(self) -> None:
+        """Forgets every listing."""
+        with self._lock:
+            self._collections.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the lookups served, the list calls made, and the calls saved."""
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "list_calls": self.list_calls,
+                "calls_saved": self.calls_replaced - self.list_calls,
+            }
+
+    def report(self) -> str:
+        """Describes the calls saved by the index."""
+        stats = self.stats()
+        return (
+            f"{stats['lookups']} lookups served by {stats['list_calls']} list calls"
+            f" ({stats['calls_saved']} calls saved)"
+        )
+
+    def _list(self, key, list_method, request):
+        request.page_size = self.page_size or (
+            PAGE_SIZES.get(key[0], DEFAULT_PAGE_SIZES)[1]
+        )
+        resources: Dict[str, Tuple[int, Any]] = {}
+        calls = position = 0
+        for response in list_method(request=request).pages:
+            calls += 1
+            for resource in getattr(response, key[0]):
+                resources.setdefault(resource.display_name, (position, resource))
+                position += 1
+        with self._lock:
+            self.list_calls += calls
+            self._collections[key] = (resources, position)
+        return resources, position
+
+
+resource_index = ResourceIndex()
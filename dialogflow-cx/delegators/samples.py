@@ -0,0 +1,105 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for the setup steps and command line shared by the page samples."""
+
+import functools
+
+from .nlu_fingerprint import LocalFingerprintStore
+from .provisioner import Provisioner
+from .snapshot_cache import DEFAULT_DIRECTORY, SnapshotCache
+
+
+def route_start_flow(sample):
+    """Routes the intent of the sample from its start flow to its page."""
+    sample.start_flow_delegator.append_transition_route(
+        target_page=sample.page_delegator.page.name,
+        intent=sample.intent_delegator.intent.name,
+    )
+    sample.start_flow_delegator.flush()
+
+
+def page_sample_provisioner(sample, page_after=()):
+    """Declares the setup steps of a sample routing an intent to a webhook page.
+
+    page_after lists further steps or delegators to set up before the page.
+    """
+    provisioner = Provisioner()
+    provisioner.add_delegator(sample.agent_delegator)
+    provisioner.add_delegator(sample.webhook_delegator)
+    provisioner.add_delegator(sample.intent_delegator)
+    provisioner.add_delegator(sample.page_delegator, after=page_after)
+    provisioner.add_delegator(sample.start_flow_delegator, tear_down=False)
+    # Tearing down the routes first releases the page and intent.
+    provisioner.add(
+        "StartFlowRoutes",
+        functools.partial(route_start_flow, sample),
+        tear_down=sample.start_flow_delegator.tear_down,
+        depends_on=[
+            sample.start_flow_delegator,
+            sample.page_delegator,
+            sample.intent_delegator,
+        ],
+    )
+    return provisioner
+
+
+def add_provisioning_arguments(parser):
+    """Adds the options of run_sample to an argparse parser."""
+    parser.add_argument(
+        "--snapshot-cache",
+        nargs="?",
+        const=DEFAULT_DIRECTORY,
+        default=None,
+        help="Restore the agent from an exported snapshot cached in this directory",
+    )
+    parser.add_argument(
+        "--fingerprint-file",
+        default=None,
+        help="Keep the NLU fingerprint last trained on here, not in the agent description",
+    )
+
+
+def run_sample(sample_class, args):
+    """Sets up a sample from its command line, runs the user input, and prints reports.
+
+    args are the parsed arguments, as a dict. user_input, tear_down and the
+    options of add_provisioning_arguments are taken out of it; the rest are
+    passed to sample_class.
+    """
+    user_input = args.pop("user_input", [])
+    tear_down = args.pop("tear_down")
+    snapshot_cache = args.pop("snapshot_cache")
+    fingerprint_file = args.pop("fingerprint_file")
+    sample = sample_class(**args)
+    if snapshot_cache:
+        sample.set_snapshot_cache(SnapshotCache(snapshot_cache))
+    if fingerprint_file:
+        sample.set_fingerprint_store(LocalFingerprintStore(fingerprint_file))
+    sample.warm_up()
+    sample.setup()
+    print(sample.provisioning_report())
+    print(sample.training_report())
+    print(sample.operation_poller.report())
+    print(sample.resource_index.report())
+    sample.run(user_input)
+    print(sample.client_pool.report())
+    if tear_down:
+        sample.tear_down()
+        print(sample.provisioner.report())
+    else:
+        print(
+            "Agent sample available at: "
+            f"https://dialogflow.cloud.google.com/cx/{sample.start_flow_delegator.flow.name}"
+        )
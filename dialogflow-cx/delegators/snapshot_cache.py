@@ -0,0 +1,133 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module for the on-disk cache of exported agent snapshots."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "dialogflow-cx-samples", "snapshots"
+)
+
+
+class SnapshotCache:
+    """Content-addressed cache of exported agents, with a size cap.
+
+    Blobs are stored once under the sha256 of their content. A key, e.g. the
+    hash of a sample's declared configuration, refers to a blob and carries
+    metadata. Reading a key marks its blob as recently used; once the blobs
+    exceed max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes=256 << 20) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "refs"), exist_ok=True)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Returns the content and metadata cached for key, or None."""
+        ref_path = self._ref_path(key)
+        with self._lock:
+            try:
+                with open(ref_path, "r", encoding="utf8") as file_handle:
+                    ref = json.load(file_handle)
+                blob_path = self._blob_path(ref["digest"])
+                with open(blob_path, "rb") as file_handle:
+                    content = file_handle.read()
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            if hashlib.sha256(content).hexdigest() != ref["digest"]:
+                # Truncated or corrupted: drop it, the snapshot is rebuilt.
+                self._remove(blob_path)
+                self.misses += 1
+                return None
+            os.utime(blob_path)
+            self.hits += 1
+            return content, ref.get("metadata", {})
+
+    def put(self, key: str, content: bytes, **metadata) -> str:
+        """Caches content for key, with metadata; returns its digest."""
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            blob_path = self._blob_path(digest)
+            if os.path.exists(blob_path):
+                os.utime(blob_path)
+            else:
+                self._write(blob_path, content)
+            ref = {"digest": digest, "metadata": metadata}
+            self._write(self._ref_path(key), json.dumps(ref).encode())
+            self._evict(keep=blob_path)
+        return digest
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the numbers of blobs, bytes cached, hits and misses."""
+        with self._lock:
+            blobs = self._blobs()
+        return {
+            "blobs": len(blobs),
+            "bytes": sum(size for _, size, _ in blobs),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.directory, "refs", f"{key}.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest)
+
+    def _blobs(self):
+        blobs = []
+        with os.scandir(os.path.join(self.directory, "blobs")) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    blobs.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return blobs
+
+    def _evict(self, keep: str) -> None:
+        blobs = sorted(self._blobs())
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in blobs:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                total -= size
+
+    def _write(self, path: str, content: bytes) -> None:
+        # Written aside, then renamed: readers never see a partial file.
+        descriptor, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=".tmp-"
+        )
+        with os.fdopen(descriptor, "wb") as file_handle:
+            file_handle.write(content)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
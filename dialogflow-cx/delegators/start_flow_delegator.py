@@ -16,17 +16,23 @@
 
 import dialogflow_sample as ds
 import google.cloud.dialogflowcx as cx
+from google.protobuf.field_mask_pb2 import (  # pylint: disable=no-name-in-module
+    FieldMask,
+)
 
-from .client_delegator import ClientDelegator
+from .client_delegator import BufferedClientDelegator
 
 
-class StartFlowDelegator(ClientDelegator):
-    """Class for organizing interactions with the Dialogflow Flows API."""
+class StartFlowDelegator(BufferedClientDelegator):
+    """Class for organizing interactions with the Dialogflow Flows API.
+
+    Transition routes are buffered and sent by flush.
+    """
 
     _CLIENT_CLASS = cx.FlowsClient
 
-    def __init__(self, controller: ds.DialogflowSample) -> None:
-        super().__init__(controller)
+    def __init__(self, controller: ds.DialogflowSample, **kwargs) -> None:
+        super().__init__(controller, **kwargs)
         self._flow = None
 
     @property
@@ -36,25 +42,41 @@ class StartFlowDelegator(ClientDelegator):
             raise RuntimeError("Flow not yet created")
         return self._flow
 
+    @property
+    def resource(self):
+        """Accesses the flow, or None if not yet set up."""
+        return self._flow
+
+    def update(self, update_mask):
+        """Sends the update_mask fields of the flow."""
+        return self.client.update_flow(flow=self.flow, update_mask=update_mask)
+
     def setup(self):
         """Initializes the start flow delegator."""
-        flow_name = self.controller.start_flow
-        self._flow = self.client.get_flow(name=flow_name)
+        self.adopt()
+        self.apply_pending(self._flow)
+        self.flush()
+
+    def adopt(self):
+        """Takes over the start flow of the agent."""
+        self._flow = self.client.get_flow(name=self.controller.start_flow)
 
     def append_transition_route(self, target_page, intent):
-        """Appends a transition route to the flow."""
-        self.flow.transition_routes.append(
-            cx.TransitionRoute(
-                intent=intent,
-                target_page=target_page,
-            )
+        """Appends a transition route to the flow; sent by flush."""
+        transition_route = cx.TransitionRoute(
+            intent=intent,
+            target_page=target_page,
+        )
+        self.mutate(
+            "transition_routes",
+            lambda flow: flow.transition_routes.append(transition_route),
         )
-        self.client.update_flow(flow=self.flow)
 
     def tear_down(self):
         """Removes the appended transition routes; required to delete agent."""
         self.flow.transition_routes = self.flow.transition_routes[:1]
-        self.client.update_flow(flow=self.flow)
+        self._changed_fields.clear()
+        self.update(FieldMask(paths=["transition_routes"]))
 
     @property
     def start_page_name(self):
@@ -51,7 +51,7 @@ class TestCaseDelegator(ClientDelegator):
         """Initializes the test cases delegator."""
         try:
             self._test_case = self.client.create_test_case(
-                parent=self.controller.agent_delegator.agent.name,
+                parent=self.parent,
                 test_case=cx.TestCase(
                     display_name=self.display_name,
                     test_case_conversation_turns=[
@@ -61,15 +61,20 @@ class TestCaseDelegator(ClientDelegator):
                     test_config=cx.TestConfig(flow=self.controller.start_flow),
                 ),
             )
+            self.controller.resource_index.invalidate("test_cases", self.parent)
         except google.api_core.exceptions.AlreadyExists:
-            request = cx.ListTestCasesRequest(parent=self.parent)
-            for curr_test_case in self.client.list_test_cases(request=request):
-                if curr_test_case.display_name == self.display_name:
-                    request = cx.GetTestCaseRequest(
-                        name=curr_test_case.name,
-                    )
-                    self._test_case = self.client.get_test_case(request=request)
-                    return
+            self.adopt()
+
+    def adopt(self):
+        """Takes over the existing test case of the same display name, if any."""
+        self._test_case = self.controller.resource_index.find(
+            "test_cases",
+            self.client.list_test_cases,
+            cx.ListTestCasesRequest(
+                parent=self.parent, view=cx.ListTestCasesRequest.TestCaseView.FULL
+            ),
+            self.display_name,
+        )
 
     def tear_down(self):
         """Destroys the test case."""
@@ -80,36 +85,42 @@ class TestCaseDelegator(ClientDelegator):
         try:
             self.client.batch_delete_test_cases(request=request)
             self._test_case = None
+            self.controller.resource_index.invalidate("test_cases", self.parent)
         except google.api_core.exceptions.NotFound:
             pass
 
     def run_test_case(self, wait=10, max_retries=3):
-        """Runs the test case."""
-        retry_count = 0
-        result = None
-        while retry_count < max_retries:
-            time.sleep(wait)
-            lro = self.client.run_test_case(
-                request=cx.RunTestCaseRequest(name=self.test_case.name)
-            )
-            while lro.running():
-                try:
-                    result = lro.result().result
-                    agent_response_differences = [
-                        conversation_turn.virtual_agent_output.differences
-                        for conversation_turn in result.conversation_turns
-                    ]
-                    test_case_fail = result.test_result != cx.TestResult.PASSED
-                    if any(agent_response_differences) or test_case_fail:
-                        raise DialogflowTestCaseFailure(
-                            f'Test "{self.test_case.display_name}" failed'
-                        )
-                    return
-                except google.api_core.exceptions.NotFound as exc:
-                    if str(exc) == (
-                        "404 com.google.apps.framework.request.NotFoundException: "
-                        "NLU model for flow '00000000-0000-0000-0000-000000000000' does not exist. "
-                        "Please try again after retraining the flow."
-                    ):
-                        retry_count += 1
-        raise RuntimeError(f"Retry count exceeded: {retry_count}")
+        """Runs the test case.
+
+        Runs it again, wait seconds later, while the NLU model of the flow
+        is still being trained.
+        """
+        for attempt in range(max_retries):
+            if attempt:
+                time.sleep(wait)
+            try:
+                lro = self.client.run_test_case(
+                    request=cx.RunTestCaseRequest(name=self.test_case.name)
+                )
+                result = self.controller.operation_poller.wait(
+                    lro, name=f"run_test_case {self.display_name}"
+                ).result
+            except google.api_core.exceptions.NotFound as exc:
+                if str(exc) != (
+                    "404 com.google.apps.framework.request.NotFoundException: "
+                    "NLU model for flow '00000000-0000-0000-0000-000000000000' does not exist. "
+                    "Please try again after retraining the flow."
+                ):
+                    raise
+                continue
+            agent_response_differences = [
+                conversation_turn.virtual_agent_output.differences
+                for conversation_turn in result.conversation_turns
+            ]
+            test_case_fail = result.test_result != cx.TestResult.PASSED
+            if any(agent_response_differences) or test_case_fail:
+                raise DialogflowTestCaseFailure(
+                    f'Test "{self.test_case.display_name}" failed'
+                )
+            return
+        raise RuntimeError(f"Retry count exceeded: {max_retries}")
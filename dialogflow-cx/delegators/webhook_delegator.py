@@ -32,6 +32,11 @@ class WebhookDelegator(ClientDelegator):
         self._webhook = None
         super().__init__(controller, **kwargs)
 
+    @property
+    def configuration(self):
+        """Accesses what the delegator declares, with the webhook URI."""
+        return {**super().configuration, "uri": self._uri}
+
     @property
     def webhook(self):
         """Webhook set in Dialogflow."""
@@ -52,17 +57,18 @@ class WebhookDelegator(ClientDelegator):
                 parent=self.parent,
                 webhook=webhook,
             )
+            self.controller.resource_index.invalidate("webhooks", self.parent)
         except google.api_core.exceptions.AlreadyExists:
-            request = cx.ListWebhooksRequest(
-                parent=self.parent,
-            )
-            for webhook in self.client.list_webhooks(request=request):
-                if webhook.display_name == self.display_name:
-                    request = cx.GetWebhookRequest(
-                        name=webhook.name,
-                    )
-                    self._webhook = self.client.get_webhook(request=request)
-                    break
+            self.adopt()
+
+    def adopt(self):
+        """Takes over the existing webhook of the same display name, if any."""
+        self._webhook = self.controller.resource_index.find(
+            "webhooks",
+            self.client.list_webhooks,
+            cx.ListWebhooksRequest(parent=self.parent),
+            self.display_name,
+        )
 
     def tear_down(self):
         """Destroys the Dialogflow webhook."""
@@ -70,5 +76,6 @@ class WebhookDelegator(ClientDelegator):
         try:
             self.client.delete_webhook(request=request)
             self._webhook = None
+            self.controller.resource_index.invalidate("webhooks", self.parent)
         except google.api_core.exceptions.NotFound:
             pass
@@ -15,6 +15,8 @@
 """Module for the base class for all Dialogflow CX samples."""
 
 
+import hashlib
+import json
 import time
 import uuid
 
@@ -34,7 +36,13 @@ class SessionParametersFailure(AssertionError):
     """Exception to raise when a test case fails"""
 
 
-class DialogflowSample:
+# Defaults of sample components, by name, each built from the sample. The
+# delegators package registers them when imported: it imports this module,
+# which therefore cannot import it.
+DEFAULTS = {}
+
+
+class DialogflowSample:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
     """Base class for samples."""
 
     def __init__(self) -> None:
@@ -44,6 +52,14 @@ class DialogflowSample:
         self._test_cases_client = None
         self._start_flow_delegator = None
         self._session_delegator = None
+        self._client_pool = None
+        self._resource_index = None
+        self._operation_poller = None
+        self._snapshot_cache = None
+        self.provisioner = None
+        self.provisioning = {}
+        self._fingerprint_store = None
+        self.training = {}
 
     def set_auth_delegator(self, auth_delegator):
         """Sets the AuthDelegator for the sample."""
@@ -61,10 +77,40 @@ class DialogflowSample:
         """Sets the AgentDelegator for the sample."""
         self._start_flow_delegator = start_flow_delegator
 
+    def set_client_pool(self, client_pool):
+        """Sets the ClientPool for the sample, instead of the process-wide one."""
+        self._client_pool = client_pool
+
+    def set_resource_index(self, resource_index):
+        """Sets the ResourceIndex for the sample, instead of the process-wide one."""
+        self._resource_index = resource_index
+
+    def set_operation_poller(self, operation_poller):
+        """Sets the OperationPoller for the sample, instead of the process-wide one."""
+        self._operation_poller = operation_poller
+
+    def set_snapshot_cache(self, snapshot_cache):
+        """Sets the SnapshotCache to provision the sample from, or None."""
+        self._snapshot_cache = snapshot_cache
+
+    def set_fingerprint_store(self, fingerprint_store):
+        """Sets where the NLU fingerprint last trained on is kept, or None to always train."""
+        self._fingerprint_store = fingerprint_store
+
     def set_credentials(self, credentials):
         """Sets the AgentDelegator for the sample."""
         self._credentials = credentials
 
+    def _default(self, name):
+        try:
+            default = DEFAULTS[name]
+        except KeyError:
+            raise RuntimeError(
+                f"No default {name} for {type(self).__name__}: import the"
+                " delegators package, which registers the sample defaults"
+            ) from None
+        return default(self)
+
     @property
     def auth_delegator(self):
         """Accesses the auth_delegator for the sample."""
@@ -110,24 +156,195 @@ class DialogflowSample:
         """Accesses the client_options for the delegator."""
         return {"api_endpoint": f"{self.location}-dialogflow.googleapis.com"}
 
+    @property
+    def client_pool(self):
+        """Accesses the ClientPool shared by the delegators of the sample."""
+        if self._client_pool is None:
+            self._client_pool = self._default("client_pool")
+        return self._client_pool
+
+    @property
+    def resource_index(self):
+        """Accesses the ResourceIndex used to find resources that already exist."""
+        if self._resource_index is None:
+            self._resource_index = self._default("resource_index")
+        return self._resource_index
+
+    @property
+    def operation_poller(self):
+        """Accesses the OperationPoller used to wait on long-running operations."""
+        if self._operation_poller is None:
+            self._operation_poller = self._default("operation_poller")
+        return self._operation_poller
+
+    @property
+    def fingerprint_store(self):
+        """Accesses the store of the NLU fingerprint last trained on.
+
+        Defaults to the description of the agent.
+        """
+        if self._fingerprint_store is None:
+            self._fingerprint_store = self._default("fingerprint_store")
+        return self._fingerprint_store
+
+    @property
+    def nlu_fingerprint(self):
+        """Accesses the fingerprint of the intents and start flow routes of the sample."""
+        return self._default("nlu_fingerprint")
+
     @property
     def test_cases_client(self):
         """Accesses the test_case_delegators for the sample."""
         if self._test_cases_client is None:
-            self._test_cases_client = cx.TestCasesClient(
+            self._test_cases_client = self.client_pool.get(
+                cx.TestCasesClient,
                 client_options=self.client_options,
                 credentials=self.credentials,
             )
         return self._test_cases_client
 
+    @property
+    def delegators(self):
+        """Accesses the API delegators of the sample, in the order they were set."""
+        return self._default("delegators")
+
+    @property
+    def configuration(self):
+        """Accesses what the sample declares: its constants, and its delegators'."""
+        return {
+            "sample": type(self).__name__,
+            "location": self.location,
+            "constants": {
+                name: value
+                for name, value in vars(type(self)).items()
+                if name.lstrip("_").isupper()
+            },
+            "delegators": [delegator.configuration for delegator in self.delegators],
+        }
+
+    @property
+    def configuration_hash(self):
+        """Accesses the sha256 of the configuration of the sample."""
+        encoded = json.dumps(self.configuration, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def provision(self):
+        """Creates the sample components, or restores them from a snapshot.
+
+        Without a snapshot cache, runs the provisioner. With one, a sample
+        whose configuration was built before is restored into its agent with
+        one restore_agent call; otherwise it is built, then exported to the
+        cache. Returns, and keeps in provisioning, the mode and timings.
+        """
+        cache = self._snapshot_cache
+        start = time.perf_counter()
+        cached = cache.get(self.configuration_hash) if cache is not None else None
+        if cached is None:
+            self.provisioner.setup()
+            seconds = time.perf_counter() - start
+            self.provisioning = {"mode": "build", "seconds": seconds}
+            if cache is not None:
+                cache.put(
+                    self.configuration_hash, self.export_agent(), build_seconds=seconds
+                )
+        else:
+            content, metadata = cached
+            self.restore_agent(content)
+            self.provisioning = {
+                "mode": "restore",
+                "seconds": time.perf_counter() - start,
+                "build_seconds": metadata.get("build_seconds"),
+            }
+        return self.provisioning
+
+    def provisioning_report(self):
+        """Describes how the sample was provisioned, and the restore speedup."""
+        if self.provisioning.get("mode") != "restore":
+            return self.provisioner.report()
+        seconds = self.provisioning["seconds"]
+        report = f"Restored from snapshot in {seconds:.2f}s"
+        build_seconds = self.provisioning["build_seconds"]
+        if build_seconds:
+            report += (
+                f"; incremental setup took {build_seconds:.2f}s"
+                f" ({build_seconds / seconds:.1f}x)"
+            )
+        return report
+
+    def export_agent(self):
+        """Exports the agent of the sample; returns its content."""
+        lro = self.agent_delegator.client.export_agent(
+            request=cx.ExportAgentRequest(name=self.agent_delegator.agent.name)
+        )
+        return self.operation_poller.wait(lro, name="export_agent").agent_content
+
+    def restore_agent(self, content):
+        """Restores the agent of the sample from content, and adopts its components."""
+        self.agent_delegator.setup()
+        lro = self.agent_delegator.client.restore_agent(
+            request=cx.RestoreAgentRequest(
+                name=self.agent_delegator.agent.name, agent_content=content
+            )
+        )
+        self.operation_poller.wait(lro, name="restore_agent")
+        self.resource_index.clear()
+        for delegator in self.provisioner.delegators:
+            if delegator is not self.agent_delegator:
+                delegator.adopt()
+
+    def warm_up(self, timeout=10.0):
+        """Fetches an access token, builds every API client and opens channels.
+
+        Pays the token exchange and connection setup once, up front, instead
+        of on the first call of each step. Returns the number of channels
+        that became ready within timeout seconds.
+        """
+        self.auth_delegator.warm_up()
+        for delegator in self.delegators:
+            _ = delegator.client
+        _ = self.test_cases_client
+        return self.client_pool.connect(timeout=timeout)
+
     def setup(self, wait=0):
-        """Set up sample. Especially, train the start flow."""
+        """Set up sample. Especially, train the start flow.
+
+        Training, and the wait after it, are skipped when the NLU fingerprint
+        matches the one last trained on. A sample restored from a snapshot is
+        always trained, since a restored flow must be trained before it is
+        queried; with the default store, the restore also drops the
+        fingerprint. The decision and its timing are
+        kept in training.
+        """
+        start = time.perf_counter()
+        fingerprint = self.nlu_fingerprint
+        restored = self.provisioning.get("mode") == "restore"
+        if not restored and self.fingerprint_store.get(self) == fingerprint:
+            self.training = {
+                "decision": "skip",
+                "fingerprint": fingerprint,
+                "seconds": time.perf_counter() - start,
+            }
+            return
         request = cx.TrainFlowRequest(name=self.start_flow_delegator.flow.name)
         lro = self.start_flow_delegator.client.train_flow(request=request)
-        time.time()
-        while lro.running():
-            time.sleep(0.1)
+        self.operation_poller.wait(lro, name="train_flow")
         time.sleep(wait)
+        self.fingerprint_store.put(self, fingerprint)
+        self.training = {
+            "decision": "train",
+            "fingerprint": fingerprint,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def training_report(self):
+        """Describes whether the start flow was trained, and how long it took."""
+        if not self.training:
+            return "Not set up"
+        verb = "Trained" if self.training["decision"] == "train" else "Skipped training"
+        return (
+            f"{verb} in {self.training['seconds']:.2f}s"
+            f" (NLU fingerprint {self.training['fingerprint'][:12]})"
+        )
 
     #  pylint: disable=too-many-arguments
     def run(
@@ -171,26 +388,26 @@ class DialogflowSample:
         """Create a test case."""
         if flow is None:
             flow = self.start_flow
+        parent = self.agent_delegator.agent.name
         try:
             test_case = self.test_cases_client.create_test_case(
-                parent=self.agent_delegator.agent.name,
+                parent=parent,
                 test_case=cx.TestCase(
                     display_name=display_name,
                     test_case_conversation_turns=test_case_conversation_turns,
                     test_config=cx.TestConfig(flow=flow),
                 ),
             )
+            self.resource_index.invalidate("test_cases", parent)
         except google.api_core.exceptions.AlreadyExists:
-            request = cx.ListTestCasesRequest(parent=self.agent_delegator.agent.name)
-            for curr_test_case in self.test_cases_client.list_test_cases(
-                request=request
-            ):
-                if curr_test_case.display_name == display_name:
-                    request = cx.GetTestCaseRequest(
-                        name=curr_test_case.name,
-                    )
-                    test_case = self.test_cases_client.get_test_case(request=request)
-                    break
+            test_case = self.resource_index.find(
+                "test_cases",
+                self.test_cases_client.list_test_cases,
+                cx.ListTestCasesRequest(
+                    parent=parent, view=cx.ListTestCasesRequest.TestCaseView.FULL
+                ),
+                display_name,
+            )
         return test_case
 
     def run_test_case(self, test_case, expected_session_parameters):
@@ -198,9 +415,9 @@ class DialogflowSample:
         lro = self.test_cases_client.run_test_case(
             request=cx.RunTestCaseRequest(name=test_case.name)
         )
-        while lro.running():
-            time.sleep(0.1)
-        result = lro.result().result
+        result = self.operation_poller.wait(
+            lro, name=f"run_test_case {test_case.display_name}"
+        ).result
         agent_response_differences = [
             conversation_turn.virtual_agent_output.differences
             for conversation_turn in result.conversation_turns
@@ -18,6 +18,9 @@ import uuid
 from typing import Generator
 
 import pytest
+from basic_webhook_sample import BasicWebhookSample
+from delegators import ClientPool
+from google.auth.credentials import AnonymousCredentials
 from utilities import RequestMock
 from webhook.main import get_webhook_uri
 
@@ -52,3 +55,28 @@ def fixture_build_uuid():
 def fixture_webhook_uri(project_id, build_uuid):
     """Test fixture providings the URI for the fixture webhook."""
     return get_webhook_uri(project_id, build_uuid)
+
+
+@pytest.fixture(name="build_sample")
+def fixture_build_sample():
+    """Test fixture building samples whose clients never contact Dialogflow."""
+
+    def build_sample(
+        pool=None,
+        credentials=None,
+        location="global",
+        webhook_uri="https://example.com/webhook",
+    ):
+        sample = BasicWebhookSample(
+            project_id="mock-project",
+            agent_display_name="mock-agent",
+            webhook_uri=webhook_uri,
+        )
+        object.__setattr__(sample.auth_delegator, "location", location)
+        sample.set_client_pool(ClientPool() if pool is None else pool)
+        sample.set_credentials(
+            AnonymousCredentials() if credentials is None else credentials
+        )
+        return sample
+
+    return build_sample
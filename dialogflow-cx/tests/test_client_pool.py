@@ -0,0 +1,74 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the process-wide pool of Dialogflow CX API clients."""
+
+import dialogflow_sample as ds
+import google.cloud.dialogflowcx as cx
+import grpc
+import pytest
+from delegators import ClientPool
+from google.auth.credentials import AnonymousCredentials
+
+
+def sample_clients(sample):
+    """Accesses the client of every delegator of the sample."""
+    return [
+        sample.agent_delegator.client,
+        sample.webhook_delegator.client,
+        sample.intent_delegator.client,
+        sample.page_delegator.client,
+        sample.start_flow_delegator.client,
+        sample.start_page_delegator.client,
+        sample.session_delegator.client,
+        sample.test_cases_client,
+    ]
+
+
+@pytest.mark.hermetic
+def test_client_pool_shares_channels(build_sample):
+    """Delegators share one channel per endpoint and credentials."""
+    # Arrange:
+    pool = ClientPool(compression=grpc.Compression.Gzip)
+    credentials = AnonymousCredentials()
+
+    # Act:
+    first = sample_clients(build_sample(pool, credentials))
+    second = sample_clients(build_sample(pool, credentials))
+    regional = sample_clients(build_sample(pool, credentials, location="us-east1"))
+    other = sample_clients(build_sample(pool, AnonymousCredentials()))
+    stats, report = pool.stats(), pool.report()
+    pool.close()
+
+    # Assert:
+    assert all(left is right for left, right in zip(first, second))
+    assert len({id(client.transport.grpc_channel) for client in first}) == 1
+    assert regional[0].transport.grpc_channel is not first[0].transport.grpc_channel
+    assert other[0] is not first[0]
+    assert isinstance(first[0], cx.AgentsClient)
+    # Seven client classes, for three endpoint and credentials pairs.
+    assert stats == {"clients": 21, "channels": 3, "channels_saved": 18}
+    assert report == "21 API clients share 3 gRPC channels (18 saved)"
+    assert pool.stats()["clients"] == 0
+
+
+@pytest.mark.hermetic
+def test_sample_defaults_name_missing_import(monkeypatch):
+    """Without the delegators package, a default names the import it needs."""
+    # Arrange:
+    monkeypatch.setattr(ds, "DEFAULTS", {})
+
+    # Act/Assert:
+    with pytest.raises(RuntimeError, match="import the delegators package"):
+        _ = ds.DialogflowSample().client_pool
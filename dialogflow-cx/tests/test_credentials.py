@@ -0,0 +1,134 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the process-wide credential cache and token refresher."""
+
+import datetime
+import os
+import threading
+
+import google.auth.exceptions
+import pytest
+from delegators import ClientPool
+from delegators.auth_delegator import (
+    CredentialCache,
+    TokenRefresher,
+    credential_cache,
+)
+
+
+class StandInCredentials:
+    """Credentials whose tokens last lifetime seconds, after failures failed refreshes."""
+
+    def __init__(self, lifetime=3600.0, failures=0):
+        self.lifetime = lifetime
+        self.failures = failures
+        self.expiry = None
+        self.refreshed = threading.Event()
+
+    @property
+    def valid(self):
+        """Accesses whether a token is set and unexpired."""
+        return self.expiry is not None and self.expiry > datetime.datetime.utcnow()
+
+    def refresh(self, request):
+        """Sets a new token, unless the refresh is set to fail."""
+        del request
+        if self.failures:
+            self.failures -= 1
+            raise google.auth.exceptions.TransportError("unavailable")
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.lifetime
+        )
+        self.refreshed.set()
+
+
+@pytest.mark.hermetic
+def test_credential_cache_reads_file_once(tmp_path):
+    """Credentials are loaded once per file and quota project, and replaced on change."""
+    # Arrange:
+    path = tmp_path / "credentials.json"
+    path.write_text("{}")
+    loads = []
+    cache = CredentialCache(
+        loader=lambda *key: loads.append(key) or StandInCredentials()
+    )
+
+    # Act:
+    first = cache.get(str(path))
+    second = cache.get(str(path))
+    quota = cache.get(str(path), "quota-project")
+    refresher = cache.warm_up(first)
+    os.utime(path, ns=(0, 0))
+    changed = cache.get(str(path))
+    stale_running = refresher.running
+    changed_again = cache.get(str(path))
+    cache.clear()
+
+    # Assert:
+    assert first is second
+    assert quota is not first and changed is not first
+    assert changed_again is changed
+    assert cache.loads == len(loads) == 3
+    assert not stale_running
+
+
+@pytest.mark.hermetic
+def test_token_refresher_renews_before_expiry():
+    """Tokens are renewed margin seconds before expiry; failures are retried."""
+    # Arrange:
+    credentials = StandInCredentials(lifetime=1.0, failures=2)
+    refresher = TokenRefresher(
+        credentials, margin=0.9, retry_interval=0.01, request_factory=object
+    )
+    fresh = StandInCredentials()
+    fresh.refresh(None)
+
+    # Act:
+    refresher.start()
+    renewed = credentials.refreshed.wait(5)
+    credentials.refreshed.clear()
+    renewed_again = credentials.refreshed.wait(5)
+    refresher.stop()
+
+    # Assert:
+    assert renewed and renewed_again
+    assert refresher.failures == 2 and refresher.refreshes >= 2
+    assert not refresher.running
+    assert 3200 < TokenRefresher(fresh).delay() <= 3300
+    assert TokenRefresher(StandInCredentials()).delay() == 0.0
+
+
+@pytest.mark.hermetic
+def test_sample_warm_up(build_sample):
+    """warm_up fetches a token, builds every client and connects the pool."""
+    # Arrange:
+    cache = CredentialCache()
+    credentials = StandInCredentials()
+    pool = ClientPool()
+    sample = build_sample(pool)
+
+    # Act:
+    refresher = cache.warm_up(credentials)
+    ready = sample.warm_up(timeout=0.01)
+    stats = pool.stats()
+    cache.clear()
+    credential_cache.clear()
+    pool.close()
+
+    # Assert:
+    assert credentials.valid and refresher.refreshes == 1
+    assert not refresher.running
+    assert stats["clients"] == 7 and stats["channels"] == 1
+    assert 0 <= ready <= 1
@@ -0,0 +1,183 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the buffered, field-masked page and flow updates."""
+
+import types
+
+import google.api_core.exceptions
+import google.cloud.dialogflowcx as cx
+import pytest
+from delegators import (
+    BufferedClientDelegator,
+    PageDelegator,
+    ResourceIndex,
+    StartFlowDelegator,
+    StartPageDelegator,
+)
+
+FLOW_NAME = "projects/p/locations/global/agents/a/flows/f"
+
+
+class StandInClient:
+    """Records page and flow calls; create_page fails if exists is set."""
+
+    def __init__(self, exists=False):
+        self.exists = exists
+        self.calls = []
+
+    def create_page(self, parent, page):
+        """Creates the page, unless it exists."""
+        self.calls.append(("create_page", parent))
+        if self.exists:
+            raise google.api_core.exceptions.AlreadyExists("exists")
+        return cx.Page(page, name=f"{parent}/pages/1")
+
+    def list_pages(self, request):
+        """Lists the existing page."""
+        self.calls.append(("list_pages", request.parent))
+        page = cx.Page(name=f"{request.parent}/pages/1", display_name="page")
+        return types.SimpleNamespace(pages=[cx.ListPagesResponse(pages=[page])])
+
+    def update_page(self, page, update_mask):
+        """Records the fields sent."""
+        self.calls.append(("update_page", list(update_mask.paths), page))
+        return page
+
+    def get_flow(self, name):
+        """Gets the flow, with its default route."""
+        self.calls.append(("get_flow", name))
+        return cx.Flow(name=name, transition_routes=[cx.TransitionRoute()])
+
+    def update_flow(self, flow, update_mask):
+        """Records the fields sent."""
+        self.calls.append(("update_flow", list(update_mask.paths), flow))
+        return flow
+
+
+def build_page_delegator(client):
+    """Builds a PageDelegator whose start flow is FLOW_NAME."""
+    controller = types.SimpleNamespace(
+        start_flow=FLOW_NAME, resource_index=ResourceIndex()
+    )
+    return PageDelegator(controller, client=client, display_name="page")
+
+
+def add_changes(delegator):
+    """Adds two routes, a form parameter and an entry fulfillment."""
+    for target in ["a", "b"]:
+        delegator.append_transition_route(target_page=target, condition="true")
+    delegator.add_parameter(
+        "age", "sys.number", cx.Form.Parameter.FillBehavior(), required=True
+    )
+    delegator.set_entry_fulfillment(cx.Fulfillment(tag="entry"))
+
+
+@pytest.mark.hermetic
+def test_page_changes_sent_in_one_masked_update():
+    """Changes after setup are sent by flush in one update of those fields."""
+    # Arrange:
+    client = StandInClient()
+    delegator = build_page_delegator(client)
+    delegator.setup()
+
+    # Act:
+    add_changes(delegator)
+    changed_fields = delegator.changed_fields
+    delegator.flush()
+    delegator.flush()
+
+    # Assert:
+    assert changed_fields == [
+        "entry_fulfillment",
+        "form.parameters",
+        "transition_routes",
+    ]
+    updates = [call for call in client.calls if call[0] == "update_page"]
+    assert len(updates) == 1
+    _, paths, page = updates[0]
+    assert paths == changed_fields
+    assert [route.target_page for route in page.transition_routes] == ["a", "b"]
+    assert page.form.parameters[0].display_name == "age"
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("exists,updates", [(False, 0), (True, 1)])
+def test_page_changes_before_setup(exists, updates):
+    """Changes before setup are created with the page, or flushed by setup."""
+    # Arrange:
+    client = StandInClient(exists=exists)
+    delegator = build_page_delegator(client)
+    add_changes(delegator)
+
+    # Act:
+    delegator.setup()
+
+    # Assert:
+    assert [call[0] for call in client.calls].count("update_page") == updates
+    assert len(delegator.page.transition_routes) == 2
+    assert delegator.page.entry_fulfillment.tag == "entry"
+    assert not delegator.changed_fields
+
+
+@pytest.mark.hermetic
+def test_flow_routes_sent_in_one_masked_update():
+    """Flow routes are sent by flush in one update; tear down resets them."""
+    # Arrange:
+    client = StandInClient()
+    controller = types.SimpleNamespace(
+        start_flow=FLOW_NAME, resource_index=ResourceIndex()
+    )
+    delegator = StartFlowDelegator(controller, client=client)
+    delegator.setup()
+
+    # Act:
+    for page in ["a", "b", "c"]:
+        delegator.append_transition_route(target_page=page, intent="i")
+    delegator.flush()
+    delegator.tear_down()
+
+    # Assert:
+    updates = [call[1] for call in client.calls if call[0] == "update_flow"]
+    assert updates == [["transition_routes"], ["transition_routes"]]
+    assert len(delegator.flow.transition_routes) == 1
+
+
+@pytest.mark.hermetic
+def test_start_page_changes_sent_without_creating_it():
+    """The start page is changed in place: routes go out in one masked update."""
+    # Arrange:
+    client = StandInClient()
+    controller = types.SimpleNamespace(
+        start_flow_delegator=types.SimpleNamespace(
+            start_page_name=f"{FLOW_NAME}/pages/START_PAGE"
+        )
+    )
+    delegator = StartPageDelegator(controller, client=client)
+
+    # Act:
+    for target in ["a", "b"]:
+        delegator.append_transition_route(target_page=target, condition="true")
+    delegator.setup()
+    delegator.tear_down()
+
+    # Assert:
+    assert len(client.calls) == 1
+    method, fields, page = client.calls[0]
+    assert (method, fields) == ("update_page", ["transition_routes"])
+    assert page.name == f"{FLOW_NAME}/pages/START_PAGE"
+    assert [route.target_page for route in page.transition_routes] == ["a", "b"]
+    with pytest.raises(TypeError):
+        # pylint: disable-next=abstract-class-instantiated
+        BufferedClientDelegator(controller)
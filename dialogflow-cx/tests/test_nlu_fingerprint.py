@@ -0,0 +1,128 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for skipping flow training when the NLU content is unchanged."""
+
+from contextlib import ExitStack
+
+import google.cloud.dialogflowcx as cx
+import mock
+import pytest
+from delegators import AgentDescriptionStore, LocalFingerprintStore
+from delegators.nlu_fingerprint import nlu_fingerprint
+from dialogflow_sample import DialogflowSample
+
+AGENT_NAME = "projects/p/locations/global/agents/1"
+
+
+def build_intent(phrase="trigger intent", parameter_id=""):
+    """Builds an intent with one training phrase."""
+    return cx.Intent(
+        name=f"{AGENT_NAME}/intents/1",
+        display_name="intent",
+        training_phrases=[
+            cx.Intent.TrainingPhrase(
+                parts=[
+                    cx.Intent.TrainingPhrase.Part(
+                        text=phrase, parameter_id=parameter_id
+                    )
+                ],
+                repeat_count=1,
+            )
+        ],
+    )
+
+
+def build_flow(target_page="pages/1"):
+    """Builds a start flow with one route."""
+    return cx.Flow(
+        name=f"{AGENT_NAME}/flows/start",
+        transition_routes=[
+            cx.TransitionRoute(
+                intent=f"{AGENT_NAME}/intents/1", target_page=target_page
+            )
+        ],
+    )
+
+
+@pytest.mark.hermetic
+def test_nlu_fingerprint():
+    """The fingerprint changes with phrases, parameters and routes only."""
+    # Arrange:
+    base = nlu_fingerprint([build_intent()], build_flow())
+
+    # Act:
+    same = nlu_fingerprint([build_intent()], build_flow())
+    changed = [
+        nlu_fingerprint([build_intent("go")], build_flow()),
+        nlu_fingerprint([build_intent(parameter_id="p")], build_flow()),
+        nlu_fingerprint([build_intent()], build_flow("pages/2")),
+        nlu_fingerprint([], build_flow()),
+    ]
+
+    # Assert:
+    assert same == base
+    assert len({base, *changed}) == 5
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("local", [True, False])
+def test_setup_skips_unchanged_training(tmp_path, local, build_sample):
+    """Training runs once, then is skipped until the NLU content changes."""
+    # Arrange:
+    sample = build_sample(credentials=mock.Mock())
+    if local:
+        sample.set_fingerprint_store(LocalFingerprintStore(str(tmp_path / "nlu.json")))
+    intent = mock.PropertyMock(return_value=build_intent())
+
+    # Act:
+    decisions = []
+    with ExitStack() as stack:
+        for delegator, name, value in [
+            (
+                sample.agent_delegator,
+                "agent",
+                mock.PropertyMock(return_value=cx.Agent(name=AGENT_NAME)),
+            ),
+            (sample.intent_delegator, "intent", intent),
+        ]:
+            stack.enter_context(mock.patch.object(type(delegator), name, new=value))
+        flow_client = sample.start_flow_delegator.client
+        stack.enter_context(
+            mock.patch.object(flow_client, "get_flow", return_value=build_flow())
+        )
+        train_flow = stack.enter_context(
+            mock.patch.object(
+                flow_client,
+                "train_flow",
+                return_value=mock.Mock(**{"running.return_value": False}),
+            )
+        )
+        update_agent = stack.enter_context(
+            mock.patch.object(sample.agent_delegator.client, "update_agent")
+        )
+        sample.start_flow_delegator.adopt()
+        for phrase in ["trigger intent", "trigger intent", "go"]:
+            intent.return_value = build_intent(phrase)
+            DialogflowSample.setup(sample, wait=0)
+            decisions.append(sample.training["decision"])
+        described = AgentDescriptionStore().get(sample)
+
+    # Assert:
+    assert decisions == ["train", "skip", "train"]
+    assert train_flow.call_count == 2
+    assert update_agent.call_count == (0 if local else 2)
+    if not local:
+        assert described == sample.training["fingerprint"]
+    assert sample.training_report().startswith("Trained in ")
@@ -0,0 +1,195 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for waiting on long-running operations."""
+
+import concurrent.futures
+import itertools
+import threading
+
+import google.api_core.exceptions
+import google.cloud.dialogflowcx as cx
+import mock
+import pytest
+from delegators import OperationPoller, test_case_delegator
+
+NOT_TRAINED = (
+    "com.google.apps.framework.request.NotFoundException: "
+    "NLU model for flow '00000000-0000-0000-0000-000000000000' does not exist. "
+    "Please try again after retraining the flow."
+)
+
+
+class FakeOperation:
+    """An operation that is done on its polls-th poll."""
+
+    def __init__(self, polls, result=None):
+        self.polls = polls
+        self._result = result
+
+    def done(self):
+        """Counts down the polls left."""
+        self.polls -= 1
+        return self.polls <= 0
+
+    def result(self):
+        """Returns the result given."""
+        return self._result
+
+    def add_done_callback(self, callback):
+        """Calls callback from another thread, as the operation would."""
+        threading.Timer(0.01, callback, args=(self,)).start()
+
+
+def build_poller(**kwargs):
+    """Builds a poller with short delays."""
+    return OperationPoller(initial_delay=0.001, max_delay=0.004, **kwargs)
+
+
+def run_result(test_result=cx.TestResult.PASSED):
+    """Builds the response of a test case run."""
+    return cx.RunTestCaseResponse(result=cx.TestCaseResult(test_result=test_result))
+
+
+@pytest.mark.hermetic
+def test_delays_back_off_with_jitter():
+    """Delays grow by multiplier up to max_delay, shortened by up to jitter."""
+    # Arrange:
+    exact, jittered = build_poller(jitter=0), build_poller(jitter=0.5)
+
+    # Act:
+    delays = list(itertools.islice(exact.delays(), 5))
+    jittered_delays = list(itertools.islice(jittered.delays(), 100))
+
+    # Assert:
+    assert delays == [0.001, 0.002, 0.004, 0.004, 0.004]
+    assert all(0.002 <= delay <= 0.004 for delay in jittered_delays[2:])
+    assert len(set(jittered_delays)) > 1
+
+
+@pytest.mark.hermetic
+def test_wait_all_polls_operations_together():
+    """Operations done at once are not slept on; each wait is recorded."""
+    # Arrange:
+    poller = build_poller()
+    operations = {
+        "instant": FakeOperation(1, "a"),
+        "slow": FakeOperation(5, "b"),
+        "medium": FakeOperation(3, "c"),
+    }
+
+    # Act:
+    results = poller.wait_all(operations)
+
+    # Assert:
+    assert results == {"instant": "a", "slow": "b", "medium": "c"}
+    assert {wait.name: wait.polls for wait in poller.waits} == {
+        "instant": 1,
+        "medium": 3,
+        "slow": 5,
+    }
+    assert poller.stats()["polls"] == 9
+    assert "longest: slow" in poller.report()
+
+
+@pytest.mark.hermetic
+def test_wait_times_out():
+    """Operations still running at the deadline raise TimeoutError."""
+    # Arrange:
+    poller = build_poller(timeout=0.02)
+
+    # Act:
+    with pytest.raises(concurrent.futures.TimeoutError, match="train_flow"):
+        poller.wait(FakeOperation(10**6), name="train_flow")
+
+    # Assert:
+    assert poller.waits[0].outcome == "timeout"
+    assert poller.stats()["timeouts"] == 1
+
+
+@pytest.mark.hermetic
+def test_waits_kept_are_bounded(monkeypatch):
+    """Only the last MAX_WAITS waits are kept; stats cover every wait."""
+    # Arrange:
+    monkeypatch.setattr(OperationPoller, "MAX_WAITS", 2)
+    poller = build_poller()
+
+    # Act:
+    for name in ["first", "second", "third"]:
+        poller.wait(FakeOperation(2), name=name)
+
+    # Assert:
+    assert [wait.name for wait in poller.waits] == ["second", "third"]
+    assert poller.stats()["waits"] == 3
+    assert poller.stats()["polls"] == 6
+    assert poller.report().startswith("3 operations waited on")
+
+
+@pytest.mark.hermetic
+def test_on_done_calls_back():
+    """The callback gets the operation once it is done, and the wait is recorded."""
+    # Arrange:
+    poller = build_poller()
+    operation = FakeOperation(1)
+    done = threading.Event()
+
+    # Act:
+    poller.on_done(operation, lambda future: done.set(), name="export_agent")
+
+    # Assert:
+    assert done.wait(timeout=5)
+    assert poller.waits[0].name == "export_agent"
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize(
+    "test_result,exception",
+    [
+        (cx.TestResult.PASSED, None),
+        (cx.TestResult.FAILED, test_case_delegator.DialogflowTestCaseFailure),
+    ],
+)
+def test_run_test_case_retries_until_trained(test_result, exception, build_sample):
+    """Runs are retried while the model is trained; the result is read at once."""
+    # Arrange:
+    sample = build_sample()
+    sample.set_operation_poller(build_poller())
+    delegator = test_case_delegator.TestCaseDelegator(
+        sample, display_name="test", conversation_turns=[]
+    )
+    runs = [
+        google.api_core.exceptions.NotFound(NOT_TRAINED),
+        FakeOperation(1, run_result(test_result)),
+    ]
+
+    # Act:
+    with mock.patch.object(
+        type(delegator),
+        "test_case",
+        new_callable=mock.PropertyMock,
+        return_value=cx.TestCase(name="test-case", display_name="test"),
+    ), mock.patch.object(
+        delegator.client, "run_test_case", side_effect=runs
+    ) as run_test_case, mock.patch(
+        "time.sleep"
+    ) as sleep:
+        if exception:
+            with pytest.raises(exception):
+                delegator.run_test_case(wait=10)
+        else:
+            delegator.run_test_case(wait=10)
+
+    # Assert:
+    assert run_test_case.call_count == 2
+    sleep.assert_called_once_with(10)
@@ -0,0 +1,125 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the concurrent setup and tear down of sample components."""
+
+import threading
+
+import pytest
+from delegators import Provisioner
+from validate_form_sample import ValidateFormSample
+
+
+def build_graph(log, barrier):
+    """Builds root <- (left, right) <- leaf; left and right meet at barrier."""
+    provisioner = Provisioner()
+
+    def action(name, meet=False):
+        def run():
+            if meet:
+                barrier.wait(timeout=5)
+            log.append(name)
+
+        return run
+
+    root = provisioner.add("root", action("root"), action("-root"))
+    left = provisioner.add(
+        "left", action("left", True), action("-left", True), depends_on=[root]
+    )
+    right = provisioner.add(
+        "right", action("right", True), action("-right", True), depends_on=[root]
+    )
+    provisioner.add("leaf", action("leaf"), action("-leaf"), depends_on=[left, right])
+    return provisioner
+
+
+@pytest.mark.hermetic
+def test_provisioner_runs_independent_steps_concurrently():
+    """Independent steps overlap; dependencies order setup, and tear down reversed."""
+    # Arrange:
+    log = []
+    provisioner = build_graph(log, threading.Barrier(2))
+
+    # Act:
+    timings = provisioner.setup()
+    setup_log, log[:] = list(log), []
+    provisioner.tear_down()
+
+    # Assert:
+    assert setup_log[0] == "root" and setup_log[-1] == "leaf"
+    assert sorted(setup_log[1:3]) == ["left", "right"]
+    assert log[0] == "-leaf" and log[-1] == "-root"
+    assert set(timings) == {"root", "left", "right", "leaf", "total"}
+    assert provisioner.report().startswith("4 steps in ")
+
+
+@pytest.mark.hermetic
+def test_provisioner_stops_after_failure():
+    """No step starts after a failure, which is raised once running steps end."""
+    # Arrange:
+    log = []
+    provisioner = Provisioner()
+
+    def fail():
+        raise RuntimeError("create failed")
+
+    failing = provisioner.add("failing", fail)
+    provisioner.add("after", lambda: log.append("after"), depends_on=[failing])
+    provisioner.add("other", lambda: log.append("other"))
+
+    # Act:
+    with pytest.raises(RuntimeError, match="create failed"):
+        provisioner.setup()
+
+    # Assert:
+    assert log == ["other"]
+
+
+@pytest.mark.hermetic
+def test_sample_declares_dependencies():
+    """Sample steps depend on the agent, and on what they reference."""
+    # Arrange:
+    sample = ValidateFormSample(
+        project_id="mock-project",
+        agent_display_name="mock-agent",
+        webhook_uri="https://example.com/webhook",
+    )
+
+    # Act:
+    graph = {
+        step.name: sorted(dependency.name for dependency in step.depends_on)
+        for step in sample.provisioner.steps
+    }
+
+    # Assert:
+    assert graph == {
+        "Agent(mock-agent)": [],
+        "Webhook(Validate form)": ["Agent(mock-agent)"],
+        "Intent(go-to-example-page)": ["Agent(mock-agent)"],
+        "FulfillmentPage(Main Page)": [
+            "Agent(mock-agent)",
+            "Webhook(Validate form)",
+        ],
+        "StartFlow": ["Agent(mock-agent)"],
+        "StartFlowRoutes": [
+            "FulfillmentPage(Main Page)",
+            "Intent(go-to-example-page)",
+            "StartFlow",
+        ],
+        "PageForm": [
+            "FulfillmentPage(Main Page)",
+            "StartFlow",
+            "Webhook(Validate form)",
+        ],
+    }
@@ -0,0 +1,127 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the display-name index of existing resources."""
+
+import types
+
+import google.api_core.exceptions
+import google.cloud.dialogflowcx as cx
+import pytest
+from delegators import IntentDelegator, ResourceIndex
+
+AGENT_NAME = "projects/p/locations/global/agents/a"
+
+
+class StandInIntentsClient:
+    """Holds count intents, served page_size per list call; creates fail."""
+
+    def __init__(self, count):
+        self.intents = [
+            cx.Intent(name=f"{AGENT_NAME}/intents/{index}", display_name=f"i{index}")
+            for index in range(count)
+        ]
+        self.requests = []
+
+    def create_intent(self, parent, intent):
+        """Fails: the intent exists."""
+        del parent, intent
+        raise google.api_core.exceptions.AlreadyExists("exists")
+
+    def list_intents(self, request):
+        """Returns a pager over the intents."""
+        self.requests.append(request)
+        size = request.page_size
+        return types.SimpleNamespace(
+            pages=[
+                cx.ListIntentsResponse(intents=self.intents[start : start + size])
+                for start in range(0, len(self.intents), size)
+            ]
+        )
+
+
+def build_intent_delegator(client, index, display_name):
+    """Builds an IntentDelegator of the agent AGENT_NAME."""
+    controller = types.SimpleNamespace(
+        agent_delegator=types.SimpleNamespace(agent=cx.Agent(name=AGENT_NAME)),
+        resource_index=index,
+    )
+    return IntentDelegator(
+        controller, training_phrases=[], client=client, display_name=display_name
+    )
+
+
+@pytest.mark.hermetic
+def test_resource_index_lists_once():
+    """Lookups in one collection share a single listing, until invalidated.
+
+    The lookup that misses lists the collection again, in case it was created.
+    """
+    # Arrange:
+    client = StandInIntentsClient(count=2500)
+    index = ResourceIndex(page_size=1000)
+    delegators = [
+        build_intent_delegator(client, index, name)
+        for name in ["i0", "i1999", "missing"]
+    ]
+
+    # Act:
+    for delegator in delegators:
+        delegator.setup()
+    stats = index.stats()
+    index.invalidate("intents", AGENT_NAME)
+    build_intent_delegator(client, index, "i1").setup()
+
+    # Assert:
+    assert delegators[0].intent.name == f"{AGENT_NAME}/intents/0"
+    assert delegators[1].intent.name == f"{AGENT_NAME}/intents/1999"
+    with pytest.raises(RuntimeError):
+        _ = delegators[2].intent
+    # The scans would have read 1, 20 and 25 pages, and got 2 intents.
+    assert stats == {"lookups": 3, "list_calls": 6, "calls_saved": 42}
+    assert index.report() == "4 lookups served by 9 list calls (41 calls saved)"
+    assert client.requests[0].page_size == 1000
+    assert client.requests[0].intent_view == cx.IntentView.INTENT_VIEW_FULL
+
+
+@pytest.mark.hermetic
+def test_resource_index_page_sizes():
+    """Collections are listed with the API maximum page size of each."""
+    # Arrange:
+    client = StandInIntentsClient(count=30)
+    index = ResourceIndex()
+
+    def list_test_cases(request):
+        client.requests.append(request)
+        return types.SimpleNamespace(
+            pages=[
+                types.SimpleNamespace(test_cases=page.intents)
+                for page in client.list_intents(request).pages
+            ]
+        )
+
+    # Act:
+    index.find("intents", client.list_intents, cx.ListIntentsRequest(), "i29")
+    index.find(
+        "test_cases",
+        list_test_cases,
+        cx.ListTestCasesRequest(view=cx.ListTestCasesRequest.TestCaseView.FULL),
+        "i29",
+    )
+    stats = index.stats()
+
+    # Assert:
+    assert [request.page_size for request in client.requests] == [1000, 20, 20]
+    # The scans would have read 1 page of 100 intents and 2 of 20 test cases.
+    assert stats == {"lookups": 2, "list_calls": 3, "calls_saved": 2}
@@ -0,0 +1,132 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for provisioning samples from cached agent snapshots."""
+
+import os
+from contextlib import ExitStack
+
+import google.cloud.dialogflowcx as cx
+import mock
+import pytest
+from delegators import SnapshotCache
+
+
+@pytest.mark.hermetic
+def test_snapshot_cache_content_addressed(tmp_path):
+    """Equal contents share a blob; corrupted blobs read as misses."""
+    # Arrange:
+    cache = SnapshotCache(str(tmp_path))
+
+    # Act:
+    first = cache.put("a", b"agent", build_seconds=3.0)
+    second = cache.put("b", b"agent")
+    cached = cache.get("a")
+    with open(os.path.join(tmp_path, "blobs", first), "wb") as file_handle:
+        file_handle.write(b"truncated")
+    corrupted = cache.get("b")
+
+    # Assert:
+    assert first == second
+    assert cached == (b"agent", {"build_seconds": 3.0})
+    assert corrupted is None
+    assert cache.stats() == {"blobs": 0, "bytes": 0, "hits": 1, "misses": 1}
+
+
+@pytest.mark.hermetic
+def test_snapshot_cache_evicts_least_recently_used(tmp_path):
+    """Past max_bytes, the blobs read or written least recently are evicted."""
+    # Arrange:
+    cache = SnapshotCache(str(tmp_path), max_bytes=20)
+    for index, key in enumerate(["old", "used", "other"]):
+        digest = cache.put(key, key.encode() * 2)
+        os.utime(os.path.join(tmp_path, "blobs", digest), ns=(index, index))
+
+    # Act:
+    cache.get("used")
+    cache.put("new", b"x" * 10)
+
+    # Assert:
+    assert cache.get("old") is None and cache.get("other") is None
+    assert cache.get("used") == (b"usedused", {})
+    assert cache.stats()["bytes"] == 18
+
+
+@pytest.mark.hermetic
+def test_configuration_hash(build_sample):
+    """The hash follows the declared configuration, not the instance."""
+    # Arrange:
+    samples = [
+        build_sample(),
+        build_sample(),
+        build_sample(webhook_uri="https://other"),
+    ]
+
+    # Act:
+    hashes = [sample.configuration_hash for sample in samples]
+
+    # Assert:
+    assert hashes[0] == hashes[1] != hashes[2]
+    assert {
+        "class": "WebhookDelegator",
+        "display_name": "Webhook 1",
+        "uri": "https://example.com/webhook",
+    } in samples[0].configuration["delegators"]
+
+
+@pytest.mark.hermetic
+def test_provision_builds_then_restores(tmp_path, build_sample):
+    """The first run builds and exports; the next restores and adopts."""
+    # Arrange:
+    cache = SnapshotCache(str(tmp_path))
+    built, restored = build_sample(), build_sample()
+    for sample in (built, restored):
+        sample.set_snapshot_cache(cache)
+    lro = mock.Mock()
+    lro.result.return_value = cx.ExportAgentResponse(agent_content=b"agent")
+
+    # Act:
+    with ExitStack() as stack:
+        setup = stack.enter_context(mock.patch.object(built.provisioner, "setup"))
+        stack.enter_context(
+            mock.patch.object(
+                type(built.agent_delegator),
+                "agent",
+                new_callable=mock.PropertyMock,
+                return_value=cx.Agent(name="projects/p/locations/global/agents/1"),
+            )
+        )
+        for sample in (built, restored):
+            stack.enter_context(mock.patch.object(sample.agent_delegator, "setup"))
+            client = sample.agent_delegator.client
+            stack.enter_context(
+                mock.patch.object(client, "export_agent", return_value=lro)
+            )
+            restore = stack.enter_context(
+                mock.patch.object(client, "restore_agent", return_value=lro)
+            )
+        adopts = [
+            stack.enter_context(mock.patch.object(delegator, "adopt"))
+            for delegator in restored.provisioner.delegators[1:]
+        ]
+        build = built.provision()
+        restore_mode = restored.provision()
+
+    # Assert:
+    assert build["mode"] == "build" and restore_mode["mode"] == "restore"
+    assert restore_mode["build_seconds"] == build["seconds"]
+    setup.assert_called_once_with()
+    assert restore.call_args.kwargs["request"].agent_content == b"agent"
+    assert all(adopt.call_count == 1 for adopt in adopts)
+    assert restored.provisioning_report().startswith("Restored from snapshot in ")
@@ -14,13 +14,39 @@
 
 """Tests for webhook module."""
 
+import asyncio
+import json
+import sys
+import threading
+import time
+
 import pytest
+from utilities import RequestMock
+from webhook.batch import iter_batch_requests
 from webhook.main import (
+    UNREGISTERED_TAG,
+    VALID_AGE_RESPONSE,
+    DeadlineExceeded,
+    HandlerRegistry,
+    LazyHandler,
+    ResponseCache,
+    ResponseTemplate,
+    WebhookContext,
+    WebhookMetrics,
+    WebhookResponseView,
+    batch_webhook_fcn,
     build_request_dict_basic,
+    build_request_dict_form,
+    build_request_dict_session,
     extract_session_parameters,
     extract_text,
+    iter_batch_responses,
+    registry,
+    slot,
+    text_response,
     webhook_fcn,
 )
+from webhook.metrics import merge_metrics, render_metrics
 
 
 @pytest.mark.hermetic
@@ -40,6 +66,23 @@ def test_basic_webhook(mocked_request):
     assert extract_text(response_json) == expected
 
 
+@pytest.mark.hermetic
+def test_echo_webhook():
+    """The echo webhook returns the raw request body, byte for byte."""
+
+    # Arrange:
+    raw = (
+        b'{"fulfillmentInfo": {"tag": "echo_webhook"},  "text": "caf\xc3\xa9 \\"x\\""}'
+    )
+    request = RequestMock(payload=json.loads(raw), data=raw)
+
+    # Act:
+    response_json = webhook_fcn(request)
+
+    # Assert:
+    assert extract_text(response_json) == raw.decode()
+
+
 @pytest.mark.hermetic
 @pytest.mark.parametrize(
     "test_input,expected",
@@ -52,15 +95,9 @@ def test_validate_form(mocked_request, test_input, expected):
     """Locally tests the form validation webhook function."""
 
     # Arrange:
-    request_mapping = {}
-    request_mapping["fulfillmentInfo"] = {}
-    request_mapping["fulfillmentInfo"]["tag"] = "validate_form"
-    request_mapping["pageInfo"] = {}
-    request_mapping["pageInfo"]["formInfo"] = {}
-    request_mapping["pageInfo"]["formInfo"]["parameterInfo"] = [
-        {"displayName": "age", "value": test_input}
-    ]
-    mocked_request.payload = request_mapping
+    mocked_request.payload = build_request_dict_form(
+        "validate_form", {"age": test_input}
+    )
 
     # Act:
     response_json = webhook_fcn(mocked_request)
@@ -76,15 +113,9 @@ def test_set_session_param(mocked_request):
     # Arrange:
     mock_key = "MOCK_KEY"
     mock_val = "MOCK_VAL"
-    request_mapping = {}
-    request_mapping["fulfillmentInfo"] = {}
-    request_mapping["fulfillmentInfo"]["tag"] = "set_session_param"
-    request_mapping["sessionInfo"] = {}
-    request_mapping["sessionInfo"]["parameters"] = {
-        "key": mock_key,
-        "val": mock_val,
-    }
-    mocked_request.payload = request_mapping
+    mocked_request.payload = build_request_dict_session(
+        "set_session_param", {"key": mock_key, "val": mock_val}
+    )
 
     # Act:
     response_json = webhook_fcn(mocked_request)
@@ -92,3 +123,519 @@ def test_set_session_param(mocked_request):
     # Assert:
     assert extract_text(response_json) == "Session parameter set"
     assert extract_session_parameters(response_json)[mock_key] == mock_val
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("key", [1, 2.5, True, None])
+def test_set_session_param_non_string_key(mocked_request, key):
+    """Non-string keys are coerced to str, as json.dumps coerces them."""
+
+    # Arrange:
+    mocked_request.payload = build_request_dict_session(
+        "set_session_param", {"key": key, "val": "MOCK_VAL"}
+    )
+
+    # Act:
+    response_json = webhook_fcn(mocked_request)
+
+    # Assert:
+    assert extract_session_parameters(response_json) == json.loads(
+        json.dumps({key: "MOCK_VAL", "key": None, "val": None})
+    )
+
+
+@pytest.mark.hermetic
+def test_unrecognized_tag(mocked_request):
+    """Tags without a registered handler are rejected by the default fallback."""
+    mocked_request.payload = build_request_dict_basic("MOCK_UNKNOWN_TAG", "")
+    with pytest.raises(RuntimeError, match="Unrecognized tag: MOCK_UNKNOWN_TAG"):
+        webhook_fcn(mocked_request)
+
+
+@pytest.mark.hermetic
+def test_registry_dispatch():
+    """Handlers are dispatched by tag, with metadata and a pluggable fallback."""
+
+    # Arrange:
+    local_registry = HandlerRegistry()
+
+    @local_registry.register("tag_a", "tag_b", timeout=1.5, cacheable=True, owner="x")
+    def handler(context):
+        return context.text
+
+    local_registry.set_fallback(lambda context: "fallback")
+    context = WebhookContext(build_request_dict_basic("tag_b", "MOCK TEXT"))
+
+    # Act/Assert:
+    assert local_registry.dispatch("tag_a", context) == "MOCK TEXT"
+    assert local_registry.dispatch("tag_b", context) == "MOCK TEXT"
+    assert local_registry.dispatch("tag_c", context) == "fallback"
+    spec = local_registry.get("tag_a")
+    assert spec.tags == ("tag_a", "tag_b")
+    assert spec.timeout == 1.5
+    assert spec.cacheable
+    assert spec.metadata == {"owner": "x"}
+    assert local_registry.tags == ("tag_a", "tag_b")
+
+
+@pytest.mark.hermetic
+def test_registry_lazy_handler(tmp_path, monkeypatch):
+    """Lazily registered handlers are imported on their first dispatch only."""
+
+    # Arrange:
+    (tmp_path / "mock_heavy_handlers.py").write_text(
+        "def heavy(context):\n    return 'heavy: ' + context.text\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    local_registry = HandlerRegistry()
+    handler = local_registry.register_lazy("mock_heavy_handlers:heavy", owner="x")
+    context = WebhookContext(build_request_dict_basic("heavy", "MOCK TEXT"))
+
+    # Act/Assert:
+    assert isinstance(local_registry.get("heavy").handler, LazyHandler)
+    assert local_registry.get("heavy").metadata == {"owner": "x"}
+    assert "mock_heavy_handlers" not in sys.modules
+    assert not handler.loaded
+    assert local_registry.dispatch("heavy", context) == "heavy: MOCK TEXT"
+    assert handler.loaded
+    assert "mock_heavy_handlers" in sys.modules
+    monkeypatch.delitem(sys.modules, "mock_heavy_handlers")
+
+
+@pytest.mark.hermetic
+def test_registry_metrics():
+    """Dispatch records per-tag requests, latency buckets and errors by type."""
+
+    # Arrange:
+    local_registry = HandlerRegistry()
+
+    @local_registry.register()
+    def ok(context):
+        return context.text
+
+    @local_registry.register()
+    def fails(context):
+        raise ValueError(context.text)
+
+    context = WebhookContext(build_request_dict_basic("ok", "MOCK TEXT"))
+
+    # Act:
+    for _ in range(3):
+        local_registry.dispatch("ok", context)
+    with pytest.raises(ValueError):
+        local_registry.dispatch("fails", context)
+    with pytest.raises(RuntimeError):
+        local_registry.dispatch("missing", context)
+    snapshot = local_registry.metrics.snapshot()
+
+    # Assert:
+    tags = snapshot["tags"]
+    assert tags["ok"]["requests"] == 3
+    assert sum(tags["ok"]["counts"]) == 3
+    assert tags["ok"]["errors"] == {}
+    assert tags["fails"]["errors"] == {"ValueError": 1}
+    assert tags[UNREGISTERED_TAG]["errors"] == {"RuntimeError": 1}
+    assert "missing" not in tags
+
+
+@pytest.mark.hermetic
+def test_registry_without_metrics():
+    """metrics=None disables recording; snapshots then list no tags."""
+
+    # Arrange:
+    local_registry = HandlerRegistry(metrics=None)
+    local_registry.register("ok")(lambda context: context.text)
+    context = WebhookContext(build_request_dict_basic("ok", "MOCK TEXT"))
+
+    # Act:
+    response = local_registry.dispatch("ok", context)
+
+    # Assert:
+    assert response == "MOCK TEXT"
+    assert local_registry.metrics is None
+    assert local_registry.metrics_snapshot()["tags"] == {}
+
+
+@pytest.mark.hermetic
+def test_merge_and_render_metrics():
+    """Snapshots sum across processes and render as Prometheus histograms."""
+
+    # Arrange:
+    first, second = WebhookMetrics(buckets=(0.1, 1.0)), WebhookMetrics((0.1, 1.0))
+    first.record("tag_a", 0.05)
+    second.record("tag_a", 0.5, KeyError("x"))
+    second.record("tag_a", 5.0)
+
+    # Act:
+    merged = merge_metrics([first.snapshot(), second.snapshot()])
+    text = render_metrics(merged)
+
+    # Assert:
+    assert merged["tags"]["tag_a"]["requests"] == 3
+    assert merged["tags"]["tag_a"]["counts"] == [1, 1, 1]
+    assert 'webhook_requests_total{tag="tag_a"} 3' in text
+    assert 'webhook_errors_total{tag="tag_a",exception="KeyError"} 1' in text
+    assert 'webhook_latency_seconds_bucket{tag="tag_a",le="1.0"} 2' in text
+    assert 'webhook_latency_seconds_bucket{tag="tag_a",le="+Inf"} 3' in text
+    assert 'webhook_latency_seconds_sum{tag="tag_a"} 5.55' in text
+
+
+@pytest.mark.hermetic
+def test_render_metrics_families_and_escaping():
+    """Each family's samples follow its TYPE line; label values are escaped."""
+
+    # Arrange:
+    metrics = WebhookMetrics(buckets=(0.1,))
+    metrics.record("tag_a", 0.05, KeyError("x"))
+    metrics.record('MOCK "TAG"\\\n', 0.5)
+
+    # Act:
+    text = render_metrics(metrics.snapshot())
+
+    # Assert:
+    families = []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            families.append(line.split()[2])
+        else:
+            assert line.startswith(families[-1])
+    assert len(families) == len(set(families)) == 4
+    assert 'webhook_requests_total{tag="MOCK \\"TAG\\"\\\\\\n"} 1' in text
+
+
+@pytest.mark.hermetic
+def test_response_cache_ttl_and_lru():
+    """Entries expire after ttl, and LRU entries are evicted by count and bytes."""
+
+    # Arrange:
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, max_bytes=10, ttl=5.0, clock=lambda: now[0])
+
+    # Act/Assert:
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    cache.put("d", b"12345")
+    assert len(cache) == 2 and cache.size_bytes == 9
+    cache.put("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    now[0] = 5.0
+    assert cache.get("d") is None
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 2,
+        "expirations": 1,
+        "collapsed": 0,
+    }
+
+
+@pytest.mark.hermetic
+def test_registry_response_cache():
+    """Cacheable tags reuse responses per session and request; others do not."""
+
+    # Arrange:
+    calls = []
+    local_registry = HandlerRegistry(cache=ResponseCache())
+
+    @local_registry.register("cached", "fails", cacheable=True)
+    @local_registry.register("uncached")
+    def handler(context):
+        calls.append(context.tag)
+        if context.tag == "fails":
+            raise ValueError(context.tag)
+        return context.text.encode()
+
+    def dispatch(tag, text="MOCK TEXT", session="session_1"):
+        request = build_request_dict_basic(tag, text)
+        request["sessionInfo"] = {"session": session}
+        return local_registry.dispatch(tag, WebhookContext(request))
+
+    # Act:
+    responses = [dispatch("cached") for _ in range(3)]
+    dispatch("cached", session="session_2")
+    dispatch("cached", text="OTHER")
+    dispatch("uncached")
+    dispatch("uncached")
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            dispatch("fails")
+
+    # Assert:
+    assert responses == [b"MOCK TEXT"] * 3
+    assert calls == ["cached"] * 3 + ["uncached"] * 2 + ["fails"] * 2
+    assert local_registry.metrics_snapshot()["cache"]["hits"] == 2
+
+
+@pytest.mark.hermetic
+def test_registry_response_cache_single_flight():
+    """Concurrent duplicates wait for one computation, in threads and tasks."""
+
+    # Arrange:
+    calls = []
+    release = threading.Event()
+    local_registry = HandlerRegistry(cache=ResponseCache())
+
+    @local_registry.register(cacheable=True)
+    def blocking(context):
+        calls.append(context.tag)
+        release.wait(5)
+        return b"blocking"
+
+    @local_registry.register(cacheable=True)
+    async def waiting(context):
+        calls.append(context.tag)
+        await asyncio.sleep(0.05)
+        return b"waiting"
+
+    def dispatch(tag, results):
+        context = WebhookContext(build_request_dict_basic(tag, "MOCK TEXT"))
+        results.append(local_registry.dispatch(tag, context))
+
+    async def dispatch_async(count):
+        context = WebhookContext(build_request_dict_basic("waiting", "MOCK TEXT"))
+        return await asyncio.gather(
+            *(local_registry.dispatch_async("waiting", context) for _ in range(count))
+        )
+
+    # Act:
+    results = []
+    threads = [
+        threading.Thread(target=dispatch, args=("blocking", results)) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    async_results = asyncio.run(dispatch_async(4))
+
+    # Assert:
+    assert results == [b"blocking"] * 4
+    assert async_results == [b"waiting"] * 4
+    assert calls == ["blocking", "waiting"]
+    assert local_registry.cache.stats()["collapsed"] == 6
+
+
+@pytest.mark.hermetic
+def test_registry_deadlines():
+    """Handlers out of time are answered with their tag's degraded response."""
+
+    # Arrange:
+    calls = []
+    local_registry = HandlerRegistry(cache=ResponseCache(), default_timeout=10.0)
+    degraded = {"fulfillment_response": {"messages": []}}
+
+    @local_registry.register(timeout=0.01, degraded=degraded)
+    def cooperative(context):
+        time.sleep(0.02)
+        context.check_deadline()
+
+    @local_registry.register(timeout=0.01, degraded=b"DEGRADED")
+    async def cancelled(context):  # pylint: disable=unused-argument
+        await asyncio.sleep(5)
+
+    @local_registry.register(cacheable=True, degraded=b"DEGRADED")
+    def voluntary(context):
+        calls.append(context.remaining())
+        return context.degraded_response
+
+    @local_registry.register(timeout=0.0)
+    def undegradable(context):
+        context.check_deadline()
+
+    def dispatch(tag):
+        return local_registry.dispatch(
+            tag, WebhookContext(build_request_dict_basic(tag, "MOCK TEXT"))
+        )
+
+    async def dispatch_async(tag):
+        context = WebhookContext(build_request_dict_basic(tag, "MOCK TEXT"))
+        return await local_registry.dispatch_async(tag, context)
+
+    # Act:
+    responses = [
+        dispatch("cooperative"),
+        dispatch("cancelled"),
+        asyncio.run(dispatch_async("cancelled")),
+        dispatch("voluntary"),
+        dispatch("voluntary"),
+    ]
+    with pytest.raises(DeadlineExceeded):
+        dispatch("undegradable")
+    tags = local_registry.metrics_snapshot()["tags"]
+
+    # Assert:
+    assert json.loads(responses[0]) == degraded
+    assert responses[1:] == [b"DEGRADED"] * 4
+    assert len(calls) == 2 and 9 < calls[0] <= 10
+    assert tags["cancelled"]["degraded"] == 2
+    assert tags["voluntary"]["degraded"] == 2
+    assert tags["undegradable"]["errors"] == {"DeadlineExceeded": 1}
+    assert 'webhook_degraded_total{tag="cooperative"} 1' in render_metrics(
+        local_registry.metrics_snapshot()
+    )
+    assert WebhookContext({}).remaining() == float("inf")
+
+
+@pytest.mark.hermetic
+def test_default_registry_tags():
+    """The sample handlers are registered under their function names."""
+    for tag in ["basic_webhook", "echo_webhook", "validate_form", "set_session_param"]:
+        assert tag in registry
+
+
+@pytest.mark.hermetic
+def test_webhook_context():
+    """Context accessors read the parsed body, indexing form parameters by name."""
+
+    # Arrange:
+    request_mapping = build_request_dict_basic("validate_form", "MOCK TEXT")
+    request_mapping["pageInfo"] = {
+        "formInfo": {
+            "parameterInfo": [
+                {"displayName": "age", "value": 22, "state": "VALID"},
+                {"displayName": "name", "state": "EMPTY"},
+            ]
+        }
+    }
+    request_mapping["sessionInfo"] = {"parameters": {"key": "val"}}
+
+    # Act:
+    context = WebhookContext(request_mapping)
+
+    # Assert:
+    assert context.tag == "validate_form"
+    assert context.text == "MOCK TEXT"
+    assert context.session_parameters == {"key": "val"}
+    assert context.form_parameters == {"age": 22, "name": None}
+    assert context.form_parameter_info["age"]["state"] == "VALID"
+    assert WebhookContext({}).session_parameters == {}
+
+
+@pytest.mark.hermetic
+def test_webhook_response_view(mocked_request):
+    """The view parses a response once and reads snake or camel case fields."""
+
+    # Arrange:
+    mocked_request.payload = build_request_dict_session(
+        "set_session_param", {"key": "MOCK_KEY", "val": "MOCK_VAL"}
+    )
+    camel_case = {
+        "fulfillmentResponse": {
+            "messages": [{"text": {"text": ["a", "b"]}}, {"payload": {}}]
+        },
+        "pageInfo": {
+            "formInfo": {"parameterInfo": [{"displayName": "age", "state": "INVALID"}]}
+        },
+        "targetPage": "MOCK_PAGE",
+    }
+
+    # Act:
+    view = WebhookResponseView(webhook_fcn(mocked_request))
+    camel_view = WebhookResponseView(json.dumps(camel_case))
+
+    # Assert:
+    assert view.text() == "Session parameter set"
+    assert view.texts == ("Session parameter set",)
+    assert view.session_parameters["MOCK_KEY"] == "MOCK_VAL"
+    assert view.target_page is None
+    assert camel_view.texts == ("a", "b")
+    assert camel_view.parameter_states == {"age": "INVALID"}
+    assert camel_view.target_page == "MOCK_PAGE"
+    assert WebhookResponseView(VALID_AGE_RESPONSE).body is (
+        WebhookResponseView(bytes(VALID_AGE_RESPONSE)).body
+    )
+
+
+@pytest.mark.hermetic
+def test_response_template():
+    """Rendered templates match serializing the full payload with json.dumps."""
+    template = ResponseTemplate(
+        {**text_response(slot("text")), "session_info": {"parameters": {slot("k"): 1}}}
+    )
+    rendered = template.render(text='MOCK "TEXT"', k="MOCK_KEY")
+    assert template.slots == ("text", "k")
+    assert json.loads(rendered) == {
+        **text_response('MOCK "TEXT"'),
+        "session_info": {"parameters": {"MOCK_KEY": 1}},
+    }
+
+
+def _chunked(data: bytes, size: int):
+    view = memoryview(data)
+    return [bytes(view[i : i + size]) for i in range(0, len(data), size)]
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+@pytest.mark.parametrize("array", [True, False])
+def test_iter_batch_responses(array, chunk_size):
+    """Batches stream one NDJSON line per request, in order, with per-line errors."""
+
+    # Arrange:
+    items = [
+        json.dumps(build_request_dict_basic("basic_webhook", "é 0")),
+        json.dumps(build_request_dict_basic("MOCK_UNKNOWN_TAG", "1")),
+        json.dumps(build_request_dict_basic("basic_webhook", "2")),
+    ]
+    if array:
+        body = ("[" + ",\n".join(items) + "]").encode()
+    else:
+        body = ("\n".join(items[:2] + ["{not json", "", items[2]]) + "\n").encode()
+
+    # Act:
+    lines = [
+        json.loads(line)
+        for line in iter_batch_responses(_chunked(body, chunk_size), registry)
+    ]
+
+    # Assert:
+    assert [line["index"] for line in lines] == list(range(len(lines)))
+    assert lines[0]["response"]["fulfillment_response"]["messages"][0]["text"][
+        "text"
+    ] == ["Webhook received: é 0 (Tag: basic_webhook)"]
+    assert lines[1]["error"]["type"] == "RuntimeError"
+    if not array:
+        assert lines[2]["error"]["type"] == "JSONDecodeError"
+    assert "response" in lines[-1]
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_batch_requests_skips_malformed_array_item(chunk_size):
+    """A malformed array element fails alone; the elements after it still parse."""
+
+    # Arrange:
+    body = b'[{"text": "0"}, {"oops": "],", }, {"text": "2"}, tru, {"text": "4"}]'
+
+    # Act:
+    items = list(iter_batch_requests(_chunked(body, chunk_size)))
+
+    # Assert:
+    assert [type(item) for item in items] == [
+        dict,
+        json.JSONDecodeError,
+        dict,
+        json.JSONDecodeError,
+        dict,
+    ]
+    assert [item["text"] for item in items[::2]] == ["0", "2", "4"]
+
+
+@pytest.mark.hermetic
+def test_batch_webhook_fcn_malformed_array():
+    """A malformed array reports an error after the requests decoded before it."""
+    body = b'[{"fulfillmentInfo": {"tag": "basic_webhook"}, "text": "0"}, {"oops'
+    response, status, headers = batch_webhook_fcn(RequestMock(data=body))
+    lines = [json.loads(line) for line in response]
+    assert status == 200
+    assert headers["Content-Type"] == "application/x-ndjson"
+    assert "response" in lines[0]
+    assert lines[1] == {
+        "index": 1,
+        "error": {"type": "JSONDecodeError", "message": lines[1]["error"]["message"]},
+    }
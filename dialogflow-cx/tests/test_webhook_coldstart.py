@@ -0,0 +1,32 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the webhook cold-start budget."""
+
+import pytest
+from webhook_coldstart import import_budget_ms, measure_cold_start
+
+
+@pytest.mark.hermetic
+def test_cold_import_within_budget():
+    """A fresh interpreter imports main within $WEBHOOK_IMPORT_BUDGET_MS."""
+
+    # Act:
+    report = measure_cold_start(runs=3)
+
+    # Assert:
+    assert report["import_ms"] <= import_budget_ms(), report
+    assert report["first_response_ms"] > 0
+    assert "asyncio" not in report["modules"]
+    assert "dataclasses" not in report["modules"]
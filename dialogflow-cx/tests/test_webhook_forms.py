@@ -0,0 +1,106 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the declarative form validation engine."""
+
+import json
+
+import pytest
+from utilities import RequestMock
+from webhook.forms import Check, Form, OneOf, Pattern, Range
+from webhook.main import FORMS, build_request_dict_form, webhook_fcn
+
+BOOKING_FORM = Form(
+    {
+        "guests": Range(1, 8, message="Between 1 and 8 guests, not {value}"),
+        "email": Pattern(r"[^@\s]+@[^@\s]+"),
+        "room": [OneOf(["single", "double"]), Pattern("[a-z]+")],
+        "check_in": Range(minimum=0),
+    },
+    checks=[
+        Check(
+            ["check_in", "check_out"],
+            lambda check_in, check_out: check_out > check_in,
+            "{name} must be after day {check_in}",
+        )
+    ],
+    valid_message="Booking valid",
+    clear_invalid=True,
+)
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize(
+    "values,expected",
+    [
+        ({"guests": 2, "email": "a@b.c", "room": "double"}, {}),
+        ({"guests": 9}, {"guests": "Between 1 and 8 guests, not 9"}),
+        ({"guests": "two"}, {"guests": "Between 1 and 8 guests, not two"}),
+        ({"email": "nobody"}, {"email": "email does not match the expected format"}),
+        ({"room": "suite"}, {"room": "room must be one of single, double"}),
+        ({"guests": None, "unknown": -1}, {}),
+        ({"check_in": 3, "check_out": 5}, {}),
+        (
+            {"check_in": 3, "check_out": 2},
+            {"check_out": "check_out must be after day 3"},
+        ),
+        (
+            {"check_in": -1, "check_out": 2},
+            {"check_in": "check_in must be between 0 and inf"},
+        ),
+    ],
+)
+def test_form_validate(values, expected):
+    """Each parameter reports its first failing rule, then cross-field checks."""
+    assert BOOKING_FORM.validate_values(values) == expected
+
+
+@pytest.mark.hermetic
+def test_form_response():
+    """Invalid parameters are marked INVALID, and cleared if the form clears them."""
+
+    # Act:
+    response = json.loads(BOOKING_FORM.response({"guests": "Too many guests"}))
+    kept = json.loads(FORMS.default.response({"age": "Age -1 not valid"}))
+
+    # Assert:
+    assert json.loads(BOOKING_FORM.response({})) == {
+        "fulfillment_response": {"messages": [{"text": {"text": ["Booking valid"]}}]}
+    }
+    assert response["fulfillment_response"]["messages"] == [
+        {"text": {"text": ["Too many guests"]}}
+    ]
+    assert response["page_info"]["form_info"]["parameter_info"] == [
+        {"display_name": "guests", "state": "INVALID"}
+    ]
+    assert response["session_info"] == {"parameters": {"guests": None}}
+    assert "session_info" not in kept
+
+
+@pytest.mark.hermetic
+def test_validate_form_page_rules(monkeypatch):
+    """validate_form applies the form declared for the request's page."""
+
+    # Arrange:
+    monkeypatch.setitem(
+        FORMS._forms, "Booking", BOOKING_FORM  # pylint: disable=protected-access
+    )
+    request = build_request_dict_form("validate_form", {"guests": 0, "age": -1})
+    request["pageInfo"]["displayName"] = "Booking"
+
+    # Act:
+    response = json.loads(webhook_fcn(RequestMock(payload=request)))
+
+    # Assert:
+    assert response["session_info"] == {"parameters": {"guests": None}}
@@ -0,0 +1,84 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the webhook load-test harness."""
+
+import asyncio
+import threading
+
+import pytest
+from webhook.main import registry
+from webhook.server import WebhookServer
+from webhook_loadgen import (
+    HttpTarget,
+    InProcessTarget,
+    generate_requests,
+    percentile,
+    run_closed_loop,
+    run_fixed_rate,
+    summarize,
+)
+
+
+@pytest.fixture(name="server_address")
+def fixture_server_address():
+    """Test fixture running a WebhookServer on an event loop in a thread."""
+    loop = asyncio.new_event_loop()
+    server = WebhookServer(port=0)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.address
+    asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=10)
+    loop.close()
+
+
+@pytest.mark.hermetic
+def test_closed_loop_in_process():
+    """Every registered tag is generated, served and reported."""
+    requests = generate_requests(count=40)
+    samples, elapsed = run_closed_loop(InProcessTarget(), requests, concurrency=2)
+    report = summarize(samples, elapsed)
+    assert {tag for tag, _ in requests} == set(registry.tags)
+    assert report["_all"]["requests"] == 40
+    assert report["_all"]["errors"] == 0
+    for tag in registry.tags:
+        row = report[tag]
+        assert row["requests"] == 10
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"] <= row["max_ms"]
+
+
+@pytest.mark.hermetic
+def test_fixed_rate_http(server_address):
+    """Fixed-rate mode drives a local HTTP server at roughly the requested rate."""
+    target = HttpTarget(*server_address)
+    samples, elapsed = run_fixed_rate(
+        target, generate_requests(count=10), rate=100, duration=0.3
+    )
+    report = summarize(samples, elapsed)
+    assert report["_all"]["requests"] == 30
+    assert report["_all"]["errors"] == 0
+    assert elapsed >= 0.29
+
+
+@pytest.mark.hermetic
+def test_percentile():
+    """Percentiles use the nearest-rank method."""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile(values, 1.0) == 100.0
+    assert percentile([], 0.5) == 0.0
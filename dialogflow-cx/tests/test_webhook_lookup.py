@@ -0,0 +1,241 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for lookup handlers, against a local stand-in backend."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from webhook import lookup
+from webhook.main import (
+    HandlerRegistry,
+    WebhookContext,
+    build_request_dict_session,
+    extract_text,
+    text_response,
+)
+
+
+class StandInBackend:
+    """Serves JSON records by path over keep-alive HTTP from its own thread."""
+
+    def __init__(self, records, delay=0.0) -> None:
+        self.records = records
+        self.delay = delay
+        self.paths = []
+        self.connections = 0
+        self._tasks = []
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, "127.0.0.1", 0), self._loop
+        ).result()
+
+    @property
+    def url(self):
+        """Accesses the base URL of the backend."""
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        """Stops serving, closes the connections and stops the backend's loop."""
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _shutdown(self):
+        self._server.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._tasks.append(asyncio.current_task())
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.decode().split(" ")[1]
+                self.paths.append(path)
+                await asyncio.sleep(self.delay)
+                record = self.records.get(path)
+                status = "200 OK" if record is not None else "404 Not Found"
+                body = json.dumps(record).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+RECORDS = {
+    "/orders/A1": {"status": "shipped", "customer": "C1"},
+    "/orders/A2": {"status": "pending", "customer": "C2"},
+    "/customers/C1": {"name": "Ada"},
+    "/customers/C2": {"name": "Grace"},
+}
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(request):
+    """Configures a stand-in backend under a name unique to the test."""
+    delay = getattr(request, "param", 0.0)
+    stand_in = StandInBackend(RECORDS, delay=delay)
+    lookup.backends.configure(request.node.name, stand_in.url)
+    yield request.node.name, stand_in
+    lookup.backends.close()
+    stand_in.close()
+
+
+def order_status(context, results):
+    """Renders the results of the order and customer lookups."""
+    del context
+    customer = results["customer"]["name"] if results["customer"] else "customer"
+    return text_response(f"{customer}, your order is {results['order']['status']}")
+
+
+def request_order(order_id, customer_id):
+    """Builds a request context for the order_status tag."""
+    return WebhookContext(
+        build_request_dict_session(
+            "order_status", {"order_id": order_id, "customer_id": customer_id}
+        )
+    )
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("backend", [0.1], indirect=True)
+def test_lookup_fan_out(backend):
+    """Independent lookups of one request are fetched concurrently."""
+    # Arrange:
+    name, _ = backend
+    local_registry = HandlerRegistry()
+    local_registry.register_lookup(
+        "order_status",
+        lookups={
+            "order": lookup.Lookup("/orders/{order_id}", backend=name),
+            "customer": lookup.Lookup("/customers/{customer_id}", backend=name),
+        },
+    )(order_status)
+
+    async def scenario():
+        start = time.perf_counter()
+        response = await local_registry.dispatch_async(
+            "order_status", request_order("A1", "C1")
+        )
+        return response, time.perf_counter() - start
+
+    # Act:
+    response, elapsed = asyncio.run(scenario())
+
+    # Assert:
+    assert extract_text(json.dumps(response)) == "Ada, your order is shipped"
+    assert elapsed < 0.18
+
+
+@pytest.mark.hermetic
+def test_lookup_pool_and_cache(backend):
+    """Sync dispatches share one pooled connection; results are cached by path."""
+    # Arrange:
+    name, stand_in = backend
+    local_registry = HandlerRegistry()
+    local_registry.register_lookup(
+        "order_status",
+        lookups={
+            "order": lookup.Lookup("/orders/{order_id}", backend=name, ttl=0),
+            "customer": lookup.Lookup("/customers/{customer_id}", backend=name),
+        },
+    )(order_status)
+
+    # Act:
+    texts = [
+        extract_text(
+            json.dumps(
+                local_registry.dispatch(
+                    "order_status", request_order(order_id, customer_id)
+                )
+            )
+        )
+        for order_id, customer_id in [("A1", "C1"), ("A2", "C2"), ("A2", "C2")]
+    ]
+
+    # Assert:
+    assert texts == [
+        "Ada, your order is shipped",
+        "Grace, your order is pending",
+        "Grace, your order is pending",
+    ]
+    assert stand_in.paths.count("/customers/C2") == 1
+    assert stand_in.paths.count("/orders/A2") == 2
+    assert lookup.lookup_cache.size_bytes > 0
+    assert lookup.backends.pool(name).stats()["requests"] == 5
+    assert stand_in.connections == lookup.backends.pool(name).stats()["opened"] <= 2
+
+
+@pytest.mark.hermetic
+def test_lookup_failures(backend):
+    """Optional lookups yield None on failure; required ones fail the request."""
+    # Arrange:
+    name, _ = backend
+    local_registry = HandlerRegistry()
+    local_registry.register_lookup(
+        "order_status",
+        lookups={
+            "order": lookup.Lookup("/orders/{order_id}", backend=name),
+            "customer": lookup.Lookup(
+                "/customers/{customer_id}", backend=name, optional=True
+            ),
+        },
+    )(order_status)
+
+    # Act:
+    response = local_registry.dispatch("order_status", request_order("A1", "C9"))
+    with pytest.raises(lookup.BackendError):
+        local_registry.dispatch("order_status", request_order("A9", "C1"))
+
+    # Assert:
+    assert extract_text(json.dumps(response)) == "customer, your order is shipped"
+    tags = local_registry.metrics_snapshot()["tags"]
+    assert tags["order_status"]["errors"] == {"BackendError": 1}
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize("backend", [0.5], indirect=True)
+def test_lookup_deadline(backend):
+    """A backend slower than the tag's timeout gets the degraded response."""
+    # Arrange:
+    name, _ = backend
+    local_registry = HandlerRegistry()
+    local_registry.register_lookup(
+        "order_status",
+        lookups={"order": lookup.Lookup("/orders/{order_id}", backend=name, ttl=0)},
+        timeout=0.05,
+        degraded=b"DEGRADED",
+    )(order_status)
+
+    # Act:
+    start = time.perf_counter()
+    response = local_registry.dispatch("order_status", request_order("A1", "C1"))
+    elapsed = time.perf_counter() - start
+
+    # Assert:
+    assert response == b"DEGRADED"
+    assert elapsed < 0.4
+    assert local_registry.metrics_snapshot()["tags"]["order_status"]["degraded"] == 1
@@ -0,0 +1,191 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the pre-fork webhook worker pool."""
+
+import http.client
+import json
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+import mock
+import pytest
+from google.protobuf import json_format
+from webhook.main import build_request_dict_basic, extract_text
+from webhook.prefork import PreforkServer
+from webhook.proto_webhook import WebhookRequest
+
+
+@pytest.mark.hermetic
+@pytest.mark.skipif(sys.platform == "win32", reason="requires os.fork")
+def test_prefork_restarts_and_counters():
+    """Workers are replaced after max_requests, and counters survive restarts."""
+
+    # Arrange:
+    server = PreforkServer(port=0, workers=2, max_requests=3)
+    server.bind()
+    host, port = server.address
+    master = multiprocessing.get_context("fork").Process(target=server.run)
+    master.start()
+
+    # Act:
+    texts = []
+    try:
+        for i in range(10):
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            body = json.dumps(build_request_dict_basic("basic_webhook", str(i)))
+            connection.request("POST", "/", body=body)
+            response = connection.getresponse()
+            assert response.status == 200
+            texts.append(extract_text(response.read()))
+            connection.close()
+    finally:
+        master.terminate()
+        master.join(timeout=10)
+
+    # Assert:
+    stats = server.stats()
+    assert master.exitcode == 0
+    assert texts[9] == "Webhook received: 9 (Tag: basic_webhook)"
+    assert stats["requests"] == 10
+    assert stats["restarts"] >= 2
+    assert all(worker["requests"] <= 6 for worker in stats["workers"])
+    assert stats["max_latency_ms"] >= stats["mean_latency_ms"] > 0
+
+
+@pytest.mark.hermetic
+@pytest.mark.skipif(sys.platform == "win32", reason="requires os.fork")
+def test_prefork_metrics():
+    """The master serves metrics merged from live and retired workers."""
+
+    # Arrange:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        metrics_port = probe.getsockname()[1]
+    server = PreforkServer(
+        port=0,
+        workers=2,
+        max_requests=2,
+        metrics_port=metrics_port,
+        report_interval=0.05,
+    )
+    server.bind()
+    host, port = server.address
+    master = multiprocessing.get_context("fork").Process(target=server.run)
+    master.start()
+
+    # Act:
+    metrics = ""
+    try:
+        for i in range(5):
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            body = json.dumps(build_request_dict_basic("basic_webhook", str(i)))
+            connection.request("POST", "/", body=body)
+            assert connection.getresponse().status == 200
+            connection.close()
+        deadline = time.monotonic() + 10
+        expected = 'webhook_requests_total{tag="basic_webhook"} 5'
+        while expected not in metrics and time.monotonic() < deadline:
+            time.sleep(0.1)
+            try:
+                connection = http.client.HTTPConnection(host, metrics_port, timeout=10)
+                connection.request("GET", "/metrics")
+                metrics = connection.getresponse().read().decode()
+                connection.close()
+            except ConnectionError:
+                pass
+    finally:
+        master.terminate()
+        master.join(timeout=10)
+
+    # Assert:
+    assert expected in metrics
+    assert 'webhook_latency_seconds_count{tag="basic_webhook"} 5' in metrics
+
+
+@pytest.mark.hermetic
+@pytest.mark.skipif(sys.platform == "win32", reason="requires os.fork")
+def test_prefork_forks_without_threads():
+    """The master runs no other thread when it forks, even with a metrics port."""
+
+    # Arrange:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        metrics_port = probe.getsockname()[1]
+    server = PreforkServer(port=0, workers=1, metrics_port=metrics_port)
+    threads_at_fork = []
+    exits = iter([(1001, 0), (1002, 0)])
+
+    def fork():
+        threads_at_fork.append(threading.active_count())
+        return 1000 + len(threads_at_fork)
+
+    def waitpid(pid, options):  # pylint: disable=unused-argument
+        if len(threads_at_fork) == 2:
+            server.stop()
+        return next(exits)
+
+    # Act:
+    with mock.patch("os.fork", fork), mock.patch("os.waitpid", waitpid), mock.patch(
+        "os.kill"
+    ), mock.patch("signal.signal"):
+        server.run()
+
+    # Assert:
+    assert threads_at_fork == [threading.active_count()] * 2
+    assert server.stats()["restarts"] == 1
+
+
+@pytest.mark.hermetic
+@pytest.mark.skipif(sys.platform == "win32", reason="requires os.fork")
+def test_prefork_counts_every_route():
+    """Batch and protobuf requests are counted like JSON webhook requests."""
+
+    # Arrange:
+    server = PreforkServer(port=0, workers=1)
+    server.bind()
+    host, port = server.address
+    request = build_request_dict_basic("basic_webhook", "hi")
+    requests = [
+        ("/", json.dumps(request)),
+        ("/batch", json.dumps([request, request])),
+        (
+            "/proto",
+            json_format.ParseDict(request, WebhookRequest()).SerializeToString(),
+        ),
+    ]
+    master = multiprocessing.get_context("fork").Process(target=server.run)
+    master.start()
+
+    # Act:
+    try:
+        for path, body in requests:
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            connection.request("POST", path, body=body)
+            response = connection.getresponse()
+            assert response.status == 200
+            response.read()
+            connection.close()
+        deadline = time.monotonic() + 10
+        while server.stats()["requests"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        master.terminate()
+        master.join(timeout=10)
+
+    # Assert:
+    assert server.stats()["requests"] == 3
@@ -0,0 +1,204 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the binary protobuf webhook entry point."""
+
+import asyncio
+import json
+
+import pytest
+from google.protobuf import json_format
+from webhook.main import (
+    VALID_AGE_RESPONSE,
+    HandlerRegistry,
+    WebhookContext,
+    build_request_dict_basic,
+    build_request_dict_form,
+    build_request_dict_session,
+    registry,
+)
+from webhook.proto_webhook import (
+    ProtoWebhookContext,
+    WebhookRequest,
+    WebhookResponse,
+    ahandle_proto,
+    encode_proto_response,
+    handle_proto,
+)
+from webhook.server import WebhookServer
+
+
+def serialize(request_dict):
+    """Serializes a JSON request dictionary as a WebhookRequest."""
+    for info in (
+        request_dict.get("pageInfo", {}).get("formInfo", {}).get("parameterInfo", ())
+    ):
+        info["state"] = "FILLED"
+    return json_format.ParseDict(request_dict, WebhookRequest()).SerializeToString()
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize(
+    "request_dict",
+    [
+        build_request_dict_basic("basic_webhook", "MOCK TEXT"),
+        build_request_dict_form("validate_form", {"age": -1}),
+        build_request_dict_form("validate_form", {"age": 25}),
+        build_request_dict_session("set_session_param", {"key": "k", "val": "v"}),
+    ],
+)
+def test_handle_proto_matches_json(request_dict):
+    """The protobuf path answers what the JSON path answers, as a message."""
+    # Arrange:
+    serialized = serialize(request_dict)
+    tag = request_dict["fulfillmentInfo"]["tag"]
+
+    # Act:
+    response = handle_proto(serialized)
+    json_response = registry.dispatch(tag, WebhookContext(request_dict))
+
+    # Assert:
+    assert WebhookResponse.FromString(response) == json_format.ParseDict(
+        json.loads(json_response), WebhookResponse()
+    )
+
+
+@pytest.mark.hermetic
+def test_handle_proto_echo():
+    """echo_webhook echoes the JSON form of the protobuf request."""
+    # Arrange:
+    serialized = serialize(build_request_dict_basic("echo_webhook", "MOCK TEXT"))
+
+    # Act:
+    response = WebhookResponse.FromString(handle_proto(serialized))
+
+    # Assert:
+    assert json.loads(response.fulfillment_response.messages[0].text.text[0]) == {
+        "fulfillmentInfo": {"tag": "echo_webhook"},
+        "text": "MOCK TEXT",
+    }
+
+
+@pytest.mark.hermetic
+def test_proto_webhook_context():
+    """Accessors read the message, with the values JSON parsing would give."""
+    # Arrange:
+    request_dict = build_request_dict_session(
+        "set_session_param", {"count": 3, "ratio": 0.5, "nested": {"on": True}}
+    )
+    request_dict["pageInfo"] = {
+        "displayName": "Booking",
+        "formInfo": {"parameterInfo": [{"displayName": "age", "value": 7}]},
+    }
+
+    # Act:
+    context = ProtoWebhookContext(serialize(request_dict))
+
+    # Assert:
+    assert context.tag == "set_session_param"
+    assert context.text is None
+    assert context.session_parameters == {
+        "count": 3,
+        "ratio": 0.5,
+        "nested": {"on": True},
+    }
+    assert context.page_info["displayName"] == "Booking"
+    assert context.form_parameters == {"age": 7}
+    assert context.body["sessionInfo"]["parameters"]["count"] == 3.0
+
+
+@pytest.mark.hermetic
+def test_encode_proto_response():
+    """Constants are converted once; uncommon fields fall back to ParseDict."""
+    # Arrange:
+    payload = {
+        "fulfillment_response": {
+            "messages": [{"text": {"text": ["a", "b"]}}, {"payload": {"x": 1}}]
+        },
+        "page_info": {
+            "form_info": {
+                "parameter_info": [{"display_name": "age", "state": "INVALID"}]
+            }
+        },
+        "targetPage": "projects/p/pages/end",
+    }
+
+    # Act:
+    converted = WebhookResponse.FromString(encode_proto_response(payload))
+    constants = [encode_proto_response(VALID_AGE_RESPONSE) for _ in range(2)]
+
+    # Assert:
+    assert converted == json_format.ParseDict(payload, WebhookResponse())
+    assert constants[0] is constants[1]
+
+
+@pytest.mark.hermetic
+def test_ahandle_proto():
+    """Coroutine handlers are awaited through dispatch_async."""
+    # Arrange:
+    local_registry = HandlerRegistry()
+
+    @local_registry.register()
+    async def greet(context):
+        await asyncio.sleep(0)
+        return {
+            "fulfillment_response": {"messages": [{"text": {"text": [context.text]}}]}
+        }
+
+    serialized = serialize(build_request_dict_basic("greet", "hello"))
+
+    # Act:
+    response = asyncio.run(ahandle_proto(serialized, local_registry))
+
+    # Assert:
+    message = WebhookResponse.FromString(response)
+    assert list(message.fulfillment_response.messages[0].text.text) == ["hello"]
+
+
+@pytest.mark.hermetic
+def test_server_proto_route():
+    """The self-hosted server serves protobuf at /proto."""
+    # Arrange:
+    async def scenario():
+        server = WebhookServer(port=0)
+        await server.start()
+        try:
+            responses = []
+            for body in [
+                serialize(build_request_dict_basic("basic_webhook", "hi")),
+                b"\xff",
+            ]:
+                reader, writer = await asyncio.open_connection(*server.address)
+                writer.write(
+                    f"POST /proto HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n".encode() + body
+                )
+                head = await reader.readuntil(b"\r\n\r\n")
+                responses.append((int(head.split(b" ")[1]), await reader.read()))
+                writer.close()
+            return responses
+        finally:
+            await server.shutdown()
+
+    # Act:
+    (status, body), (bad_status, _) = asyncio.run(scenario())
+
+    # Assert:
+    assert status == 200 and bad_status == 400
+    message = WebhookResponse.FromString(body)
+    assert (
+        message.fulfillment_response.messages[0]
+        .text.text[0]
+        .startswith("Webhook received: hi")
+    )
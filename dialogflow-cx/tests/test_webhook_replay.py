@@ -0,0 +1,190 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the webhook traffic recorder and replayer."""
+
+import gzip
+import json
+import os
+import threading
+
+import pytest
+from utilities import RequestMock
+from webhook.main import build_request_dict_basic, webhook_fcn
+from webhook.recorder import TrafficRecorder, close_recorders
+from webhook_loadgen import InProcessTarget, generate_requests
+from webhook_replay import diff_responses, iter_records, replay, summarize_replay
+
+
+def record_requests(recorder, requests):
+    """Sends serialized requests through a recording webhook_fcn."""
+    recorded_webhook_fcn = recorder.wrap(webhook_fcn)
+    for _, body in requests:
+        recorded_webhook_fcn(RequestMock(payload=json.loads(body), data=body))
+
+
+@pytest.mark.hermetic
+def test_recorder_rotation(tmp_path):
+    """Records rotate across gzip files, keeping the newest max_files."""
+
+    # Arrange:
+    recorder = TrafficRecorder(str(tmp_path), max_file_bytes=2000, max_files=3)
+    unknown = build_request_dict_basic("MOCK_UNKNOWN_TAG", "")
+
+    # Act:
+    record_requests(recorder, generate_requests(count=30))
+    with pytest.raises(RuntimeError):
+        recorder.wrap(webhook_fcn)(RequestMock(payload=unknown))
+    recorder.close()
+    records = list(iter_records([str(tmp_path)]))
+
+    # Assert:
+    assert recorder.recorded == 31
+    assert recorder.dropped == 0
+    assert len(recorder.files()) == 3
+    assert 0 < len(records) < 31
+    assert records[-1]["error"] == "RuntimeError: Unrecognized tag: MOCK_UNKNOWN_TAG"
+    assert records[-1]["response"] is None
+    assert all(record["latency_ms"] > 0 for record in records)
+
+
+@pytest.mark.hermetic
+def test_recorder_starts_writer_on_first_record(tmp_path):
+    """No writer thread runs before the first record, e.g. in a pre-fork master."""
+
+    # Arrange:
+    threads = threading.active_count()
+    recorder = TrafficRecorder(str(tmp_path))
+    created_threads = threading.active_count()
+
+    # Act:
+    record_requests(recorder, generate_requests(count=1))
+    recording_threads = threading.active_count()
+    recorder.close()
+
+    # Assert:
+    assert created_threads == threads
+    assert recording_threads == threads + 1
+    assert recorder.recorded == 1
+    with pytest.raises(ValueError):
+        TrafficRecorder(str(tmp_path), max_files=0)
+
+
+@pytest.mark.hermetic
+def test_replay_matches_and_diffs(tmp_path):
+    """Replayed responses are diffed against recorded ones, per tag."""
+
+    # Arrange:
+    recorder = TrafficRecorder(str(tmp_path))
+    record_requests(recorder, generate_requests(count=12))
+    recorder.close()
+    records = list(iter_records(recorder.files()))
+    records[0]["response"] = records[0]["response"].replace("load test", "changed")
+    tampered = tmp_path / "tampered.ndjson.gz"
+    with gzip.open(tampered, "wb") as file_handle:
+        file_handle.write(json.dumps(records[0]).encode() + b"\n")
+
+    # Act:
+    results, _ = replay(iter_records(recorder.files()), InProcessTarget(), qps=500)
+    tampered_results, _ = replay(iter_records([str(tampered)]), InProcessTarget())
+    report = summarize_replay(results)
+
+    # Assert:
+    assert report["_all"]["requests"] == 12
+    assert report["_all"]["mismatches"] == 0
+    assert report["basic_webhook"]["requests"] == 3
+    assert "delta_p99_ms" in report["basic_webhook"]
+    (difference,) = tampered_results[0]["differences"]
+    assert difference.startswith("$.fulfillment_response.messages[0].text.text[0]: ")
+    assert "changed" in difference
+
+
+@pytest.mark.hermetic
+def test_iter_records_merges_files_by_timestamp(tmp_path):
+    """Records of concurrently written files are read in timestamp order."""
+
+    # Arrange:
+    for name, timestamps in [("a", [2.0, 3.0]), ("b", [1.0, 4.0])]:
+        with gzip.open(tmp_path / f"{name}.ndjson.gz", "wb") as file_handle:
+            for timestamp in timestamps:
+                file_handle.write(json.dumps({"ts": timestamp}).encode() + b"\n")
+
+    # Act:
+    records = list(iter_records([str(tmp_path)]))
+
+    # Assert:
+    assert [record["ts"] for record in records] == [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.hermetic
+def test_diff_responses():
+    """Differences are reported by JSON path."""
+    assert not diff_responses('{"a": [1, 2], "b": 1}', b'{"b": 1, "a": [1, 2]}')
+    assert diff_responses('{"a": [1, 2]}', b'{"a": [1, 3], "c": 0}') == [
+        "$.a[1]: 2 != 3",
+        "$.c: added",
+    ]
+    assert diff_responses("not json", b"other") == ["$: bodies differ"]
+
+
+@pytest.mark.hermetic
+def test_recorder_rotates_own_files(tmp_path):
+    """Rotation keeps other processes' files; a forked child closes its own."""
+
+    # Arrange:
+    other = tmp_path / "webhook-20220101T000000-1-000001.ndjson.gz"
+    with gzip.open(other, "wb") as file_handle:
+        file_handle.write(b"{}\n")
+    recorder = TrafficRecorder(str(tmp_path), max_file_bytes=2000, max_files=1)
+
+    # Act:
+    pid = os.fork()
+    if not pid:
+        try:
+            record_requests(recorder, generate_requests(count=3))
+        finally:
+            close_recorders()
+            os._exit(0)  # pylint: disable=protected-access
+    os.waitpid(pid, 0)
+    record_requests(recorder, generate_requests(count=30))
+    recorder.close()
+
+    # Assert:
+    assert other.exists()
+    assert len(recorder.files(pid=os.getpid())) == 1
+    (child_file,) = recorder.files(pid=pid)
+    with gzip.open(child_file, "rb") as file_handle:
+        assert len(file_handle.read().splitlines()) == 3
+
+
+@pytest.mark.hermetic
+def test_iter_records_warns_on_truncated_file(tmp_path):
+    """Records before the end of a truncated file are read, with a warning."""
+
+    # Arrange:
+    recorder = TrafficRecorder(str(tmp_path))
+    record_requests(recorder, generate_requests(count=5))
+    recorder.close()
+    (path,) = recorder.files()
+    with open(path, "rb") as file_handle:
+        compressed = file_handle.read()
+    with open(path, "wb") as file_handle:
+        file_handle.write(compressed[:-8])
+
+    # Act:
+    with pytest.warns(RuntimeWarning, match="truncated"):
+        records = list(iter_records([path]))
+
+    # Assert:
+    assert len(records) == 5
@@ -0,0 +1,228 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the self-hosted asyncio webhook server."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from webhook.main import HandlerRegistry, build_request_dict_basic, extract_text
+from webhook.server import WebhookServer
+
+
+async def post(reader, writer, payload, path="/"):
+    """Sends one keep-alive POST request and reads back (status, body)."""
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    length = next(
+        int(line.split(":")[1]) for line in lines if line.startswith("Content-Length")
+    )
+    return int(lines[0].split(" ")[1]), await reader.readexactly(length)
+
+
+async def request_once(server, payload, path="/"):
+    """Opens a connection, sends one request and closes the connection."""
+    reader, writer = await asyncio.open_connection(*server.address)
+    try:
+        return await post(reader, writer, payload, path)
+    finally:
+        writer.close()
+
+
+@pytest.mark.hermetic
+def test_server_keep_alive():
+    """Several requests are served over one connection by the default registry."""
+
+    async def scenario():
+        server = WebhookServer(port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        responses = []
+        for text in ["one", "two", "three"]:
+            responses.append(
+                await post(
+                    reader, writer, build_request_dict_basic("basic_webhook", text)
+                )
+            )
+        status, body = await post(reader, writer, {"fulfillmentInfo": {}})
+        writer.close()
+        await server.shutdown()
+        return responses, status, body
+
+    responses, status, body = asyncio.run(scenario())
+    assert [status for status, _ in responses] == [200, 200, 200]
+    assert extract_text(responses[1][1]) == "Webhook received: two (Tag: basic_webhook)"
+    assert status == 400
+    assert json.loads(body)["error"]["type"] == "KeyError"
+
+
+@pytest.mark.hermetic
+@pytest.mark.parametrize(
+    "max_concurrency,min_elapsed,max_elapsed", [(8, 0, 0.5), (1, 0.4, 5)]
+)
+def test_server_async_handlers(max_concurrency, min_elapsed, max_elapsed):
+    """Async handlers overlap, up to the configured concurrency limit."""
+    local_registry = HandlerRegistry()
+
+    @local_registry.register("sleep")
+    async def sleep(context):  # pylint: disable=unused-argument
+        await asyncio.sleep(0.1)
+        return b"{}"
+
+    async def scenario():
+        server = WebhookServer(local_registry, port=0, max_concurrency=max_concurrency)
+        await server.start()
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *[
+                request_once(server, build_request_dict_basic("sleep", ""))
+                for _ in range(5)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        await server.shutdown()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(scenario())
+    assert all(status == 200 for status, _ in results)
+    assert min_elapsed <= elapsed < max_elapsed
+
+
+@pytest.mark.hermetic
+def test_server_graceful_shutdown():
+    """In-flight requests complete when the server shuts down."""
+    local_registry = HandlerRegistry()
+
+    @local_registry.register("slow")
+    async def slow(context):  # pylint: disable=unused-argument
+        await asyncio.sleep(0.2)
+        return b'{"done": true}'
+
+    async def scenario():
+        server = WebhookServer(local_registry, port=0)
+        await server.start()
+        idle_reader, idle_writer = await asyncio.open_connection(*server.address)
+        in_flight = asyncio.ensure_future(
+            request_once(server, build_request_dict_basic("slow", ""))
+        )
+        await asyncio.sleep(0.05)
+        await server.shutdown()
+        idle_closed = await idle_reader.read() == b""
+        idle_writer.close()
+        return await in_flight, idle_closed
+
+    (status, body), idle_closed = asyncio.run(scenario())
+    assert status == 200
+    assert json.loads(body) == {"done": True}
+    assert idle_closed
+
+
+@pytest.mark.hermetic
+def test_server_batch():
+    """POST /batch streams a chunked NDJSON response, then keeps the connection."""
+
+    async def scenario():
+        server = WebhookServer(port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        body = b"\n".join(
+            json.dumps(build_request_dict_basic(tag, "x")).encode()
+            for tag in ["basic_webhook", "MOCK_UNKNOWN_TAG"]
+        )
+        writer.write(
+            f"POST /batch HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        head = await reader.readuntil(b"\r\n\r\n")
+        chunks = []
+        while True:
+            size = int(await reader.readuntil(b"\r\n"), 16)
+            chunks.append(await reader.readexactly(size + 2))
+            if not size:
+                break
+        status, _ = await post(
+            reader, writer, build_request_dict_basic("basic_webhook", "")
+        )
+        writer.close()
+        await server.shutdown()
+        return head, b"".join(chunk[:-2] for chunk in chunks), status
+
+    head, body, status = asyncio.run(scenario())
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert b"Transfer-Encoding: chunked" in head
+    assert "response" in lines[0]
+    assert lines[1]["error"]["type"] == "RuntimeError"
+    assert status == 200
+
+
+@pytest.mark.hermetic
+def test_server_metrics():
+    """GET /metrics serves the registry's per-tag counters."""
+
+    async def scenario():
+        local_registry = HandlerRegistry()
+        local_registry.register("basic_webhook")(lambda context: b"{}")
+        server = WebhookServer(handler_registry=local_registry, port=0)
+        await server.start()
+        await request_once(server, build_request_dict_basic("basic_webhook", "x"))
+        reader, writer = await asyncio.open_connection(*server.address)
+        writer.write(
+            b"GET /metrics HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+        )
+        response = await reader.read()
+        writer.close()
+        await server.shutdown()
+        return response.decode()
+
+    response = asyncio.run(scenario())
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert "text/plain; version=0.0.4" in response
+    assert 'webhook_requests_total{tag="basic_webhook"} 1' in response
+
+
+@pytest.mark.hermetic
+def test_server_idle_timeout():
+    """Idle connections close; a slow upload past the idle timeout is served."""
+
+    async def scenario():
+        server = WebhookServer(port=0, keep_alive_timeout=0.1)
+        await server.start()
+        body = json.dumps(build_request_dict_basic("basic_webhook", "slow")).encode()
+        reader, writer = await asyncio.open_connection(*server.address)
+        writer.write(
+            f"POST / HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body[:10]
+        )
+        await asyncio.sleep(0.3)
+        writer.write(body[10:])
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+        # Idle after the response: the server closes the connection.
+        rest = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        await server.shutdown()
+        return head, rest
+
+    head, rest = asyncio.run(scenario())
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert rest == b""
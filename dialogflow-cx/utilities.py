@@ -15,10 +15,12 @@
 """Helper functions for creating and testing Dialogflow CX samples."""
 
 import contextlib
+import io
+import json
 import time
 from contextlib import ExitStack
 from dataclasses import dataclass, field
-from typing import Mapping
+from typing import Mapping, Optional
 
 import google.api_core.exceptions
 import google.cloud.dialogflowcx as cx
@@ -31,11 +33,23 @@ class RequestMock:
     """Mocks a flask.Request interface for testing webhooks."""
 
     payload: Mapping[str, Mapping[str, str]] = field(default_factory=dict)
+    data: Optional[bytes] = None
 
     def get_json(self) -> Mapping:
         """Method for returning the payload via the get_json interface."""
         return self.payload
 
+    def get_data(self) -> bytes:
+        """Method for returning the raw body; data if set, else the payload."""
+        if self.data is not None:
+            return self.data
+        return json.dumps(self.payload).encode()
+
+    @property
+    def stream(self):
+        """Accesses the raw body as a file-like object."""
+        return io.BytesIO(self.get_data())
+
 
 def patch_client(client, method_name, stack, return_value=None):
     """Patches the Dialogflow CX client object for hermetic testing."""
@@ -90,6 +104,7 @@ def run_hermetic_test(sample):
             stack,
             return_value=cx.Flow(name="MOCK_FLOW_NAME"),
         )
+        patch_client(sample.agent_delegator.client, "update_agent", stack)
         patch_client(sample.page_delegator.client, "update_page", stack)
         patch_client(sample.start_flow_delegator.client, "update_flow", stack)
         lro = mock.create_autospec(Operation, instance=True, spec_set=True)
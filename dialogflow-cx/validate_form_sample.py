@@ -76,18 +76,22 @@ class ValidateFormSample(ds.DialogflowSample):
         self.set_start_flow_delegator(dg.StartFlowDelegator(self))
         self.set_session_delegator(dg.SessionsDelegator(self))
         self.start_page_delegator = dg.StartPageDelegator(self)
-
-    def setup(self, wait=1):
-        """Initializes the sample by communicating with the Dialogflow API."""
-        self.agent_delegator.setup()
-        self.webhook_delegator.setup()
-        self.intent_delegator.setup()
-        self.page_delegator.setup()
-        self.start_flow_delegator.setup()
-        self.start_flow_delegator.append_transition_route(
-            target_page=self.page_delegator.page.name,
-            intent=self.intent_delegator.intent.name,
+        # The form routes to the webhook: the page is deleted before it.
+        self.provisioner = dg.page_sample_provisioner(
+            self, page_after=[self.webhook_delegator]
         )
+        self.provisioner.add(
+            "PageForm",
+            self.add_page_form,
+            depends_on=[
+                self.page_delegator,
+                self.webhook_delegator,
+                self.start_flow_delegator,
+            ],
+        )
+
+    def add_page_form(self):
+        """Adds the age form to the page, and its route; sent in one update."""
         self.page_delegator.add_parameter(
             display_name="age",
             required=True,
@@ -108,15 +112,16 @@ class ValidateFormSample(ds.DialogflowSample):
                 text=["Form Filled"],
             ),
         )
+        self.page_delegator.flush()
+
+    def setup(self, wait=1):
+        """Initializes the sample by communicating with the Dialogflow API."""
+        self.provision()
         super().setup(wait=wait)
 
     def tear_down(self):
         """Deletes the sample components via the Dialogflow API."""
-        self.page_delegator.tear_down()
-        self.start_flow_delegator.tear_down()
-        self.intent_delegator.tear_down()
-        self.webhook_delegator.tear_down()
-        self.agent_delegator.tear_down()
+        self.provisioner.tear_down()
 
 
 if __name__ == "__main__":
@@ -149,6 +154,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--tear-down", action="store_true", help="Destroy the agent after run?"
     )
+    dg.add_provisioning_arguments(parser)
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument(
         "--webhook-uri",
@@ -168,15 +174,4 @@ if __name__ == "__main__":
             args["project_id"], args.pop("build_uuid")
         )
 
-    tear_down = args.pop("tear_down")
-    user_input = args.pop("user_input", [])
-    sample = ValidateFormSample(**args)
-    sample.setup()
-    sample.run(user_input)
-    if tear_down:
-        sample.tear_down()
-    else:
-        print(
-            "Agent sample available at: "
-            f"https://dialogflow.cloud.google.com/cx/{sample.start_flow_delegator.flow.name}"
-        )
+    dg.run_sample(ValidateFormSample, args)
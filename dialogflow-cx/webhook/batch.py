@@ -0,0 +1,183 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batches of webhook requests, as a JSON array or NDJSON, answered as NDJSON."""
+
+import codecs
+import json
+from typing import Any, AsyncIterator, Iterable, Iterator
+
+try:
+    from .context import WebhookContext, encode_response, error_payload
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from context import (  # type: ignore
+        WebhookContext,
+        encode_response,
+        error_payload,
+    )
+
+BATCH_CHUNK_SIZE = 64 * 1024
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _iter_ndjson_items(buffer: bytes, chunks: Iterator[bytes]):
+    """Splits NDJSON chunks into non-blank lines."""
+    while True:
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        buffer += chunk
+    if buffer.strip():
+        yield buffer
+
+
+def _item_end(buffer: str, position: int):
+    """Returns the index of the "," or "]" ending the array element at position.
+
+    Returns None if the end of the element is not buffered yet. Strings and
+    nested brackets are skipped, but the element is not otherwise validated.
+    """
+    depth = 0
+    in_string = escaped = False
+    for index in range(position, len(buffer)):
+        char = buffer[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            if not depth:
+                return index
+            depth -= 1
+        elif char == "," and not depth:
+            return index
+    return None
+
+
+def _iter_array_items(buffer: str, text_chunks: Iterator[str]):
+    """Decodes the elements of a JSON array, pulling chunks only as needed.
+
+    A malformed element yields its error, and decoding resumes after the
+    next top-level comma.
+    """
+    position = buffer.index("[") + 1
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if buffer.startswith("]", position):
+            return
+        error = None
+        if position < len(buffer):
+            try:
+                item, position = _JSON_DECODER.raw_decode(buffer, position)
+            except ValueError as exc:
+                end = _item_end(buffer, position)
+                if end is None:
+                    # The element may only be incomplete: read on.
+                    error = exc
+                else:
+                    yield exc
+                    buffer, position = buffer[end:], 0
+                    continue
+            else:
+                yield item
+                buffer, position = buffer[position:], 0
+                continue
+        chunk = next(text_chunks, None)
+        if chunk is None:
+            # The array itself is unterminated; nothing after it is recoverable.
+            yield error or ValueError("Unterminated JSON array")
+            return
+        buffer += chunk
+
+
+def iter_batch_requests(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Parses a batch body, either a JSON array or NDJSON, item by item.
+
+    Yields each parsed request, or the exception raised parsing it, so that a
+    malformed line only fails its own entry. Chunks are consumed lazily, so
+    memory is bounded by the largest request rather than the whole batch.
+    """
+    chunks = iter(chunks)
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    if buffer.lstrip().startswith(b"["):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        yield from _iter_array_items(
+            decoder.decode(buffer), (decoder.decode(chunk) for chunk in chunks)
+        )
+        return
+    for line in _iter_ndjson_items(buffer, chunks):
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield exc
+
+
+def encode_batch_line(index: int, response=None, error=None) -> bytes:
+    """Encodes one NDJSON line of a batch response."""
+    if error is not None:
+        return encode_response({"index": index, **error_payload(error)}) + b"\n"
+    if isinstance(response, str):
+        response = response.encode()
+    return b'{"index": %d, "response": %s}\n' % (index, response)
+
+
+def _batch_context(index: int, item) -> WebhookContext:
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise TypeError(f"Batch item {index} is not a JSON object")
+    return WebhookContext(item)
+
+
+def iter_batch_responses(chunks: Iterable[bytes], handler_registry) -> Iterator[bytes]:
+    """Dispatches each request of a batch body through a HandlerRegistry,
+    yielding NDJSON lines in order."""
+    for index, item in enumerate(iter_batch_requests(chunks)):
+        try:
+            context = _batch_context(index, item)
+            response = handler_registry.dispatch(context.tag, context)
+        except Exception as exc:  # pylint: disable=broad-except
+            yield encode_batch_line(index, error=exc)
+        else:
+            yield encode_batch_line(index, response=response)
+
+
+async def aiter_batch_responses(
+    chunks: Iterable[bytes], handler_registry
+) -> AsyncIterator[bytes]:
+    """Like iter_batch_responses, awaiting handlers inside a running loop."""
+    for index, item in enumerate(iter_batch_requests(chunks)):
+        try:
+            context = _batch_context(index, item)
+            response = await handler_registry.dispatch_async(context.tag, context)
+        except Exception as exc:  # pylint: disable=broad-except
+            yield encode_batch_line(index, error=exc)
+        else:
+            yield encode_batch_line(index, response=response)
@@ -0,0 +1,156 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The parsed webhook request context, and the JSON encoding of responses."""
+
+import json
+import time
+from typing import Any, Callable, Dict, Mapping, Optional
+
+
+class cached_property:  # pylint: disable=invalid-name,too-few-public-methods
+    """functools.cached_property without its per-class lock.
+
+    Before Python 3.12 the lock serializes every first access across all
+    instances, which costs more than the accessors it guards; they are
+    idempotent, so a racing thread at worst computes a value twice.
+    """
+
+    def __init__(self, function: Callable) -> None:
+        self.function = function
+        self.name = function.__name__
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.function(instance)
+        return value
+
+
+class DeadlineExceeded(Exception):
+    """Exception to raise when a handler runs out of its time budget."""
+
+
+class WebhookContext:
+    """A webhook request, parsed once and shared by every handler.
+
+    Accessors are computed on first use and cached, so handlers can read the
+    same field repeatedly without walking the request body again. Dispatch
+    sets the deadline (on the time.monotonic clock) from the tag's timeout,
+    and the degraded response registered for the tag, if any.
+    """
+
+    def __init__(
+        self,
+        body: Optional[Mapping] = None,
+        request=None,
+        raw: Optional[bytes] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        self._body = body
+        self._raw = raw
+        self.request = request
+        self.deadline = deadline
+        self.degraded_response: Optional[bytes] = None
+
+    def remaining(self) -> float:
+        """Returns the seconds left before the deadline; inf without one."""
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self, reserve=0.0) -> None:
+        """Raises DeadlineExceeded unless more than reserve seconds remain."""
+        if self.remaining() <= reserve:
+            raise DeadlineExceeded(f"Deadline exceeded for tag: {self.tag}")
+
+    @classmethod
+    def from_request(cls, request) -> "WebhookContext":
+        """Builds a context from a flask.Request; the body is parsed on first use."""
+        return cls(request=request)
+
+    @cached_property
+    def body(self) -> Mapping[str, Any]:
+        """Accesses the parsed request body."""
+        if self._body is not None:
+            return self._body
+        if self._raw is not None:
+            return json.loads(self._raw)
+        return self.request.get_json()
+
+    @cached_property
+    def raw(self) -> bytes:
+        """Accesses the request body as received, without re-serializing it."""
+        if self._raw is not None:
+            return self._raw
+        if self.request is not None:
+            return self.request.get_data()
+        return encode_response(self._body)
+
+    @cached_property
+    def tag(self) -> str:
+        """Accesses the fulfillment tag that selects the handler."""
+        return self.body["fulfillmentInfo"]["tag"]
+
+    @cached_property
+    def text(self) -> Optional[str]:
+        """Accesses the end-user text, if the request was triggered by text."""
+        return self.body.get("text")
+
+    @cached_property
+    def session_parameters(self) -> Mapping[str, Any]:
+        """Accesses the session parameters; empty if none are set."""
+        return self.body.get("sessionInfo", {}).get("parameters", {})
+
+    @cached_property
+    def page_info(self) -> Mapping[str, Any]:
+        """Accesses the current page info; empty if not sent."""
+        return self.body.get("pageInfo", {})
+
+    @cached_property
+    def form_parameter_info(self) -> Dict[str, Mapping[str, Any]]:
+        """Accesses the form parameterInfo entries, indexed by display name."""
+        parameter_info_list = self.page_info.get("formInfo", {}).get(
+            "parameterInfo", []
+        )
+        return {info["displayName"]: info for info in parameter_info_list}
+
+    @cached_property
+    def form_parameters(self) -> Dict[str, Any]:
+        """Accesses the form parameter values, indexed by display name."""
+        return {
+            name: info.get("value") for name, info in self.form_parameter_info.items()
+        }
+
+
+def get_field(mapping: Mapping, name: str, camel_name: str, default=None):
+    """Reads a JSON field written in snake_case or lowerCamelCase."""
+    value = mapping.get(name)
+    return mapping.get(camel_name, default) if value is None else value
+
+
+def encode_response(payload: Mapping) -> bytes:
+    """Serializes a webhook response payload to JSON bytes."""
+    return json.dumps(payload).encode()
+
+
+def error_payload(exc: BaseException) -> Dict[str, Any]:
+    """Describes an exception as a JSON-serializable error payload."""
+    return {"error": {"type": type(exc).__name__, "message": str(exc)}}
+
+
+def encode_error(exc: BaseException) -> bytes:
+    """Serializes an exception to a JSON error body."""
+    return encode_response(error_payload(exc))
@@ -0,0 +1,275 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Declarative form validation for the validate_form webhook.
+
+Rules are declared per page and compiled once, when the Form is built, into
+one callable per parameter. Validating a request is then a single pass over
+its parameterInfo list. Messages are format strings with {name} and {value}.
+"""
+
+import abc
+import json
+import math
+import re
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence, Union
+
+Validator = Callable[[Any], Optional[str]]
+
+
+class Rule(abc.ABC):  # pylint: disable=too-few-public-methods
+    """A rule on the value of one form parameter."""
+
+    message = "{name} is not valid"
+
+    def __init__(self, message: Optional[str] = None) -> None:
+        if message is not None:
+            self.message = message
+
+    @abc.abstractmethod
+    def compile(self, name: str) -> Validator:
+        """Returns a callable mapping a value to an error message, or None."""
+
+
+class Range(Rule):  # pylint: disable=too-few-public-methods
+    """Requires a number between minimum and maximum, inclusive."""
+
+    message = "{name} must be between {minimum} and {maximum}"
+
+    def __init__(self, minimum=None, maximum=None, message=None) -> None:
+        super().__init__(message)
+        self.minimum = -math.inf if minimum is None else minimum
+        self.maximum = math.inf if maximum is None else maximum
+
+    def compile(self, name: str) -> Validator:
+        minimum, maximum, message = self.minimum, self.maximum, self.message
+
+        def check(value):
+            try:
+                if minimum <= value <= maximum:
+                    return None
+            except TypeError:
+                pass
+            return message.format(
+                name=name, value=value, minimum=minimum, maximum=maximum
+            )
+
+        return check
+
+
+class Pattern(Rule):  # pylint: disable=too-few-public-methods
+    """Requires the value, as a string, to fully match a regular expression."""
+
+    message = "{name} does not match the expected format"
+
+    def __init__(self, regex: str, message=None) -> None:
+        super().__init__(message)
+        self.regex = regex
+
+    def compile(self, name: str) -> Validator:
+        fullmatch, message = re.compile(self.regex).fullmatch, self.message
+
+        def check(value):
+            if fullmatch(value if isinstance(value, str) else str(value)):
+                return None
+            return message.format(name=name, value=value)
+
+        return check
+
+
+class OneOf(Rule):  # pylint: disable=too-few-public-methods
+    """Requires the value to be one of a fixed set of values."""
+
+    message = "{name} must be one of {choices}"
+
+    def __init__(self, choices: Iterable, message=None) -> None:
+        super().__init__(message)
+        self.choices = tuple(choices)
+
+    def compile(self, name: str) -> Validator:
+        choices, message = frozenset(self.choices), self.message
+        listed = ", ".join(str(choice) for choice in self.choices)
+
+        def check(value):
+            try:
+                if value in choices:
+                    return None
+            except TypeError:
+                pass
+            return message.format(name=name, value=value, choices=listed)
+
+        return check
+
+
+class Check:  # pylint: disable=too-few-public-methods
+    """A rule across several parameters, reported against one of them.
+
+    predicate is called with the parameter values in order, once all of them
+    are filled and individually valid; target defaults to the last parameter.
+    """
+
+    def __init__(
+        self,
+        parameters: Sequence[str],
+        predicate: Callable[..., bool],
+        message: str,
+        target: Optional[str] = None,
+    ) -> None:
+        self.parameters = tuple(parameters)
+        self.predicate = predicate
+        self.message = message
+        self.target = target or self.parameters[-1]
+
+
+def _chain(validators: Sequence[Validator]) -> Validator:
+    if len(validators) == 1:
+        return validators[0]
+
+    def check(value):
+        for validator in validators:
+            message = validator(value)
+            if message is not None:
+                return message
+        return None
+
+    return check
+
+
+def _ignore(value):  # pylint: disable=unused-argument
+    return None
+
+
+class Form:
+    """The compiled validation rules of one page's form.
+
+    Parameters without a value are not validated, since Dialogflow fills a
+    form over several turns and prompts for required parameters itself. With
+    clear_invalid, invalid parameters are also cleared from the session.
+    """
+
+    def __init__(
+        self,
+        parameters: Mapping[str, Union[Rule, Sequence[Rule]]],
+        checks: Sequence[Check] = (),
+        valid_message="Valid",
+        clear_invalid: bool = False,
+    ) -> None:
+        self.parameters = dict(parameters)
+        self.checks = tuple(checks)
+        self.clear_invalid = clear_invalid
+        self._validators: Dict[str, Validator] = {
+            name: _chain(
+                [
+                    rule.compile(name)
+                    for rule in ([rules] if isinstance(rules, Rule) else rules)
+                ]
+            )
+            for name, rules in self.parameters.items()
+        }
+        self._checked = frozenset(
+            name for check in self.checks for name in check.parameters
+        )
+        for name in self._checked:
+            self._validators.setdefault(name, _ignore)
+        # One lookup per parameter: (validator, whether a Check reads the value).
+        self._compiled = {
+            name: (validator, name in self._checked)
+            for name, validator in self._validators.items()
+        }
+        self.valid_response = json.dumps(
+            {"fulfillment_response": {"messages": [_text_message(valid_message)]}}
+        ).encode()
+
+    def validate(self, parameter_info: Iterable[Mapping[str, Any]]) -> Dict[str, str]:
+        """Validates a request's parameterInfo list; returns {name: message}."""
+        compiled = self._compiled
+        invalid: Dict[str, str] = {}
+        values: Dict[str, Any] = {}
+        for info in parameter_info:
+            name = info["displayName"]
+            entry = compiled.get(name)
+            if entry is None:
+                continue
+            value = info.get("value")
+            if value is None:
+                continue
+            message = entry[0](value)
+            if message is not None:
+                invalid[name] = message
+            elif entry[1]:
+                values[name] = value
+        for check in self.checks:
+            if check.target in invalid:
+                continue
+            try:
+                arguments = [values[name] for name in check.parameters]
+            except KeyError:
+                continue
+            if not check.predicate(*arguments):
+                invalid[check.target] = check.message.format_map(
+                    {**values, "name": check.target, "value": values.get(check.target)}
+                )
+        return invalid
+
+    def validate_values(self, values: Mapping[str, Any]) -> Dict[str, str]:
+        """Validates parameter values given as {name: value}."""
+        return self.validate(
+            {"displayName": name, "value": value} for name, value in values.items()
+        )
+
+    def response(self, invalid: Mapping[str, str]) -> bytes:
+        """Builds the webhook response for the result of validate.
+
+        Invalid parameters are marked INVALID, so Dialogflow prompts for them
+        again, and cleared from the session if the form clears them; their
+        messages are sent as text.
+        """
+        if not invalid:
+            return self.valid_response
+        response: Dict[str, Any] = {
+            "fulfillment_response": {
+                "messages": [_text_message(message) for message in invalid.values()]
+            },
+            "page_info": {
+                "form_info": {
+                    "parameter_info": [
+                        {"display_name": name, "state": "INVALID"} for name in invalid
+                    ]
+                }
+            },
+        }
+        if self.clear_invalid:
+            response["session_info"] = {"parameters": dict.fromkeys(invalid)}
+        return json.dumps(response).encode()
+
+
+def _text_message(text: str) -> Dict[str, Any]:
+    return {"text": {"text": [text]}}
+
+
+class FormRegistry:
+    """Maps page display names to their Forms, falling back to a default."""
+
+    def __init__(self, default: Optional[Form] = None) -> None:
+        self.default = default if default is not None else Form({})
+        self._forms: Dict[str, Form] = {}
+
+    def register(self, page: str, form: Form) -> Form:
+        """Declares the form of the page with display name page."""
+        self._forms[page] = form
+        return form
+
+    def get(self, page: Optional[str]) -> Form:
+        """Returns the form declared for page, or the default form."""
+        return self._forms.get(page, self.default)
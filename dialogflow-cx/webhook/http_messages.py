@@ -0,0 +1,76 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""HTTP/1.1 message reading shared by the webhook server and the lookup client.
+
+Both read from asyncio streams opened with limit=MAX_HEADER_BYTES.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Upper bound of an HTTP message head, and of each line read from a stream.
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class BadRequest(Exception):
+    """Exception to raise when an HTTP request cannot be parsed."""
+
+
+async def read_head(reader, start_line: bytes = b"") -> bytes:
+    """Reads an HTTP message head, after start_line if already read."""
+    head = start_line or await reader.readuntil(b"\r\n")
+    while not head.endswith(b"\r\n\r\n"):
+        if len(head) > MAX_HEADER_BYTES:
+            raise BadRequest(f"Head exceeds {MAX_HEADER_BYTES} bytes")
+        head += await reader.readuntil(b"\r\n")
+    return head
+
+
+def parse_head(head: bytes) -> Tuple[List[str], Dict[str, str]]:
+    """Splits an HTTP message head into its start line fields and its headers.
+
+    Header names are lowercased.
+    """
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return lines[0].split(" ", 2), headers
+
+
+def is_keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    """Returns whether an HTTP message leaves its connection open."""
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+async def read_chunked(reader, max_bytes: Optional[int] = None) -> bytes:
+    """Reads a body sent with chunked transfer encoding."""
+    chunks = []
+    size = 0
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        chunk_size = int(line.split(b";", 1)[0], 16)
+        if chunk_size == 0:
+            await reader.readuntil(b"\r\n")
+            return b"".join(chunks)
+        size += chunk_size
+        if max_bytes is not None and size > max_bytes:
+            raise BadRequest(f"Body exceeds {max_bytes} bytes")
+        chunks.append(await reader.readexactly(chunk_size))
+        await reader.readexactly(2)
@@ -0,0 +1,60 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Webhook handlers imported on their first call, to keep cold starts fast."""
+
+import importlib
+import threading
+from typing import Callable, Optional
+
+try:
+    from .context import WebhookContext
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from context import WebhookContext  # type: ignore
+
+
+class LazyHandler:
+    """A handler imported from "module:attribute" on its first call.
+
+    Module names starting with "." are resolved next to this file, whether it
+    is imported as webhook.lazy_handler or, as in Cloud Functions, top-level.
+    """
+
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self._handler: Optional[Callable] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Accesses whether the target has been imported yet."""
+        return self._handler is not None
+
+    def load(self) -> Callable:
+        """Imports and returns the target handler; idempotent."""
+        if self._handler is None:
+            with self._lock:
+                if self._handler is None:
+                    module_name, _, attribute = self.target.partition(":")
+                    if module_name.startswith(".") and not __package__:
+                        module_name = module_name[1:]
+                    module = importlib.import_module(module_name, __package__)
+                    self._handler = getattr(module, attribute)
+        return self._handler
+
+    def __call__(self, context: WebhookContext):
+        return (self._handler or self.load())(context)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.target!r})"
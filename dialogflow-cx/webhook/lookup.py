@@ -0,0 +1,331 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lookup handlers: webhook handlers that read from backend services.
+
+A lookup handler declares the backend requests it needs as path templates
+filled from the session parameters, such as "/orders/{order_id}". They are
+fetched concurrently over keep-alive HTTP connections, pooled per backend and
+per process, and their JSON results are cached per path for a TTL. Register
+one with HandlerRegistry.register_lookup, after configuring its backend:
+
+    backends.configure("default", "http://orders.internal:8080")
+"""
+
+import asyncio
+import json
+import os
+import threading
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from .context import DeadlineExceeded, WebhookContext
+    from .http_messages import (
+        MAX_HEADER_BYTES,
+        is_keep_alive,
+        parse_head,
+        read_chunked,
+        read_head,
+    )
+    from .response_cache import ResponseCache
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from context import DeadlineExceeded, WebhookContext  # type: ignore
+    from http_messages import (  # type: ignore
+        MAX_HEADER_BYTES,
+        is_keep_alive,
+        parse_head,
+        read_chunked,
+        read_head,
+    )
+    from response_cache import ResponseCache  # type: ignore
+
+BACKEND_URL_ENV = "WEBHOOK_BACKEND_URL"
+
+
+class BackendError(Exception):
+    """Exception to raise when a backend answers with an error status."""
+
+
+class ConnectionPool:  # pylint: disable=too-many-instance-attributes
+    """Keep-alive HTTP/1.1 connections to one backend, shared by all lookups.
+
+    At most max_connections requests are in flight at once; idle connections
+    are reused, most recently used first. Connections belong to the event loop
+    that opened them, so the pool starts afresh when used from another loop.
+    """
+
+    def __init__(self, url: str, max_connections=10, timeout=2.0) -> None:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported backend URL: {url}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.opened = 0
+        self.requests = 0
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def request(
+        self, method: str, path: str, body=b"", timeout: Optional[float] = None
+    ) -> Tuple[int, bytes]:
+        """Sends one request; returns the status and body of the response.
+
+        Requests on idle connections that the backend has meanwhile closed
+        are retried on another connection.
+        """
+        self._bind_loop()
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        head = (
+            f"{method} {self.prefix}{path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1")
+        async with self._semaphore:
+            while True:
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._open()
+                try:
+                    status, payload, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, head + body), timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                self.requests += 1
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, payload
+
+    async def get_json(self, path: str, timeout: Optional[float] = None) -> Any:
+        """GETs path and parses the JSON response."""
+        status, payload = await self.request("GET", path, timeout=timeout)
+        if status != 200:
+            raise BackendError(f"GET {path}: HTTP {status}")
+        return json.loads(payload)
+
+    def close(self) -> None:
+        """Closes the idle connections; callable from any thread."""
+        loop, idle, self._idle = self._loop, self._idle, []
+        if loop is None or loop.is_closed():
+            return
+        for _, writer in idle:
+            loop.call_soon_threadsafe(writer.close)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the requests sent, and the connections opened and idle."""
+        return {
+            "requests": self.requests,
+            "opened": self.opened,
+            "idle": len(self._idle),
+        }
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Transports cannot move between loops; drop those of the old one.
+            self._idle = []
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None, limit=MAX_HEADER_BYTES
+            ),
+            self.timeout,
+        )
+        self.opened += 1
+        return reader, writer
+
+    @staticmethod
+    async def _exchange(reader, writer, request: bytes):
+        writer.write(request)
+        await writer.drain()
+        status_line, headers = parse_head(await read_head(reader))
+        version, status = status_line[:2]
+        keep_alive = is_keep_alive(version, headers)
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = await read_chunked(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body, keep_alive = await reader.read(), False
+        return int(status), body, keep_alive
+
+
+class Backends:
+    """The named backends of lookup handlers, each with one pool per process.
+
+    Pools are created on first use, so a forked worker opens its own
+    connections rather than sharing its parent's sockets.
+    """
+
+    def __init__(self) -> None:
+        self._options: Dict[str, Dict[str, Any]] = {}
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, url: str, **pool_options) -> None:
+        """Declares the backend name at url; replaces any previous pool."""
+        with self._lock:
+            self._options[name] = {"url": url, **pool_options}
+            pool = self._pools.pop(name, None)
+        if pool is not None:
+            pool.close()
+
+    def pool(self, name: str) -> ConnectionPool:
+        """Returns this process's pool for the backend name."""
+        pool = self._pools.get(name) if self._pid == os.getpid() else None
+        if pool is None:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pools, self._pid = {}, os.getpid()
+                pool = self._pools.get(name)
+                if pool is None:
+                    try:
+                        options = self._options[name]
+                    except KeyError as exc:
+                        raise LookupError(f"No backend configured: {name}") from exc
+                    pool = self._pools[name] = ConnectionPool(**options)
+        return pool
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the stats of every pool opened by this process."""
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    def close(self) -> None:
+        """Closes the idle connections of every pool."""
+        for pool in list(self._pools.values()):
+            pool.close()
+
+
+backends = Backends()
+if os.environ.get(BACKEND_URL_ENV):
+    backends.configure("default", os.environ[BACKEND_URL_ENV])
+
+
+class LookupCache(ResponseCache):
+    """A ResponseCache of parsed JSON results, sized by their encoding."""
+
+    @staticmethod
+    def sizeof(response) -> int:
+        return len(json.dumps(response))
+
+
+# Lookup results, keyed by (backend, path); shared by every lookup handler.
+lookup_cache = LookupCache(max_entries=4096, ttl=30.0)
+
+
+class Lookup:  # pylint: disable=too-few-public-methods
+    """One backend GET of a lookup handler.
+
+    path is a format string filled from the session parameters. The parsed
+    JSON result is cached for ttl seconds (the cache default if None, not at
+    all if 0). When optional, a failed lookup yields None instead of failing
+    the whole request.
+    """
+
+    def __init__(
+        self, path: str, backend="default", ttl: Optional[float] = None, optional=False
+    ) -> None:
+        self.path = path
+        self.backend = backend
+        self.ttl = ttl
+        self.optional = optional
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r}, backend={self.backend!r})"
+
+
+class LookupHandler:
+    """A handler fetching its lookups concurrently, then rendering a response.
+
+    render is called with the context and {name: result}; results may come
+    from the cache and are shared, so render must not modify them.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[WebhookContext, Dict[str, Any]], Any],
+        lookups: Mapping[str, Any],
+        cache: Optional[ResponseCache] = None,
+        pools: Optional[Backends] = None,
+    ) -> None:
+        self.render = render
+        self.lookups = {
+            name: lookup if isinstance(lookup, Lookup) else Lookup(lookup)
+            for name, lookup in lookups.items()
+        }
+        self.cache = lookup_cache if cache is None else cache
+        self.backends = backends if pools is None else pools
+        self.__name__ = getattr(render, "__name__", type(self).__name__)
+        self.__doc__ = render.__doc__
+
+    async def __call__(self, context: WebhookContext):
+        results = await self.fetch(context)
+        return self.render(context, results)
+
+    async def fetch(self, context: WebhookContext) -> Dict[str, Any]:
+        """Runs every lookup concurrently; returns {name: result}."""
+        parameters = context.session_parameters
+        names = list(self.lookups)
+        results = await asyncio.gather(
+            *(self._fetch(self.lookups[name], parameters, context) for name in names)
+        )
+        return dict(zip(names, results))
+
+    async def _fetch(self, lookup: Lookup, parameters, context: WebhookContext):
+        try:
+            path = lookup.path.format_map(
+                {
+                    name: urllib.parse.quote(str(value), safe="")
+                    for name, value in parameters.items()
+                }
+            )
+            pool = self.backends.pool(lookup.backend)
+            remaining = context.remaining()
+
+            def compute() -> Awaitable:
+                return pool.get_json(path, remaining)
+
+            if lookup.ttl == 0:
+                return await compute()
+            return await self.cache.aget_or_compute(
+                (lookup.backend, path), compute, lookup.ttl
+            )
+        except asyncio.TimeoutError as exc:
+            if context.remaining() <= 0:
+                raise DeadlineExceeded(f"Lookup timed out: {lookup!r}") from exc
+            if lookup.optional:
+                return None
+            raise
+        except (LookupError, BackendError, OSError, ValueError):
+            if lookup.optional:
+                return None
+            raise
@@ -14,134 +14,587 @@
 
 """main.py creates a sample webhook handler for Dialogflow CX"""
 
+import collections.abc
+import functools
+import importlib
 import json
+import os
+import re
+import threading
+import time
+import types
+from typing import Any, Awaitable, Callable, Dict, Mapping, NamedTuple, Optional, Tuple
 
-
-def basic_webhook(request):
-    """Handles a Dialogflow CX webhook request."""
-    request_dict = request.get_json()
-    tag = request_dict["fulfillmentInfo"]["tag"]
-    user_query = request_dict["text"]
-    return json.dumps(
-        {
-            "fulfillment_response": {
-                "messages": [
-                    {
-                        "text": {
-                            "text": [f"Webhook received: {user_query} (Tag: {tag})"],
-                            "allow_playback_interruption": False,
-                        }
-                    }
-                ]
-            }
-        }
+try:
+    from . import forms
+    from .batch import BATCH_CHUNK_SIZE, iter_batch_responses
+    from .context import (
+        DeadlineExceeded,
+        WebhookContext,
+        cached_property,
+        encode_response,
+        get_field,
     )
+    from .lazy_handler import LazyHandler
+    from .metrics import LATENCY_BUCKETS, WebhookMetrics
+    from .response_cache import ResponseCache
+except ImportError:  # Deployed by Cloud Functions as the top-level module main.
+    import forms  # type: ignore
+    from batch import BATCH_CHUNK_SIZE, iter_batch_responses  # type: ignore
+    from context import (  # type: ignore
+        DeadlineExceeded,
+        WebhookContext,
+        cached_property,
+        encode_response,
+        get_field,
+    )
+    from lazy_handler import LazyHandler  # type: ignore
+    from metrics import LATENCY_BUCKETS, WebhookMetrics  # type: ignore
+    from response_cache import ResponseCache  # type: ignore
 
 
-def echo_webhook(request):
-    """Echos the request that was received."""
-    request_dict = request.get_json()
-    request_json = json.dumps(request_dict)
-    return json.dumps(
-        {
-            "fulfillment_response": {
-                "messages": [
-                    {
-                        "text": {
-                            "text": [request_json],
-                        }
-                    }
-                ]
-            }
+class HandlerSpec(NamedTuple):
+    """A registered webhook handler, and the metadata attached to its tags.
+
+    A NamedTuple rather than a dataclass: importing dataclasses (and inspect)
+    adds about a third to the cold-start import time.
+    """
+
+    handler: Callable
+    tags: Tuple[str, ...]
+    timeout: Optional[float] = None
+    cacheable: bool = False
+    metadata: Mapping[str, Any] = types.MappingProxyType({})
+    degraded: Optional[bytes] = None
+
+
+UNREGISTERED_TAG = "_unregistered"
+_NEW_METRICS = object()
+
+
+def unrecognized_tag(context: WebhookContext):
+    """Default fallback handler; rejects tags without a registered handler."""
+    raise RuntimeError(f"Unrecognized tag: {context.tag}")
+
+
+class _EventLoopThread:  # pylint: disable=too-few-public-methods
+    """A process-wide event loop on a daemon thread, for sync dispatch.
+
+    Reusing one loop, rather than a new one per request, keeps the connection
+    pools of lookup handlers open between requests. A forked child, which does
+    not inherit the thread, starts its own loop on first use.
+    """
+
+    def __init__(self) -> None:
+        self._loop = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def run(self, coroutine):
+        """Runs coroutine on the loop and blocks until it completes."""
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._loop = asyncio.new_event_loop()
+                    threading.Thread(
+                        target=self._loop.run_forever,
+                        name="webhook-event-loop",
+                        daemon=True,
+                    ).start()
+                    self._pid = os.getpid()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+
+_EVENT_LOOP = _EventLoopThread()
+
+
+class HandlerRegistry:
+    """Maps fulfillment tags to webhook handlers, dispatching with one lookup.
+
+    With a ResponseCache, responses of handlers registered as cacheable are
+    reused for identical requests, such as Dialogflow's retries.
+
+    Each request gets a deadline from its tag's timeout, or default_timeout.
+    Coroutine handlers are cancelled at the deadline; sync handlers check
+    context.remaining(). A handler that raises DeadlineExceeded, or returns
+    context.degraded_response, is answered with the degraded response
+    registered for its tag, and counted as degraded in the metrics.
+
+    metrics defaults to a new WebhookMetrics; None disables them.
+    """
+
+    def __init__(
+        self,
+        fallback: Callable = unrecognized_tag,
+        metrics: Optional[WebhookMetrics] = _NEW_METRICS,  # type: ignore
+        cache: Optional[ResponseCache] = None,
+        default_timeout: Optional[float] = None,
+    ) -> None:
+        self._handlers: Dict[str, HandlerSpec] = {}
+        self._fallback = HandlerSpec(handler=fallback, tags=())
+        self.metrics = WebhookMetrics() if metrics is _NEW_METRICS else metrics
+        self.cache = cache
+        self.default_timeout = default_timeout
+
+    # pylint: disable=too-many-arguments
+    def register(
+        self, *tags, timeout=None, cacheable=False, degraded=None, **metadata
+    ) -> Callable[[Callable], Callable]:
+        """Decorator registering a handler under one or more tags.
+
+        Tags default to the name of the decorated function. Registering a tag
+        a second time replaces the previous handler. degraded is the response,
+        as bytes or a payload, served when the handler runs out of time.
+        """
+        if degraded is not None and not isinstance(degraded, bytes):
+            degraded = WebhookResponseView.register(encode_response(degraded), degraded)
+
+        def decorator(handler):
+            spec = HandlerSpec(
+                handler=handler,
+                tags=tags or (handler.__name__,),
+                timeout=timeout,
+                cacheable=cacheable,
+                metadata=metadata,
+                degraded=degraded,
+            )
+            for tag in spec.tags:
+                self._handlers[tag] = spec
+            return handler
+
+        return decorator
+
+    def register_lazy(
+        self, target: str, *tags, timeout=None, cacheable=False, **metadata
+    ) -> LazyHandler:
+        """Registers the "module:attribute" handler, imported on first dispatch.
+
+        Tags default to the attribute name, so the handler's dependencies are
+        not imported during a cold start unless one of its tags is requested.
+        """
+        handler = LazyHandler(target)
+        tags = tags or (target.rpartition(":")[2],)
+        self.register(*tags, timeout=timeout, cacheable=cacheable, **metadata)(handler)
+        return handler
+
+    # pylint: disable=too-many-arguments
+    def register_lookup(
+        self,
+        *tags,
+        lookups: Mapping[str, Any],
+        timeout=None,
+        cacheable=False,
+        degraded=None,
+        **metadata,
+    ) -> Callable[[Callable], Callable]:
+        """Decorator registering render(context, results) as a lookup handler.
+
+        lookups maps result names to lookup.Lookup backend requests, or to
+        their path templates; they are fetched concurrently through the
+        per-process connection pools and TTL cache of webhook/lookup.py.
+        """
+        # Imported on use: lookup imports asyncio, which slows cold starts.
+        lookup = importlib.import_module(
+            ".lookup" if __package__ else "lookup", __package__
+        )
+
+        def decorator(render):
+            handler = lookup.LookupHandler(render, lookups)
+            self.register(
+                *(tags or (render.__name__,)),
+                timeout=timeout,
+                cacheable=cacheable,
+                degraded=degraded,
+                **metadata,
+            )(handler)
+            return handler
+
+        return decorator
+
+    def set_fallback(self, handler: Callable) -> Callable:
+        """Sets the handler for unregistered tags; usable as a decorator."""
+        self._fallback = HandlerSpec(handler=handler, tags=())
+        return handler
+
+    def preload(self) -> None:
+        """Imports every lazily registered handler, e.g. on a warm-up request."""
+        for spec in self._handlers.values():
+            if isinstance(spec.handler, LazyHandler):
+                spec.handler.load()
+
+    def unregister(self, tag: str) -> None:
+        """Removes the handler registered under tag, if any."""
+        self._handlers.pop(tag, None)
+
+    def get(self, tag: str) -> HandlerSpec:
+        """Returns the handler spec for tag, or the fallback spec."""
+        return self._handlers.get(tag, self._fallback)
+
+    def dispatch(self, tag: str, context: WebhookContext):
+        """Calls the handler registered for tag with the request context.
+
+        Coroutine handlers are run to completion on a shared background event
+        loop; use dispatch_async when already running inside one.
+        """
+        spec = self._handlers.get(tag)
+        if spec is None:
+            spec, tag = self._fallback, UNREGISTERED_TAG
+        start = time.perf_counter()
+        self._prepare(spec, context)
+        try:
+            if spec.cacheable and self.cache is not None:
+                response = self.cache.get_or_compute(
+                    self.cache.key(tag, context), lambda: self._call(spec, context)
+                )
+            else:
+                response = self._call(spec, context)
+        except DeadlineExceeded as exc:
+            return self._degrade(spec, tag, start, exc)
+        except Exception as exc:
+            self._record(tag, start, exc)
+            raise
+        self._record(tag, start)
+        return response
+
+    async def dispatch_async(self, tag: str, context: WebhookContext):
+        """Awaits the handler registered for tag; sync handlers run inline."""
+        spec = self._handlers.get(tag)
+        if spec is None:
+            spec, tag = self._fallback, UNREGISTERED_TAG
+        start = time.perf_counter()
+        self._prepare(spec, context)
+        try:
+            if spec.cacheable and self.cache is not None:
+                response = await self.cache.aget_or_compute(
+                    self.cache.key(tag, context), lambda: self._acall(spec, context)
+                )
+            else:
+                response = await self._acall(spec, context)
+        except DeadlineExceeded as exc:
+            return self._degrade(spec, tag, start, exc)
+        except Exception as exc:
+            self._record(tag, start, exc)
+            raise
+        self._record(tag, start)
+        return response
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """Returns the handler metrics, with the cache counters if caching."""
+        if self.metrics is not None:
+            snapshot = self.metrics.snapshot()
+        else:
+            snapshot = {"buckets": list(LATENCY_BUCKETS), "tags": {}}
+        if self.cache is not None:
+            snapshot["cache"] = self.cache.stats()
+        return snapshot
+
+    def _prepare(self, spec: HandlerSpec, context: WebhookContext) -> None:
+        if context.deadline is None:
+            timeout = spec.timeout if spec.timeout is not None else self.default_timeout
+            if timeout is not None:
+                context.deadline = time.monotonic() + timeout
+        context.degraded_response = spec.degraded
+
+    def _degrade(self, spec: HandlerSpec, tag: str, start: float, exc):
+        if spec.degraded is None:
+            self._record(tag, start, exc)
+            raise exc
+        self._record(tag, start, degraded=True)
+        return spec.degraded
+
+    @classmethod
+    def _call(cls, spec: HandlerSpec, context: WebhookContext):
+        response = spec.handler(context)
+        if isinstance(response, collections.abc.Awaitable):
+            response = _EVENT_LOOP.run(cls._await(response, context))
+        return cls._check_degraded(spec, context, response)
+
+    @classmethod
+    async def _acall(cls, spec: HandlerSpec, context: WebhookContext):
+        response = spec.handler(context)
+        if isinstance(response, collections.abc.Awaitable):
+            response = await cls._await(response, context)
+        return cls._check_degraded(spec, context, response)
+
+    @staticmethod
+    async def _await(response: Awaitable, context: WebhookContext):
+        if context.deadline is None:
+            return await response
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        try:
+            return await asyncio.wait_for(response, max(context.remaining(), 0))
+        except asyncio.TimeoutError as exc:
+            raise DeadlineExceeded(f"Deadline exceeded for tag: {context.tag}") from exc
+
+    @staticmethod
+    def _check_degraded(spec: HandlerSpec, context: WebhookContext, response):
+        # Raised, rather than returned, so that the cache does not store it.
+        if response is spec.degraded and response is not None:
+            raise DeadlineExceeded(f"Degraded response for tag: {context.tag}")
+        return response
+
+    def _record(
+        self, tag: str, start: float, error: BaseException = None, degraded=False
+    ) -> None:
+        if self.metrics is not None:
+            self.metrics.record(tag, time.perf_counter() - start, error, degraded)
+
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        """Accesses the registered tags, in registration order."""
+        return tuple(self._handlers)
+
+    def __contains__(self, tag) -> bool:
+        return tag in self._handlers
+
+
+# Dialogflow CX waits 5 seconds for a webhook by default; leave a margin for
+# the network, so degraded responses arrive before Dialogflow gives up.
+DEFAULT_TIMEOUT = 4.5
+registry = HandlerRegistry(default_timeout=DEFAULT_TIMEOUT)
+
+
+def text_response(*texts, **text_fields) -> Dict[str, Any]:
+    """Builds a webhook response payload with a single text message."""
+    return {
+        "fulfillment_response": {
+            "messages": [{"text": {"text": list(texts), **text_fields}}]
         }
-    )
+    }
+
+
+def slot(name: str) -> str:
+    """Marks a variable value (or object key) in a ResponseTemplate payload."""
+    return f"\x00{name}\x00"
+
+
+class ResponseTemplate:
+    """A webhook response pre-encoded to bytes once, around variable slots.
+
+    Rendering splices the JSON encoding of each slot value between constant
+    fragments, instead of serializing the whole response again. Values of
+    slots used as object keys are coerced to str as json.dumps would.
+    """
+
+    _SLOT_PATTERN = re.compile(rb'"\\u0000(\w+)\\u0000"')
+
+    def __init__(self, payload: Mapping) -> None:
+        parts = self._SLOT_PATTERN.split(encode_response(payload))
+        self._fragments = tuple(parts[0::2])
+        self._slots = tuple(part.decode() for part in parts[1::2])
+        # A slot followed by a colon is an object key.
+        self._keys = tuple(fragment.startswith(b":") for fragment in parts[2::2])
+
+    @property
+    def slots(self) -> Tuple[str, ...]:
+        """Accesses the slot names, in the order they appear in the response."""
+        return self._slots
+
+    def render(self, **values) -> bytes:
+        """Encodes the response with each slot replaced by its value."""
+        fragments = self._fragments
+        parts = [fragments[0]]
+        for name, is_key, fragment in zip(self._slots, self._keys, fragments[1:]):
+            value = values[name]
+            if is_key and not isinstance(value, str):
+                value = _json_key(value)
+            parts.append(json.dumps(value).encode())
+            parts.append(fragment)
+        return b"".join(parts)
+
+
+def _json_key(value) -> str:
+    """Coerces an object key as json.dumps does; raises TypeError if it cannot."""
+    return next(iter(json.loads(json.dumps({value: None}))))
+
+
+class WebhookResponseView:
+    """A webhook response, parsed once and read through cached accessors.
+
+    Responses registered as pre-encoded constants are never parsed: their
+    bytes map straight to the payload they were encoded from. Accessors read
+    both the snake_case fields the handlers write and lowerCamelCase.
+    """
 
+    _preencoded: Dict[bytes, Mapping[str, Any]] = {}
+    _max_preencoded_bytes = 0
 
-def validate_form(request):
-    """Validates that an age parameter from a form is sensible."""
-    request_dict = request.get_json()
-    parameter_info_list = request_dict["pageInfo"]["formInfo"]["parameterInfo"]
-
-    parameter_dict = {}
-    for parameter_info in parameter_info_list:
-        key = parameter_info["displayName"]
-        parameter_dict[key] = parameter_info["value"]
-
-    if parameter_dict["age"] < 0:
-        return json.dumps(
-            {
-                "fulfillment_response": {
-                    "messages": [
-                        {
-                            "text": {
-                                "text": [
-                                    (
-                                        f'Age {parameter_dict["age"]} not valid '
-                                        "(must be positive)"
-                                    )
-                                ],
-                            }
-                        }
-                    ]
-                }
-            }
+    def __init__(self, response) -> None:
+        self._response = response
+
+    @classmethod
+    def register(cls, encoded: bytes, payload: Optional[Mapping] = None) -> bytes:
+        """Declares a constant response, so that views of it skip parsing."""
+        cls._preencoded[encoded] = json.loads(encoded) if payload is None else payload
+        cls._max_preencoded_bytes = max(cls._max_preencoded_bytes, len(encoded))
+        return encoded
+
+    @classmethod
+    def is_registered(cls, encoded) -> bool:
+        """Returns whether encoded was registered as a constant response."""
+        return len(encoded) <= cls._max_preencoded_bytes and encoded in cls._preencoded
+
+    @cached_property
+    def body(self) -> Mapping[str, Any]:
+        """Accesses the response payload."""
+        response = self._response
+        if isinstance(response, Mapping):
+            return response
+        if isinstance(response, bytes) and self.is_registered(response):
+            return self._preencoded[response]
+        return json.loads(response)
+
+    @cached_property
+    def messages(self) -> Tuple[Mapping[str, Any], ...]:
+        """Accesses the fulfillment response messages."""
+        fulfillment = get_field(
+            self.body, "fulfillment_response", "fulfillmentResponse", {}
         )
-    return json.dumps(
-        {
-            "fulfillment_response": {
-                "messages": [
-                    {
-                        "text": {
-                            "text": ["Valid age"],
-                        }
-                    }
-                ]
-            }
+        return tuple(fulfillment.get("messages", ()))
+
+    @cached_property
+    def texts(self) -> Tuple[str, ...]:
+        """Accesses the texts of every text message, in order."""
+        return tuple(
+            text
+            for message in self.messages
+            if "text" in message
+            for text in message["text"].get("text", ())
+        )
+
+    def text(self, message_index=0) -> str:
+        """Returns the first text of the message at message_index."""
+        return self.messages[message_index]["text"]["text"][0]
+
+    @cached_property
+    def session_parameters(self) -> Mapping[str, Any]:
+        """Accesses the session parameters set by the response."""
+        session_info = get_field(self.body, "session_info", "sessionInfo", {})
+        return session_info.get("parameters", {})
+
+    @cached_property
+    def parameter_states(self) -> Dict[str, str]:
+        """Accesses the form parameter states set by the response, by name."""
+        page_info = get_field(self.body, "page_info", "pageInfo", {})
+        form_info = get_field(page_info, "form_info", "formInfo", {})
+        return {
+            get_field(info, "display_name", "displayName"): info.get("state")
+            for info in get_field(form_info, "parameter_info", "parameterInfo", ())
         }
+
+    @property
+    def target_page(self) -> Optional[str]:
+        """Accesses the page the response transitions to, if any."""
+        return get_field(self.body, "target_page", "targetPage")
+
+    @property
+    def target_flow(self) -> Optional[str]:
+        """Accesses the flow the response transitions to, if any."""
+        return get_field(self.body, "target_flow", "targetFlow")
+
+
+BASIC_WEBHOOK_TEMPLATE = ResponseTemplate(
+    text_response(slot("text"), allow_playback_interruption=False)
+)
+TEXT_RESPONSE_TEMPLATE = ResponseTemplate(text_response(slot("text")))
+FORMS = forms.FormRegistry(
+    default=forms.Form(
+        {
+            "age": forms.Range(
+                minimum=0, message="Age {value} not valid (must be positive)"
+            )
+        },
+        valid_message="Valid age",
+    )
+)
+VALID_AGE_RESPONSE = WebhookResponseView.register(FORMS.default.valid_response)
+SET_SESSION_PARAM_TEMPLATE = ResponseTemplate(
+    {
+        **text_response("Session parameter set"),
+        "session_info": {
+            "parameters": {slot("key"): slot("val"), "key": None, "val": None}
+        },
+    }
+)
+
+
+@registry.register()
+def basic_webhook(context: WebhookContext):
+    """Handles a Dialogflow CX webhook request."""
+    tag = context.tag
+    user_query = context.text
+    return BASIC_WEBHOOK_TEMPLATE.render(
+        text=f"Webhook received: {user_query} (Tag: {tag})"
     )
 
 
-def set_session_param(request):
+@registry.register()
+def echo_webhook(context: WebhookContext):
+    """Echos the request that was received.
+
+    The raw request bytes are escaped once into the response, rather than
+    round-tripping the parsed body through json.dumps.
+    """
+    return TEXT_RESPONSE_TEMPLATE.render(text=context.raw.decode())
+
+
+@registry.register()
+def validate_form(context: WebhookContext):
+    """Validates the form parameters against the rules declared for the page."""
+    page_info = context.page_info
+    form = FORMS.get(page_info.get("displayName"))
+    return form.response(
+        form.validate(page_info.get("formInfo", {}).get("parameterInfo", ()))
+    )
+
+
+@registry.register()
+def set_session_param(context: WebhookContext):
     """Sets a session param detected in the intent."""
-    request_dict = request.get_json()
-    parameters = request_dict["sessionInfo"]["parameters"]
-    key = parameters["key"]
-    val = parameters["val"]
-    return json.dumps(
-        {
-            "fulfillment_response": {
-                "messages": [
-                    {
-                        "text": {
-                            "text": ["Session parameter set"],
-                        }
-                    }
-                ]
-            },
-            "session_info": {
-                "parameters": {
-                    key: val,
-                    "key": None,
-                    "val": None,
-                }
-            },
-        }
+    parameters = context.session_parameters
+    return SET_SESSION_PARAM_TEMPLATE.render(
+        key=parameters["key"], val=parameters["val"]
     )
 
 
 def webhook_fcn(request):
     """Delegates a request to an appropriate function, based on tag."""
-    request_dict = request.get_json()
-    tag = request_dict["fulfillmentInfo"]["tag"]
-    if tag == "echo_webhook":
-        return echo_webhook(request)
-    if tag == "basic_webhook":
-        return basic_webhook(request)
-    if tag == "validate_form":
-        return validate_form(request)
-    if tag == "set_session_param":
-        return set_session_param(request)
-    raise RuntimeError(f"Unrecognized tag: {tag}")
+    context = WebhookContext.from_request(request)
+    return registry.dispatch(context.tag, context)
+
+
+RECORD_DIR_ENV = "WEBHOOK_RECORD_DIR"
+if os.environ.get(RECORD_DIR_ENV):
+    # Opt-in: Cloud Functions can only write under /tmp, so set e.g. /tmp/traffic.
+    try:
+        from . import recorder
+    except ImportError:
+        import recorder  # type: ignore
+
+    traffic_recorder = recorder.TrafficRecorder(os.environ[RECORD_DIR_ENV])
+    webhook_fcn = traffic_recorder.wrap(webhook_fcn)
+
+
+def batch_webhook_fcn(request):
+    """Dispatches a JSON array or NDJSON body of requests, streaming NDJSON.
+
+    Each output line is ``{"index": i, "response": ...}`` or
+    ``{"index": i, "error": ...}``, in the order the requests were given.
+    """
+    chunks = iter(functools.partial(request.stream.read, BATCH_CHUNK_SIZE), b"")
+    return (
+        iter_batch_responses(chunks, registry),
+        200,
+        {"Content-Type": "application/x-ndjson"},
+    )
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Returns the per-tag request, error and latency counters of this process."""
+    return registry.metrics_snapshot()
 
 
 def get_webhook_entrypoint() -> str:
@@ -169,14 +622,34 @@ def build_request_dict_basic(tag, text):
     return request_mapping
 
 
+def build_request_dict_form(tag, parameters, text=None):
+    """Builds a Dialogflow request dictionary carrying form parameterInfo."""
+    request_mapping = build_request_dict_basic(tag, text)
+    request_mapping["pageInfo"] = {
+        "formInfo": {
+            "parameterInfo": [
+                {"displayName": name, "value": value, "state": "VALID"}
+                for name, value in parameters.items()
+            ]
+        }
+    }
+    return request_mapping
+
+
+def build_request_dict_session(tag, parameters, text=None, session=None):
+    """Builds a Dialogflow request dictionary carrying session parameters."""
+    request_mapping = build_request_dict_basic(tag, text)
+    request_mapping["sessionInfo"] = {"parameters": dict(parameters)}
+    if session is not None:
+        request_mapping["sessionInfo"]["session"] = session
+    return request_mapping
+
+
 def extract_text(response_json: str, message_index=0):
     """Extracts the text response from the json response of a Dialogflow webhook."""
-    response = json.loads(response_json)
-    messages = response["fulfillment_response"]["messages"]
-    return messages[message_index]["text"]["text"][0]
+    return WebhookResponseView(response_json).text(message_index)
 
 
 def extract_session_parameters(response_json: str):
     """Extracts session parameters from the json response of a Dialogflow webhook."""
-    response = json.loads(response_json)
-    return response["session_info"]["parameters"]
+    return WebhookResponseView(response_json).session_parameters
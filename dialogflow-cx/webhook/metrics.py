@@ -0,0 +1,171 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-tag request, error and latency metrics of webhook handlers."""
+
+import bisect
+import threading
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+try:
+    from .response_cache import CACHE_COUNTERS
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from response_cache import CACHE_COUNTERS  # type: ignore
+
+
+# Upper bounds, in seconds, of the latency histogram buckets: 10us to ~10s.
+LATENCY_BUCKETS = tuple(1e-5 * 2**i for i in range(21))
+
+
+class _TagMetrics:  # pylint: disable=too-few-public-methods
+    """Counters and latency histogram for one tag."""
+
+    __slots__ = ("requests", "errors", "degraded", "counts", "latency_sum")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.requests = 0
+        self.errors: Dict[str, int] = {}
+        self.degraded = 0
+        self.counts = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+
+
+class WebhookMetrics:
+    """Per-tag request, error and latency counters for webhook handlers.
+
+    Errors are counted by exception type, and latencies fall into fixed
+    log-scale histogram buckets, so recording a request is a bisect and a few
+    increments.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self._tags: Dict[str, _TagMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, tag: str, latency: float, error: BaseException = None, degraded=False
+    ) -> None:
+        """Records one handled request, its exception if it failed, and whether
+        its degraded response was served."""
+        index = bisect.bisect_left(self.buckets, latency)
+        with self._lock:
+            stats = self._tags.get(tag)
+            if stats is None:
+                stats = self._tags[tag] = _TagMetrics(len(self.buckets))
+            stats.requests += 1
+            stats.counts[index] += 1
+            stats.latency_sum += latency
+            if degraded:
+                stats.degraded += 1
+            if error is not None:
+                name = type(error).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable copy of the current counters."""
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "tags": {
+                    tag: {
+                        "requests": stats.requests,
+                        "errors": dict(stats.errors),
+                        "degraded": stats.degraded,
+                        "counts": list(stats.counts),
+                        "latency_sum": stats.latency_sum,
+                    }
+                    for tag, stats in self._tags.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Clears all counters."""
+        with self._lock:
+            self._tags.clear()
+
+
+def merge_metrics(snapshots: Iterable[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Sums WebhookMetrics snapshots, e.g. from several worker processes."""
+    merged: Dict[str, Any] = {"buckets": list(LATENCY_BUCKETS), "tags": {}}
+    for snapshot in snapshots:
+        merged["buckets"] = snapshot["buckets"]
+        for tag, stats in snapshot["tags"].items():
+            total = merged["tags"].setdefault(
+                tag,
+                {
+                    "requests": 0,
+                    "errors": {},
+                    "degraded": 0,
+                    "counts": [0] * len(stats["counts"]),
+                    "latency_sum": 0.0,
+                },
+            )
+            total["requests"] += stats["requests"]
+            total["degraded"] += stats.get("degraded", 0)
+            total["latency_sum"] += stats["latency_sum"]
+            total["counts"] = [a + b for a, b in zip(total["counts"], stats["counts"])]
+            for name, count in stats["errors"].items():
+                total["errors"][name] = total["errors"].get(name, 0) + count
+        if "cache" in snapshot:
+            cache = merged.setdefault("cache", dict.fromkeys(CACHE_COUNTERS, 0))
+            for name in CACHE_COUNTERS:
+                cache[name] += snapshot["cache"][name]
+    return merged
+
+
+def _label(value) -> str:
+    """Escapes a label value for the Prometheus text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(snapshot: Mapping[str, Any]) -> str:
+    """Formats a metrics snapshot in the Prometheus text exposition format.
+
+    Each metric family is one block of samples under its TYPE line.
+    """
+    tags = [(_label(tag), stats) for tag, stats in sorted(snapshot["tags"].items())]
+    lines = ["# TYPE webhook_requests_total counter"]
+    for tag, stats in tags:
+        lines.append(f'webhook_requests_total{{tag="{tag}"}} {stats["requests"]}')
+    lines.append("# TYPE webhook_errors_total counter")
+    for tag, stats in tags:
+        for name, count in sorted(stats["errors"].items()):
+            lines.append(
+                f'webhook_errors_total{{tag="{tag}",exception="{_label(name)}"}} {count}'
+            )
+    lines.append("# TYPE webhook_degraded_total counter")
+    for tag, stats in tags:
+        lines.append(
+            f'webhook_degraded_total{{tag="{tag}"}} {stats.get("degraded", 0)}'
+        )
+    lines.append("# TYPE webhook_latency_seconds histogram")
+    bounds = [repr(bound) for bound in snapshot["buckets"]] + ["+Inf"]
+    for tag, stats in tags:
+        cumulative = 0
+        for bound, count in zip(bounds, stats["counts"]):
+            cumulative += count
+            lines.append(
+                f'webhook_latency_seconds_bucket{{tag="{tag}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            f'webhook_latency_seconds_sum{{tag="{tag}"}} {stats["latency_sum"]}'
+        )
+        lines.append(
+            f'webhook_latency_seconds_count{{tag="{tag}"}} {stats["requests"]}'
+        )
+    for name, count in snapshot.get("cache", {}).items():
+        lines.append(f"# TYPE webhook_cache_{name}_total counter")
+        lines.append(f"webhook_cache_{name}_total {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,364 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-fork multi-process mode for the self-hosted webhook server.
+
+The master process imports the handlers, binds the listening socket and forks
+one WebhookServer per worker, so every core serves requests. Run from the
+dialogflow-cx directory:
+
+    python -m webhook.prefork --port 8080 --workers 4 --metrics-port 9090
+"""
+
+import asyncio
+import http.server
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .main import HandlerRegistry, registry
+from .metrics import merge_metrics, render_metrics
+from .recorder import close_recorders
+from .server import WebhookServer, serve
+
+# Per-worker slot layout in the shared counters array.
+_PID, _REQUESTS, _LATENCY_SUM, _LATENCY_MAX, _RESTARTS = range(5)
+_SLOT_SIZE = 5
+
+
+class _WorkerServer(WebhookServer):
+    """WebhookServer that records its counters in a shared slot, reports its
+    metrics to the master, and retires after max_requests requests."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, counters, slot, max_requests, reports, report_interval, **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self._counters = counters
+        self._offset = slot * _SLOT_SIZE
+        self._max_requests = max_requests
+        self._reports = reports
+        self._report_interval = report_interval
+        self._reporter: Optional[asyncio.Task] = None
+        self._served = 0
+
+    async def start(self, sock=None) -> None:
+        await super().start(sock=sock)
+        self._reporter = asyncio.ensure_future(self._report_periodically())
+
+    async def shutdown(self, timeout=10.0) -> None:
+        if self._reporter is not None:
+            self._reporter.cancel()
+        await super().shutdown(timeout=timeout)
+
+    def report(self) -> None:
+        """Sends this worker's metrics snapshot to the master.
+
+        Never blocks: the queue's feeder thread writes it to the pipe.
+        """
+        self._reports.put_nowait((os.getpid(), self.registry.metrics_snapshot()))
+
+    async def _report_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._report_interval)
+            self.report()
+
+    def request_done(self, path: str, latency: float) -> None:
+        counters, offset = self._counters, self._offset
+        counters[offset + _REQUESTS] += 1
+        counters[offset + _LATENCY_SUM] += latency
+        if latency > counters[offset + _LATENCY_MAX]:
+            counters[offset + _LATENCY_MAX] = latency
+        self._served += 1
+        if self._max_requests and self._served >= self._max_requests:
+            asyncio.ensure_future(self.shutdown())
+
+
+class PreforkServer:  # pylint: disable=too-many-instance-attributes
+    """Master process for a pool of forked webhook server workers.
+
+    Workers inherit the bound socket and the already-imported handlers. A
+    worker exits after max_requests requests (0 means never) and the master
+    forks a replacement into the same slot, so counters are cumulative. Workers
+    report their handler metrics every report_interval seconds and on exit;
+    the master serves the merged metrics on metrics_port, if given.
+
+    The master forks only while it runs no other thread: a child forked
+    meanwhile would inherit that thread's locks in whatever state they were
+    in. The metrics thread is started after the first workers are forked, and
+    paused while a replacement is.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        handler_registry: HandlerRegistry = registry,
+        *,
+        host="127.0.0.1",
+        port=8080,
+        workers=None,
+        max_requests=0,
+        backlog=1024,
+        metrics_port=None,
+        report_interval=1.0,
+        **server_options,
+    ) -> None:
+        self.registry = handler_registry
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_requests = max_requests
+        self.backlog = backlog
+        self.metrics_port = metrics_port
+        self.report_interval = report_interval
+        self.server_options = server_options
+        self._counters = multiprocessing.RawArray("d", self.workers * _SLOT_SIZE)
+        # A Queue, not a SimpleQueue: workers put without blocking their
+        # event loop. Only workers put, so the master starts no feeder thread.
+        self._reports: multiprocessing.Queue = multiprocessing.Queue()
+        self._snapshots: Dict[int, Dict[str, Any]] = {}
+        self._snapshots_lock = threading.Lock()
+        self._socket = None
+        self._children: Dict[int, int] = {}
+        self._stopping = False
+        self._metrics_server: Optional[http.server.HTTPServer] = None
+        self._metrics_thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        """Accesses the (host, port) the master is bound to."""
+        return self._socket.getsockname()[:2]
+
+    def bind(self) -> socket.socket:
+        """Binds and listens on host:port; idempotent."""
+        if self._socket is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.host, self.port))
+            sock.listen(self.backlog)
+            self._socket = sock
+        return self._socket
+
+    def run(self, poll_interval=0.1) -> None:
+        """Forks the workers and supervises them until SIGINT or SIGTERM."""
+        self.bind()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        self._start_metrics_server()
+        while self._children:
+            self._collect_reports()
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                time.sleep(poll_interval)
+                continue
+            slot = self._children.pop(pid, None)
+            if slot is not None and not self._stopping:
+                self._counters[slot * _SLOT_SIZE + _RESTARTS] += 1
+                self._pause_metrics_server()
+                self._spawn(slot)
+                self._start_metrics_server()
+        self._collect_reports()
+        self._pause_metrics_server()
+        if self._metrics_server is not None:
+            self._metrics_server.server_close()
+        self._socket.close()
+
+    def stop(self) -> None:
+        """Asks every worker to finish in-flight requests and exit."""
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stats(self) -> Dict:
+        """Aggregates the request and latency counters of every worker slot."""
+        workers: List[Dict] = []
+        for slot in range(self.workers):
+            offset = slot * _SLOT_SIZE
+            values = self._counters[offset : offset + _SLOT_SIZE]
+            requests = int(values[_REQUESTS])
+            workers.append(
+                {
+                    "slot": slot,
+                    "pid": int(values[_PID]),
+                    "requests": requests,
+                    "mean_latency_ms": (
+                        values[_LATENCY_SUM] / requests * 1e3 if requests else 0.0
+                    ),
+                    "max_latency_ms": values[_LATENCY_MAX] * 1e3,
+                    "restarts": int(values[_RESTARTS]),
+                }
+            )
+        total_requests = sum(worker["requests"] for worker in workers)
+        latency_sum = sum(
+            self._counters[slot * _SLOT_SIZE + _LATENCY_SUM]
+            for slot in range(self.workers)
+        )
+        return {
+            "workers": workers,
+            "requests": total_requests,
+            "mean_latency_ms": (
+                latency_sum / total_requests * 1e3 if total_requests else 0.0
+            ),
+            "max_latency_ms": max(worker["max_latency_ms"] for worker in workers),
+            "restarts": sum(worker["restarts"] for worker in workers),
+        }
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """Merges the latest metrics reported by every worker, past and present."""
+        with self._snapshots_lock:
+            snapshots = list(self._snapshots.values())
+        return merge_metrics(snapshots)
+
+    def _collect_reports(self) -> None:
+        while True:
+            try:
+                pid, snapshot = self._reports.get_nowait()
+            except queue.Empty:
+                return
+            with self._snapshots_lock:
+                self._snapshots[pid] = snapshot
+
+    def _start_metrics_server(self) -> None:
+        if self.metrics_port is None:
+            return
+        if self._metrics_server is None:
+            self._metrics_server = self._build_metrics_server()
+        self._metrics_thread = threading.Thread(
+            target=self._metrics_server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="webhook-metrics",
+        )
+        self._metrics_thread.start()
+
+    def _pause_metrics_server(self) -> None:
+        if self._metrics_thread is not None:
+            self._metrics_server.shutdown()
+            self._metrics_thread.join()
+            self._metrics_thread = None
+
+    def _build_metrics_server(self) -> http.server.HTTPServer:
+        pool = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            """Serves the merged worker metrics at /metrics."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Handles GET /metrics."""
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_metrics(pool.metrics_snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):  # pylint: disable=arguments-differ
+                pass
+
+        # Not threading per request: no thread may outlive a pause.
+        return http.server.HTTPServer((self.host, self.metrics_port), MetricsHandler)
+
+    def _handle_stop(self, signum, frame):  # pylint: disable=unused-argument
+        self.stop()
+
+    def _spawn(self, slot: int) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = slot
+            self._counters[slot * _SLOT_SIZE + _PID] = pid
+            return
+        exit_code = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self._metrics_server is not None:
+                self._metrics_server.server_close()
+            if self.registry.metrics is not None:
+                self.registry.metrics.reset()
+            if self.registry.cache is not None:
+                self.registry.cache.reset()
+            server = _WorkerServer(
+                self._counters,
+                slot,
+                self.max_requests,
+                self._reports,
+                self.report_interval,
+                handler_registry=self.registry,
+                **self.server_options,
+            )
+            asyncio.run(serve(server, sock=self._socket))
+            server.report()
+            # os._exit skips the flush of reports still in the feeder thread.
+            self._reports.close()
+            self._reports.join_thread()
+            exit_code = 0
+        finally:
+            # os._exit also skips atexit, which would close traffic recorders.
+            close_recorders()
+            sys.stdout.flush()
+            os._exit(exit_code)  # pylint: disable=protected-access
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description="Serve the Dialogflow CX webhook from pre-forked workers"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Defaults to the CPU count"
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=0,
+        help="Restart a worker after this many requests (0: never)",
+    )
+    parser.add_argument("--max-concurrency", type=int, default=100)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve merged worker metrics at /metrics on this port",
+    )
+    args = parser.parse_args()
+
+    master = PreforkServer(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_concurrency=args.max_concurrency,
+        metrics_port=args.metrics_port,
+    )
+    master.run()
+    print(json.dumps(master.stats(), indent=2))
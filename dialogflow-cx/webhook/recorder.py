@@ -0,0 +1,211 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in recorder of webhook traffic, for replay with webhook_replay.py.
+
+Records are appended to rotating gzip-compressed NDJSON files by a background
+thread, started by the first record so that a pre-fork master can create a
+recorder at import without forking a live thread. The request path only
+enqueues the raw request and response; when the queue is full, records are
+dropped and counted rather than blocking. Recorders are closed at exit, and by
+pre-forked workers before they exit, so that every file ends with a complete
+gzip stream.
+"""
+
+import atexit
+import functools
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from typing import Callable, List, Optional
+
+_STOP = object()
+_RECORDERS: "weakref.WeakSet[TrafficRecorder]" = weakref.WeakSet()
+
+
+def close_recorders() -> None:
+    """Writes out and closes every open recorder, e.g. before os._exit."""
+    for recorder in list(_RECORDERS):
+        recorder.close()
+
+
+def _restart_recorders() -> None:
+    for recorder in list(_RECORDERS):
+        recorder._after_fork()  # pylint: disable=protected-access
+
+
+atexit.register(close_recorders)
+os.register_at_fork(after_in_child=_restart_recorders)
+
+
+class TrafficRecorder:  # pylint: disable=too-many-instance-attributes
+    """Writes {ts, request, response, latency_ms, error} records to files.
+
+    A file is rotated once max_file_bytes of uncompressed records have been
+    written to it, and only the newest max_files files of each process are
+    kept; max_files must be at least 1. A forked child starts its own writer
+    and files.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_file_bytes=64 * 1024 * 1024,
+        max_files=10,
+        queue_size=10000,
+        prefix="webhook",
+        flush_interval=1.0,
+    ) -> None:
+        if max_files < 1:
+            raise ValueError(f"max_files must be at least 1, not {max_files}")
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._sequence = 0
+        self._file: Optional[gzip.GzipFile] = None
+        self._file_bytes = 0
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        _RECORDERS.add(self)
+
+    def record(self, request: bytes, response, latency: float, error=None) -> None:
+        """Enqueues one exchange; never blocks, dropping it if the queue is full."""
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait((time.time(), request, response, latency, error))
+        except queue.Full:
+            self.dropped += 1
+
+    def wrap(self, webhook_fcn: Callable) -> Callable:
+        """Returns webhook_fcn, recording every request it handles."""
+
+        @functools.wraps(webhook_fcn)
+        def recorded_webhook_fcn(request):
+            start = time.perf_counter()
+            try:
+                response = webhook_fcn(request)
+            except Exception as exc:
+                self.record(
+                    request.get_data(),
+                    None,
+                    time.perf_counter() - start,
+                    f"{type(exc).__name__}: {exc}",
+                )
+                raise
+            self.record(request.get_data(), response, time.perf_counter() - start)
+            return response
+
+        return recorded_webhook_fcn
+
+    def files(self, pid: Optional[int] = None) -> List[str]:
+        """Lists this recorder's files, or only process pid's, oldest first."""
+        suffix = "" if pid is None else f"-{pid}"
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith(f"{self.prefix}-")
+            and name.endswith(".ndjson.gz")
+            and name[: -len(".ndjson.gz")].rsplit("-", 1)[0].endswith(suffix)
+        )
+
+    def close(self, timeout=10.0) -> None:
+        """Writes out the queued records and closes the current file."""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
+    def _start_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer is not None:
+                return
+            writer = threading.Thread(
+                target=self._write_records, name="webhook-recorder", daemon=True
+            )
+            writer.start()
+            self._writer = writer
+
+    def _after_fork(self) -> None:
+        # The inherited file and queued records are the parent's to write out;
+        # the child's writer starts on its first record.
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._sequence = 0
+        self._file = None
+        self._file_bytes = 0
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _write_records(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()
+                continue
+            if item is _STOP:
+                break
+            self._write(self._encode(*item))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _encode(timestamp, request, response, latency, error) -> bytes:
+        if isinstance(response, bytes):
+            response = response.decode("utf-8", "replace")
+        elif response is not None and not isinstance(response, str):
+            response = json.dumps(response)
+        record = {
+            "ts": timestamp,
+            "request": request.decode("utf-8", "replace"),
+            "response": response,
+            "latency_ms": latency * 1e3,
+            "error": error,
+        }
+        return json.dumps(record).encode() + b"\n"
+
+    def _write(self, line: bytes) -> None:
+        if self._file is None or self._file_bytes >= self.max_file_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._file_bytes += len(line)
+        self.recorded += 1
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        name = (
+            f"{self.prefix}-{time.strftime('%Y%m%dT%H%M%S')}"
+            f"-{os.getpid()}-{self._sequence:06d}.ndjson.gz"
+        )
+        self._file = gzip.open(os.path.join(self.directory, name), "wb")
+        self._file_bytes = 0
+        # Other processes, e.g. pre-forked workers, rotate their own files.
+        for path in self.files(pid=os.getpid())[: -self.max_files]:
+            os.remove(path)
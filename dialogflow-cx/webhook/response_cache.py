@@ -0,0 +1,216 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Idempotent response cache for webhook calls retried by Dialogflow."""
+
+import collections
+import json
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    from .context import WebhookContext
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from context import WebhookContext  # type: ignore
+
+
+# Request fields that determine a handler's response; see ResponseCache.key.
+CACHE_KEY_FIELDS = (
+    "fulfillmentInfo",
+    "text",
+    "triggerIntent",
+    "triggerEvent",
+    "transcript",
+    "languageCode",
+    "intentInfo",
+    "pageInfo",
+    "sessionInfo",
+    "payload",
+)
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "collapsed")
+_MISSING = object()
+
+
+class _Flight:  # pylint: disable=too-few-public-methods
+    """A computation in progress, awaited by duplicate requests."""
+
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:  # pylint: disable=too-many-instance-attributes
+    """LRU cache of handler responses, for webhook calls retried by Dialogflow.
+
+    Entries expire ttl seconds after they are stored, and the least recently
+    used entries are evicted beyond max_entries or max_bytes of responses.
+    Concurrent requests for a key being computed wait for that computation
+    instead of repeating it. Failed computations are not cached.
+    """
+
+    def __init__(
+        self,
+        max_entries=1024,
+        max_bytes=8 * 1024 * 1024,
+        ttl=30.0,
+        key_fields: Tuple[str, ...] = CACHE_KEY_FIELDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        # Imported here: hashlib loads OpenSSL, and the cache is optional.
+        import hashlib  # pylint: disable=import-outside-toplevel
+
+        self._sha256 = hashlib.sha256
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.key_fields = key_fields
+        self.clock = clock
+        self.counters = dict.fromkeys(CACHE_COUNTERS, 0)
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._bytes = 0
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+        self._async_flights: Dict[Tuple[str, str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        """Accesses the total size of the cached responses."""
+        return self._bytes
+
+    def key(self, tag: str, context: WebhookContext) -> Tuple[str, str, str]:
+        """Builds (session, tag, digest of the canonical JSON of key_fields)."""
+        body = context.body
+        canonical = json.dumps(
+            [body.get(field) for field in self.key_fields],
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        session = body.get("sessionInfo", {}).get("session", "")
+        return session, tag, self._sha256(canonical.encode()).hexdigest()
+
+    @staticmethod
+    def sizeof(response) -> int:
+        """Returns the size of a response: its length if bytes or str, else 0."""
+        return len(response) if isinstance(response, (bytes, str)) else 0
+
+    def get(self, key, default=None):
+        """Returns the live response cached under key, or default."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, _, response = entry
+                if expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return response
+                self._remove(key)
+                self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return default
+
+    def put(self, key, response, ttl: Optional[float] = None) -> None:
+        """Caches response under key for ttl seconds, by default self.ttl."""
+        size = self.sizeof(response)
+        if size > self.max_bytes:
+            return
+        expires = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, size, response)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def get_or_compute(self, key, compute: Callable[[], Any], ttl=None):
+        """Returns the cached response for key, or computes and caches it once."""
+        response = self.get(key, _MISSING)
+        if response is not _MISSING:
+            return response
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.counters["collapsed"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+        try:
+            flight.response = compute()
+            self.put(key, flight.response, ttl)
+            return flight.response
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def aget_or_compute(self, key, compute: Callable[[], Awaitable], ttl=None):
+        """Like get_or_compute, for a coroutine computation on the running loop."""
+        response = self.get(key, _MISSING)
+        if response is not _MISSING:
+            return response
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        future = self._async_flights.get(key)
+        if future is not None:
+            with self._lock:
+                self.counters["collapsed"] += 1
+            # Shielded: a cancelled duplicate must not cancel the computation.
+            return await asyncio.shield(future)
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await compute()
+            self.put(key, response, ttl)
+            future.set_result(response)
+            return response
+        except Exception as exc:
+            future.set_exception(exc)
+            # Marks the exception retrieved in case no duplicate is waiting.
+            future.exception()
+            raise
+        finally:
+            del self._async_flights[key]
+            if not future.done():
+                future.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit, miss, eviction, expiration and collapsed counters."""
+        with self._lock:
+            return dict(self.counters)
+
+    def reset(self) -> None:
+        """Drops every cached response and clears the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.counters = dict.fromkeys(CACHE_COUNTERS, 0)
+
+    def _remove(self, key) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,356 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Self-hosted asyncio HTTP server for the webhook handlers in main.py.
+
+Run from the dialogflow-cx directory:
+
+    python -m webhook.server --port 8080
+"""
+
+import asyncio
+import signal
+import socket
+import time
+from http import HTTPStatus
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+try:
+    from .batch import aiter_batch_responses
+    from .context import WebhookContext, encode_error
+    from .http_messages import (
+        MAX_HEADER_BYTES,
+        BadRequest,
+        is_keep_alive,
+        parse_head,
+        read_chunked,
+        read_head,
+    )
+    from .main import HandlerRegistry, registry
+    from .metrics import render_metrics
+except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+    from batch import aiter_batch_responses  # type: ignore
+    from context import WebhookContext, encode_error  # type: ignore
+    from http_messages import (  # type: ignore
+        MAX_HEADER_BYTES,
+        BadRequest,
+        is_keep_alive,
+        parse_head,
+        read_chunked,
+        read_head,
+    )
+    from main import HandlerRegistry, registry  # type: ignore
+    from metrics import render_metrics  # type: ignore
+
+Body = Union[bytes, AsyncIterator[bytes]]
+Route = Callable[[bytes], Awaitable[Tuple[int, Body, str]]]
+
+
+class WebhookServer:  # pylint: disable=too-many-instance-attributes
+    """HTTP/1.1 server dispatching webhook requests through a HandlerRegistry.
+
+    Connections are kept alive between requests. At most max_concurrency
+    requests are handled at once; handlers declared with ``async def`` yield
+    the event loop while they wait on I/O. POST /batch accepts a JSON array or
+    NDJSON of requests and streams back NDJSON responses; POST /proto takes and
+    returns protobuf (see proto_webhook.py); /metrics serves the registry's
+    counters in the Prometheus text format.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        handler_registry: HandlerRegistry = registry,
+        *,
+        host="127.0.0.1",
+        port=8080,
+        max_concurrency=100,
+        keep_alive_timeout=5.0,
+        max_body_bytes=10 * 1024 * 1024,
+    ) -> None:
+        self.registry = handler_registry
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_body_bytes = max_body_bytes
+        self.routes: Dict[str, Route] = {
+            "/batch": self.handle_batch,
+            "/metrics": self.handle_metrics,
+            "/proto": self.handle_proto,
+        }
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._connections: Dict[asyncio.Task, bool] = {}
+        self._closing = False
+        self._stopped: Optional[asyncio.Event] = None
+
+    @property
+    def sockets(self):
+        """Accesses the listening sockets, once started."""
+        return self._server.sockets if self._server else ()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Accesses the (host, port) the server is listening on."""
+        return self.sockets[0].getsockname()[:2]
+
+    async def start(self, sock: Optional[socket.socket] = None) -> None:
+        """Starts listening, on sock if given, otherwise on host:port."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._stopped = asyncio.Event()
+        if sock is not None:
+            self._server = await asyncio.start_server(
+                self._handle_connection, sock=sock, limit=MAX_HEADER_BYTES
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection,
+                host=self.host,
+                port=self.port,
+                limit=MAX_HEADER_BYTES,
+            )
+
+    async def serve_forever(self) -> None:
+        """Serves until shutdown() completes."""
+        await self._stopped.wait()
+
+    async def shutdown(self, timeout=10.0) -> None:
+        """Stops accepting, lets in-flight requests finish, then closes."""
+        if self._closing:
+            await self._stopped.wait()
+            return
+        self._closing = True
+        self._server.close()
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+        if self._connections:
+            _, pending = await asyncio.wait(list(self._connections), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._server.wait_closed()
+        self._stopped.set()
+
+    async def handle_webhook(self, body: bytes) -> Tuple[int, bytes, str]:
+        """Dispatches one serialized WebhookRequest; returns status and body."""
+        try:
+            context = WebhookContext(raw=body)
+            tag = context.tag
+        except (ValueError, KeyError, TypeError) as exc:
+            return HTTPStatus.BAD_REQUEST, encode_error(exc), "application/json"
+        try:
+            response = await self.registry.dispatch_async(tag, context)
+        except Exception as exc:  # pylint: disable=broad-except
+            return (
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                encode_error(exc),
+                "application/json",
+            )
+        if isinstance(response, str):
+            response = response.encode()
+        return HTTPStatus.OK, response, "application/json"
+
+    async def handle_batch(self, body: bytes) -> Tuple[int, Body, str]:
+        """Dispatches a batch of requests; responses stream as NDJSON lines."""
+        return (
+            HTTPStatus.OK,
+            aiter_batch_responses([body], self.registry),
+            "application/x-ndjson",
+        )
+
+    async def handle_proto(self, body: bytes) -> Tuple[int, Body, str]:
+        """Dispatches a serialized WebhookRequest; returns a WebhookResponse."""
+        # Imported on use: the protobuf types take a second to import.
+        # pylint: disable=import-outside-toplevel
+        from google.protobuf.message import DecodeError
+
+        try:
+            from . import proto_webhook
+        except ImportError:  # Deployed by Cloud Functions next to the top-level main.
+            import proto_webhook  # type: ignore
+
+        try:
+            context = proto_webhook.ProtoWebhookContext(body)
+        except DecodeError as exc:
+            return HTTPStatus.BAD_REQUEST, encode_error(exc), "application/json"
+        try:
+            response = await self.registry.dispatch_async(context.tag, context)
+            payload = proto_webhook.encode_proto_response(response)
+        except Exception as exc:  # pylint: disable=broad-except
+            return (
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                encode_error(exc),
+                "application/json",
+            )
+        return HTTPStatus.OK, payload, proto_webhook.PROTO_CONTENT_TYPE
+
+    async def handle_metrics(self, body: bytes) -> Tuple[int, Body, str]:
+        """Serves the registry metrics; the request body is ignored."""
+        del body
+        return (
+            HTTPStatus.OK,
+            render_metrics(self.metrics_snapshot()).encode(),
+            "text/plain; version=0.0.4",
+        )
+
+    def metrics_snapshot(self):
+        """Returns the metrics snapshot served at /metrics."""
+        return self.registry.metrics_snapshot()
+
+    def request_done(self, path: str, latency: float) -> None:
+        """Called once the response to a request on any route has been written.
+
+        latency includes writing streamed responses; subclasses count here.
+        """
+
+    async def _handle_connection(self, reader, writer) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = False
+        try:
+            while not self._closing:
+                try:
+                    request = await self._read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except (BadRequest, asyncio.LimitOverrunError, ValueError) as exc:
+                    await self._write_response(
+                        writer, HTTPStatus.BAD_REQUEST, encode_error(exc), False
+                    )
+                    break
+                self._connections[task] = True
+                method, path, body, keep_alive = request
+                start = time.perf_counter()
+                async with self._semaphore:
+                    status, payload, content_type = await self._route(
+                        method, path, body
+                    )
+                    # Streamed bodies run their handlers while being written.
+                    keep_alive = keep_alive and not self._closing
+                    await self._write_response(
+                        writer, status, payload, keep_alive, content_type
+                    )
+                self.request_done(path, time.perf_counter() - start)
+                self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes):
+        route = self.routes.get(path.split("?", 1)[0])
+        if route is not None:
+            return await route(body)
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, b"", "text/plain"
+        return await self.handle_webhook(body)
+
+    async def _read_request(self, reader):
+        """Reads one request: (method, path, body, keep_alive).
+
+        Only the wait for the request line times out after keep_alive_timeout,
+        as the connection is idle until then; the rest of a request that has
+        started may arrive slowly.
+        """
+        request_line = await asyncio.wait_for(
+            reader.readuntil(b"\r\n"), self.keep_alive_timeout
+        )
+        start_line, headers = parse_head(await read_head(reader, request_line))
+        try:
+            method, path, version = start_line
+        except ValueError as exc:
+            raise BadRequest(f"Malformed request line: {request_line!r}") from exc
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = await read_chunked(reader, self.max_body_bytes)
+        else:
+            length = int(headers.get("content-length", 0))
+            if length > self.max_body_bytes:
+                raise BadRequest(f"Body exceeds {self.max_body_bytes} bytes")
+            body = await reader.readexactly(length) if length else b""
+        return method, path, body, is_keep_alive(version, headers)
+
+    @staticmethod
+    async def _write_response(
+        writer, status, body: Body, keep_alive, content_type="application/json"
+    ):
+        status = HTTPStatus(status)
+        streaming = not isinstance(body, bytes)
+        length = (
+            "Transfer-Encoding: chunked"
+            if streaming
+            else f"Content-Length: {len(body)}"
+        )
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"{length}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        if not streaming:
+            writer.write(head + body)
+            await writer.drain()
+            return
+        writer.write(head)
+        async for chunk in body:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(server: WebhookServer, sock: Optional[socket.socket] = None) -> None:
+    """Runs server until SIGINT or SIGTERM, then shuts down gracefully."""
+    await server.start(sock=sock)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(
+            signum, lambda: asyncio.ensure_future(server.shutdown())
+        )
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the Dialogflow CX webhook")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=100,
+        help="Maximum number of requests handled at once",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds an idle connection is kept open",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        serve(
+            WebhookServer(
+                host=args.host,
+                port=args.port,
+                max_concurrency=args.max_concurrency,
+                keep_alive_timeout=args.keep_alive_timeout,
+            )
+        )
+    )
@@ -0,0 +1,141 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cold-start profiler for the Dialogflow CX webhook.
+
+Each measurement runs in a fresh interpreter with webhook/ as the source root,
+as Cloud Functions does: it times the import of main and the first response,
+and records the memory and modules the import adds.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict
+
+from webhook.main import build_request_dict_basic
+
+WEBHOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhook")
+IMPORT_BUDGET_ENV = "WEBHOOK_IMPORT_BUDGET_MS"
+DEFAULT_IMPORT_BUDGET_MS = 200.0
+
+_CHILD_SCRIPT = """
+import json, os, resource, sys, time, tracemalloc
+
+module_name, trace, raw = sys.argv[1], sys.argv[2] == "1", sys.argv[3].encode()
+
+
+class Request:
+    def get_json(self, *args, **kwargs):
+        return json.loads(raw)
+
+    def get_data(self, *args, **kwargs):
+        return raw
+
+
+def rss_kib():
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+baseline = set(sys.modules)
+rss_start = rss_kib()
+if trace:
+    tracemalloc.start()
+start = time.perf_counter()
+module = __import__(module_name)
+imported = time.perf_counter()
+if trace:
+    traced = tracemalloc.get_traced_memory()[1]
+module.webhook_fcn(Request())
+responded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1e3,
+    "first_response_ms": (responded - imported) * 1e3,
+    "rss_kib": rss_kib() - rss_start,
+    "traced_kib": traced / 1024 if trace else None,
+    "modules": sorted(set(sys.modules) - baseline),
+}))
+"""
+
+
+def run_once(module="main", tag="basic_webhook", trace=False) -> Dict[str, Any]:
+    """Imports module and sends it one request, in a fresh interpreter."""
+    request = json.dumps(build_request_dict_basic(tag, "cold start"))
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT, module, "1" if trace else "0", request],
+        cwd=WEBHOOK_DIR,
+        env={**os.environ, "PYTHONPATH": WEBHOOK_DIR},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def measure_cold_start(module="main", tag="basic_webhook", runs=5) -> Dict[str, Any]:
+    """Reports median import and first-response times over runs cold starts.
+
+    Memory is measured in one extra run under tracemalloc, which would
+    otherwise inflate the timings.
+    """
+    samples = [run_once(module, tag) for _ in range(runs)]
+    traced = run_once(module, tag, trace=True)
+    return {
+        "runs": runs,
+        "import_ms": statistics.median(sample["import_ms"] for sample in samples),
+        "import_ms_max": max(sample["import_ms"] for sample in samples),
+        "first_response_ms": statistics.median(
+            sample["first_response_ms"] for sample in samples
+        ),
+        "rss_kib": statistics.median(sample["rss_kib"] for sample in samples),
+        "traced_kib": traced["traced_kib"],
+        "modules": traced["modules"],
+    }
+
+
+def import_budget_ms() -> float:
+    """Reads the cold import budget from WEBHOOK_IMPORT_BUDGET_MS."""
+    return float(os.environ.get(IMPORT_BUDGET_ENV, DEFAULT_IMPORT_BUDGET_MS))
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile the webhook cold start")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--tag", default="basic_webhook")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help=f"Exit non-zero above this import time; defaults to ${IMPORT_BUDGET_ENV}",
+    )
+    parser.add_argument("--verbose", action="store_true", help="List new modules")
+    args = parser.parse_args()
+
+    report = measure_cold_start(args.module, args.tag, args.runs)
+    if not args.verbose:
+        report["modules"] = len(report["modules"])
+    print(json.dumps(report, indent=2))
+    budget = args.budget_ms if args.budget_ms is not None else import_budget_ms()
+    if report["import_ms"] > budget:
+        sys.exit(f"Cold import took {report['import_ms']:.1f} ms > {budget:.1f} ms")
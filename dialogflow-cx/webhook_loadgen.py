@@ -0,0 +1,339 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load-test harness for the Dialogflow CX webhook.
+
+Generates synthetic requests for every registered tag and drives them either
+in-process through webhook_fcn or against a local HTTP server, in closed-loop
+mode (a fixed number of concurrent clients) or at a fixed request rate.
+"""
+
+import collections
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from utilities import RequestMock
+from webhook.context import encode_error
+from webhook.main import (
+    build_request_dict_basic,
+    build_request_dict_form,
+    build_request_dict_session,
+    registry,
+    webhook_fcn,
+)
+
+Sample = Tuple[str, float, bool]
+
+
+def generate_basic(tag, rng: random.Random) -> Dict:
+    """Generates a text request, as sent by an entry fulfillment."""
+    return build_request_dict_basic(tag, f"load test {rng.randrange(1 << 30)}")
+
+
+def generate_form(tag, rng: random.Random, parameter_count=1) -> Dict:
+    """Generates a request with form parameterInfo, including an age."""
+    parameters = {"age": rng.choice([-1, 1, 22, 99])}
+    for i in range(1, parameter_count):
+        parameters[f"param_{i}"] = rng.randrange(100)
+    return build_request_dict_form(tag, parameters, text=str(parameters["age"]))
+
+
+def generate_session(tag, rng: random.Random, parameter_count=2) -> Dict:
+    """Generates a request with sessionInfo parameters, including key and val."""
+    parameters = {"key": f"param_{rng.randrange(100)}", "val": rng.random()}
+    for i in range(2, parameter_count):
+        parameters[f"extra_{i}"] = rng.random()
+    return build_request_dict_session(
+        tag, parameters, text="set session parameter", session=str(uuid.uuid4())
+    )
+
+
+REQUEST_GENERATORS: Dict[str, Callable[[str, random.Random], Dict]] = {
+    "basic_webhook": generate_basic,
+    "echo_webhook": generate_session,
+    "validate_form": generate_form,
+    "set_session_param": generate_session,
+}
+
+
+def generate_requests(
+    tags: Optional[Sequence[str]] = None, count=1000, seed=0
+) -> List[Tuple[str, bytes]]:
+    """Generates count serialized requests, cycling through tags."""
+    tags = list(tags or registry.tags)
+    rng = random.Random(seed)
+    requests = []
+    for i in range(count):
+        tag = tags[i % len(tags)]
+        generator = REQUEST_GENERATORS.get(tag, generate_basic)
+        requests.append((tag, json.dumps(generator(tag, rng)).encode()))
+    return requests
+
+
+class InProcessTarget:
+    """Sends requests straight to webhook_fcn, as Cloud Functions would."""
+
+    def __init__(self, fcn: Callable = webhook_fcn) -> None:
+        self.fcn = fcn
+
+    def send(self, body: bytes) -> bool:
+        """Handles one request; returns whether it succeeded."""
+        self.fcn(RequestMock(payload=json.loads(body), data=body))
+        return True
+
+    def request(self, body: bytes) -> Tuple[int, bytes]:
+        """Handles one request; returns the HTTP status and response body."""
+        try:
+            response = self.fcn(RequestMock(payload=json.loads(body), data=body))
+        except Exception as exc:  # pylint: disable=broad-except
+            return 500, encode_error(exc)
+        return 200, response.encode() if isinstance(response, str) else response
+
+
+class HttpTarget:
+    """Sends requests to an HTTP server over one keep-alive connection per thread."""
+
+    def __init__(self, host="127.0.0.1", port=8080, path="/", timeout=10.0) -> None:
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, body: bytes) -> bool:
+        """Posts one request; returns whether it got a 200 response."""
+        return self.request(body)[0] == 200
+
+    def request(self, body: bytes) -> Tuple[int, bytes]:
+        """Posts one request; returns the HTTP status and response body.
+
+        Connection failures are reported as status 0.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+            self._local.connection = connection
+        try:
+            connection.request(
+                "POST",
+                self.path,
+                body=body,
+                headers={"Content-Type": "application/json"},
+            )
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            connection.close()
+            self._local.connection = None
+            return 0, encode_error(exc)
+        if response.getheader("Connection") == "close":
+            connection.close()
+            self._local.connection = None
+        return response.status, payload
+
+
+def build_target(url: Optional[str] = None):
+    """Returns an HttpTarget for url, given as [host]:port, or an InProcessTarget."""
+    if not url:
+        return InProcessTarget()
+    host, _, port = url.rpartition(":")
+    return HttpTarget(host or "127.0.0.1", int(port))
+
+
+def _timed_send(target, tag, body, start, samples: List[Sample]) -> None:
+    try:
+        success = target.send(body)
+    except Exception:  # pylint: disable=broad-except
+        success = False
+    samples.append((tag, time.perf_counter() - start, success))
+
+
+def run_closed_loop(
+    target, requests: Sequence[Tuple[str, bytes]], concurrency=1, duration=None
+) -> Tuple[List[Sample], float]:
+    """Runs concurrency clients that each send a request once the last completes.
+
+    Without a duration every request is sent once; with one, the requests are
+    cycled until duration seconds have passed.
+    """
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    position = iter(range(1 << 62))
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def client():
+        while True:
+            with lock:
+                index = next(position)
+            if deadline is None and index >= len(requests):
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            tag, body = requests[index % len(requests)]
+            _timed_send(target, tag, body, time.perf_counter(), samples)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def run_fixed_rate(
+    target,
+    requests: Sequence[Tuple[str, bytes]],
+    rate: float,
+    duration: float,
+    concurrency=16,
+) -> Tuple[List[Sample], float]:
+    """Sends requests on a fixed schedule of rate per second, for duration.
+
+    Latency is measured from each request's scheduled send time, so queueing
+    behind slow requests is included rather than hidden.
+    """
+    samples: List[Sample] = []
+    interval = 1.0 / rate
+    total = max(1, int(rate * duration))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index in range(total):
+            scheduled = start + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            tag, body = requests[index % len(requests)]
+            executor.submit(_timed_send, target, tag, body, scheduled, samples)
+    return samples, time.perf_counter() - start
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(
+        0, min(len(sorted_values) - 1, int(fraction * len(sorted_values) + 0.5) - 1)
+    )
+    return sorted_values[rank]
+
+
+def summarize(samples: Sequence[Sample], elapsed: float) -> Dict[str, Mapping]:
+    """Reports throughput and p50/p95/p99/max latency (ms) per tag and overall."""
+    by_tag = collections.defaultdict(list)
+    for tag, latency, success in samples:
+        by_tag[tag].append((latency, success))
+        by_tag["_all"].append((latency, success))
+    report = {}
+    for tag, tag_samples in sorted(by_tag.items()):
+        latencies = sorted(latency for latency, _ in tag_samples)
+        report[tag] = {
+            "requests": len(tag_samples),
+            "errors": sum(1 for _, success in tag_samples if not success),
+            "throughput_rps": len(tag_samples) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "max_ms": latencies[-1] * 1e3,
+        }
+    return report
+
+
+def format_report(report: Mapping[str, Mapping]) -> str:
+    """Formats a summarize() report as a text table."""
+    columns = [
+        "requests",
+        "errors",
+        "throughput_rps",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        "max_ms",
+    ]
+    lines = [f"{'tag':<20}" + "".join(f"{column:>16}" for column in columns)]
+    for tag, row in report.items():
+        lines.append(
+            f"{tag:<20}"
+            + "".join(
+                f"{row[column]:>16}"
+                if isinstance(row[column], int)
+                else f"{row[column]:>16.3f}"
+                for column in columns
+            )
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the Dialogflow CX webhook")
+    parser.add_argument(
+        "--tags", nargs="+", default=None, help="Defaults to every registered tag"
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="host:port of a local webhook server; in-process if omitted",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Requests per second; closed-loop if omitted",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, default=1000, help="Distinct requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--json", dest="json_path", default=None, help="Write JSON here"
+    )
+    args = parser.parse_args()
+
+    load_target = build_target(args.url)
+    load_requests = generate_requests(args.tags, args.requests, args.seed)
+    if args.rate:
+        run_samples, run_elapsed = run_fixed_rate(
+            load_target, load_requests, args.rate, args.duration, args.concurrency
+        )
+    else:
+        run_samples, run_elapsed = run_closed_loop(
+            load_target, load_requests, args.concurrency, args.duration
+        )
+    load_report = summarize(run_samples, run_elapsed)
+    print(format_report(load_report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf8") as file_handle:
+            json.dump(
+                {
+                    "mode": "fixed_rate" if args.rate else "closed_loop",
+                    "target": args.url or "in_process",
+                    "rate": args.rate,
+                    "concurrency": args.concurrency,
+                    "duration_s": run_elapsed,
+                    "tags": load_report,
+                },
+                file_handle,
+                indent=2,
+            )
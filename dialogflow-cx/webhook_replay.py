@@ -0,0 +1,280 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Replayer for webhook traffic recorded by webhook/recorder.py.
+
+Streams recorded requests through webhook_fcn or to a local server, either as
+fast as possible, at a multiple of the recorded pace, or at a fixed rate, then
+diffs each response against the recorded one and compares latencies.
+"""
+
+import collections
+import gzip
+import heapq
+import json
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from webhook_loadgen import build_target, percentile
+
+_MISSING = object()
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Expands directories into their recorded files, oldest first."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(
+                sorted(
+                    os.path.join(path, name)
+                    for name in os.listdir(path)
+                    if name.endswith(".ndjson.gz")
+                )
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def _iter_file(path: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, "rb") as records:
+        try:
+            for line in records:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError) as exc:
+            warnings.warn(f"{path} is truncated: {exc}", RuntimeWarning)
+
+
+def iter_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Streams records from recorded files, tolerating a file still being written.
+
+    Records are merged by timestamp across files, which pre-forked workers
+    write concurrently, so that --speed keeps their recorded spacing. A file
+    that ends mid-record is read up to there, with a warning, since it is
+    either being written or was not closed by its recorder.
+    """
+    return heapq.merge(
+        *(_iter_file(path) for path in expand_paths(paths)),
+        key=lambda record: record["ts"],
+    )
+
+
+def diff_responses(recorded, replayed, limit=10) -> List[str]:
+    """Lists the JSON paths at which two responses differ, up to limit."""
+    differences: List[str] = []
+    try:
+        recorded, replayed = json.loads(recorded), json.loads(replayed)
+    except (TypeError, ValueError):
+        if recorded != replayed:
+            differences.append("$: bodies differ")
+        return differences
+    _diff(recorded, replayed, "$", differences, limit)
+    return differences
+
+
+def _diff(recorded, replayed, path: str, differences: List[str], limit: int) -> None:
+    if len(differences) >= limit:
+        return
+    if isinstance(recorded, dict) and isinstance(replayed, dict):
+        for key in sorted(recorded.keys() | replayed.keys()):
+            _diff(
+                recorded.get(key, _MISSING),
+                replayed.get(key, _MISSING),
+                f"{path}.{key}",
+                differences,
+                limit,
+            )
+    elif isinstance(recorded, list) and isinstance(replayed, list):
+        if len(recorded) != len(replayed):
+            differences.append(f"{path}: {len(recorded)} != {len(replayed)} items")
+            return
+        for index, (left, right) in enumerate(zip(recorded, replayed)):
+            _diff(left, right, f"{path}[{index}]", differences, limit)
+    elif recorded is _MISSING:
+        differences.append(f"{path}: added")
+    elif replayed is _MISSING:
+        differences.append(f"{path}: removed")
+    elif recorded != replayed:
+        differences.append(f"{path}: {recorded!r} != {replayed!r}")
+
+
+def _tag(request: str) -> str:
+    try:
+        return json.loads(request)["fulfillmentInfo"]["tag"]
+    except (ValueError, KeyError, TypeError):
+        return "_unknown"
+
+
+def _replay_one(target, record: Mapping[str, Any], results: List[Dict]) -> None:
+    start = time.perf_counter()
+    status, body = target.request(record["request"].encode())
+    latency_ms = (time.perf_counter() - start) * 1e3
+    if record.get("error") is not None:
+        differences = [] if status != 200 else [f"$: recorded {record['error']}"]
+    elif status != 200:
+        differences = [f"$: status {status}"]
+    else:
+        differences = diff_responses(record["response"], body)
+    results.append(
+        {
+            "tag": _tag(record["request"]),
+            "recorded_ms": record["latency_ms"],
+            "replayed_ms": latency_ms,
+            "status": status,
+            "differences": differences,
+        }
+    )
+
+
+def replay(
+    records: Iterable[Mapping[str, Any]],
+    target,
+    speed: Optional[float] = None,
+    qps: Optional[float] = None,
+    concurrency=8,
+) -> Tuple[List[Dict], float]:
+    """Replays records through target; returns per-record results and elapsed s.
+
+    With speed, requests keep their recorded spacing divided by speed; with
+    qps, they are sent at a fixed rate; otherwise as fast as concurrency allows.
+    At most twice concurrency records are held in memory at once.
+    """
+    results: List[Dict] = []
+    slots = threading.BoundedSemaphore(2 * concurrency)
+    start = time.perf_counter()
+    first_timestamp = None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, record in enumerate(records):
+            scheduled = None
+            if speed:
+                if first_timestamp is None:
+                    first_timestamp = record["ts"]
+                scheduled = start + (record["ts"] - first_timestamp) / speed
+            elif qps:
+                scheduled = start + index / qps
+            if scheduled is not None:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()  # pylint: disable=consider-using-with
+            executor.submit(_replay_one, target, record, results).add_done_callback(
+                lambda _: slots.release()
+            )
+    return results, time.perf_counter() - start
+
+
+def summarize_replay(results: Iterable[Mapping[str, Any]]) -> Dict[str, Dict]:
+    """Reports mismatches and recorded vs replayed p50/p95/p99 (ms) per tag."""
+    by_tag = collections.defaultdict(list)
+    for result in results:
+        by_tag[result["tag"]].append(result)
+        by_tag["_all"].append(result)
+    report = {}
+    for tag, tag_results in sorted(by_tag.items()):
+        recorded = sorted(result["recorded_ms"] for result in tag_results)
+        replayed = sorted(result["replayed_ms"] for result in tag_results)
+        row: Dict[str, Any] = {
+            "requests": len(tag_results),
+            "mismatches": sum(1 for result in tag_results if result["differences"]),
+        }
+        for name, fraction in [("p50", 0.50), ("p95", 0.95), ("p99", 0.99)]:
+            row[f"recorded_{name}_ms"] = percentile(recorded, fraction)
+            row[f"replayed_{name}_ms"] = percentile(replayed, fraction)
+            row[f"delta_{name}_ms"] = (
+                row[f"replayed_{name}_ms"] - row[f"recorded_{name}_ms"]
+            )
+        report[tag] = row
+    return report
+
+
+def format_replay_report(report: Mapping[str, Mapping]) -> str:
+    """Formats a summarize_replay() report as a text table."""
+    columns = ["requests", "mismatches"] + [
+        f"{kind}_{name}_ms"
+        for name in ["p50", "p95", "p99"]
+        for kind in ["recorded", "replayed", "delta"]
+    ]
+    lines = [f"{'tag':<20}" + "".join(f"{column:>18}" for column in columns)]
+    for tag, row in report.items():
+        lines.append(
+            f"{tag:<20}"
+            + "".join(
+                f"{row[column]:>18}"
+                if isinstance(row[column], int)
+                else f"{row[column]:>18.3f}"
+                for column in columns
+            )
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded webhook traffic")
+    parser.add_argument("paths", nargs="+", help="Recorded files or directories")
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="host:port of a local webhook server; in-process if omitted",
+    )
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument(
+        "--speed", type=float, default=None, help="Multiple of the recorded pace"
+    )
+    pacing.add_argument("--qps", type=float, default=None, help="Requests per second")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--show-diffs", type=int, default=5, help="Mismatched records to print"
+    )
+    parser.add_argument(
+        "--json", dest="json_path", default=None, help="Write JSON here"
+    )
+    args = parser.parse_args()
+
+    replay_target = build_target(args.url)
+    replay_results, replay_elapsed = replay(
+        iter_records(args.paths),
+        replay_target,
+        speed=args.speed,
+        qps=args.qps,
+        concurrency=args.concurrency,
+    )
+    replay_report = summarize_replay(replay_results)
+    print(format_replay_report(replay_report))
+    mismatched = [row for row in replay_results if row["differences"]]
+    for mismatch in mismatched[: args.show_diffs]:
+        print(f"\n{mismatch['tag']}:")
+        for difference in mismatch["differences"]:
+            print(f"  {difference}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf8") as file_handle:
+            json.dump(
+                {
+                    "target": args.url or "in_process",
+                    "speed": args.speed,
+                    "qps": args.qps,
+                    "duration_s": replay_elapsed,
+                    "tags": replay_report,
+                },
+                file_handle,
+                indent=2,
+            )